@@ -1,19 +1,63 @@
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents.indexes import SearchIndexerClient, SearchIndexClient
-from azure.search.documents.indexes.models import SearchIndexerDataSourceConnection, SearchIndexerDataContainer
-from azure.search.documents import SearchClient
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 from config import (
     SEARCH_SERVICE_NAME,SEARCH_API_KEY,SEARCH_ENDPOINT,SHAREPOINT_SITE_URL,SHAREPOINT_APP_ID,SHAREPOINT_CLIENT_SECRET,
-    SHAREPOINT_TENANT_ID,AZURE_OPENAI_API_KEY,DATA_SOURCE_NAME,INDEX_NAME,SKILLSET_NAME,INDEXER_NAME,AZURE_OPENAI_ENDPOINT
+    SHAREPOINT_TENANT_ID,AZURE_OPENAI_API_KEY,DATA_SOURCE_NAME,INDEX_NAME,SKILLSET_NAME,INDEXER_NAME,AZURE_OPENAI_ENDPOINT,
+    EMBEDDING_DEPLOYMENT_NAME,EMBEDDING_DIMENSIONS,LOCAL_VECTOR_SEARCH_MODE,LOCAL_VECTOR_APPROXIMATE,
+    CHUNK_MAX_LENGTH,CHUNK_OVERLAP,CHUNK_DEFAULT_LANGUAGE,PUSH_INDEXING_ENABLED
     )
+from search_clients import get_search_client
+from embedding_cache import get_embedding_cache
+from embedding_batch import embed_texts, EmbeddingBatcher, EMBEDDING_SECONDS, EMBEDDING_ERRORS
+from result_cache import get_result_cache, make_cache_key
+from fusion import fuse
+from search_hit import SearchHit, DEFAULT_SELECT
+from vector_profiles import VectorProfile, get_vector_profile
+import metrics
 
-credential = AzureKeyCredential(SEARCH_API_KEY)
+# 客户端和 azure SDK 都在第一次使用时才创建/导入，导入本模块不会建立连接，也不需要凭据
+@lru_cache(maxsize=None)
+def get_credential():
+    from azure.core.credentials import AzureKeyCredential
 
-client = SearchIndexerClient(endpoint=SEARCH_ENDPOINT, credential=credential)
-client_index = SearchIndexClient(endpoint=SEARCH_ENDPOINT, credential=credential)
+    return AzureKeyCredential(SEARCH_API_KEY)
+
+@lru_cache(maxsize=None)
+def get_indexer_client():
+    """
+    获取共享的 SearchIndexerClient（数据源、技能集、索引器）
+    """
+    from azure.search.documents.indexes import SearchIndexerClient
+
+    return SearchIndexerClient(endpoint=SEARCH_ENDPOINT, credential=get_credential())
+
+@lru_cache(maxsize=None)
+def get_index_client():
+    """
+    获取共享的 SearchIndexClient（索引定义）
+    """
+    from azure.search.documents.indexes import SearchIndexClient
+
+    return SearchIndexClient(endpoint=SEARCH_ENDPOINT, credential=get_credential())
+
+# 兼容原来的模块级变量 credential / client / client_index
+_LAZY_ATTRIBUTES = {"credential": get_credential, "client": get_indexer_client, "client_index": get_index_client}
+
+def __getattr__(name):
+    factory = _LAZY_ATTRIBUTES.get(name)
+    if factory is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return factory()
+
+# 检索请求的耗时（不含缓存命中）与错误，status 为 HTTP 状态码（429 即被限流）或异常类名
+SEARCH_SECONDS = metrics.histogram("search_request_seconds", "检索请求耗时（秒），不含结果缓存命中", ("mode",))
+SEARCH_ERRORS = metrics.counter("search_errors_total", "检索请求失败次数", ("mode", "status"))
 
 def create_datasource():
+    from azure.search.documents.indexes.models import SearchIndexerDataSourceConnection, SearchIndexerDataContainer
+
     container = SearchIndexerDataContainer(name="defaultSiteLibrary")
     connection_string = f"SharePointOnlineEndpoint={SHAREPOINT_SITE_URL};ApplicationId={SHAREPOINT_APP_ID};ApplicationSecret={SHAREPOINT_CLIENT_SECRET};TenantId={SHAREPOINT_TENANT_ID}"
 
@@ -24,9 +68,41 @@ def create_datasource():
         container=container
     )
 
-    client.create_data_source_connection(data_source_connection)
+    get_indexer_client().create_data_source_connection(data_source_connection)
 
-def create_indexes():
+def _vector_compressions(profile):
+    """
+    压缩配置的 compressions，保留原始向量用于重新打分
+    """
+    if profile.compression_name is None:
+        return []
+    from azure.search.documents.indexes.models import (
+        BinaryQuantizationCompression,
+        RescoringOptions,
+        ScalarQuantizationCompression,
+        ScalarQuantizationParameters
+    )
+
+    rescoring = RescoringOptions(
+        enable_rescoring=True,
+        default_oversampling=profile.oversampling,
+        rescore_storage_method="preserveOriginals"
+    )
+    if profile.compression == "int8":
+        return [
+            ScalarQuantizationCompression(
+                compression_name=profile.compression_name,
+                parameters=ScalarQuantizationParameters(quantized_data_type="int8"),
+                rescoring_options=rescoring
+            )
+        ]
+    return [BinaryQuantizationCompression(compression_name=profile.compression_name, rescoring_options=rescoring)]
+
+def create_indexes(profile=None):
+    """
+    创建索引，profile 为向量索引配置（VectorProfile 或配置名，见 vector_profiles），默认为 VECTOR_INDEX_PROFILE
+    使用其他配置时，查询端的 VECTOR_INDEX_PROFILE 也要改成相同的值，查询向量才会截取到相同维度
+    """
     from azure.search.documents.indexes.models import (
         SearchIndex,
         SimpleField,
@@ -46,6 +122,11 @@ def create_indexes():
         AzureOpenAIVectorizerParameters 
     )
     
+    if profile is None:
+        profile = get_vector_profile()
+    elif isinstance(profile, str):
+        profile = VectorProfile.parse(profile)
+
     index = SearchIndex(
         name=INDEX_NAME,
         fields=[
@@ -61,7 +142,7 @@ def create_indexes():
                 type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
                 searchable=True,
                 hidden=False,
-                vector_search_dimensions=3072,
+                vector_search_dimensions=profile.dimensions,
                 vector_search_profile_name="my-vector-profile"
             )
         ],
@@ -82,9 +163,11 @@ def create_indexes():
                 VectorSearchProfile(
                     name="my-vector-profile",
                     algorithm_configuration_name="my-hnsw-config",
-                    vectorizer_name="openai-vectorizer"
+                    vectorizer_name="openai-vectorizer",
+                    compression_name=profile.compression_name
                 )
             ],
+            compressions=_vector_compressions(profile),
             vectorizers=[
                 AzureOpenAIVectorizer(
                     vectorizer_name="openai-vectorizer",
@@ -115,7 +198,7 @@ def create_indexes():
         ),
         default_semantic_configuration_name="default"
     )
-    client_index.create_index(index)
+    get_index_client().create_index(index)
     
 def create_skillset():
     from azure.search.documents.indexes.models import (
@@ -149,10 +232,11 @@ def create_skillset():
                 name="textSplit",
                 description="Split document into chunks",
                 context="/document",
-                default_language_code="ja",
+                # 与 document_processing 的本地分块使用同一组参数
+                default_language_code=CHUNK_DEFAULT_LANGUAGE,
                 text_split_mode="pages",
-                maximum_page_length=1024,
-                page_overlap_length=256,
+                maximum_page_length=CHUNK_MAX_LENGTH,
+                page_overlap_length=CHUNK_OVERLAP,
                 inputs=[
                     InputFieldMappingEntry(name="text", source="/document/content"), 
                     InputFieldMappingEntry(name="languageCode", source="/document/languageDetected")
@@ -167,7 +251,8 @@ def create_skillset():
                 api_key=AZURE_OPENAI_API_KEY,
                 deployment_name="text-embedding-3-large",
                 model_name="text-embedding-3-large",
-                dimensions=3072,
+                # 与索引的向量维度一致
+                dimensions=get_vector_profile().dimensions,
                 inputs=[InputFieldMappingEntry(name="text", source="/document/chunks/*")],
                 outputs=[OutputFieldMappingEntry(name="embedding", target_name="chunk_vector")]
             )
@@ -192,9 +277,12 @@ def create_skillset():
     )
     
 
-    client.create_skillset(skillset)
+    get_indexer_client().create_skillset(skillset)
 
 def create_indexer():
+    """
+    创建索引器；推送模式下不设置运行计划，否则索引器与推送写入的同一文件的分块键不同，索引中会出现两份
+    """
     from azure.search.documents.indexes.models import (
     SearchIndexer,
     IndexingSchedule,
@@ -204,12 +292,18 @@ def create_indexer():
     FieldMappingFunction,
     )
 
+    schedule = None
+    if PUSH_INDEXING_ENABLED:
+        print("已开启推送模式（PUSH_INDEXING_ENABLED），索引器不设置运行计划，不要再手动运行索引器")
+    else:
+        schedule = IndexingSchedule(interval="PT12H", start_time="2025-06-19T00:00:00Z")
+
     indexer = SearchIndexer(
         name=INDEXER_NAME,
         data_source_name=DATA_SOURCE_NAME,
         target_index_name=INDEX_NAME,
         skillset_name=SKILLSET_NAME,
-        schedule=IndexingSchedule(interval="PT12H", start_time="2025-06-19T00:00:00Z"),
+        schedule=schedule,
         parameters=IndexingParameters(
             batch_size=None,
             max_failed_items=None,
@@ -234,148 +328,321 @@ def create_indexer():
         ]
     )
 
-    client.create_indexer(indexer)
+    get_indexer_client().create_indexer(indexer)
 
-def semantic_search(query, top_k=5):
+def iter_semantic_search(query, top_k=5, filter=None, select=None):
     """
-    执行语义检索
+    执行语义检索，随服务端分页逐条产出 SearchHit（不经过结果缓存，出错时直接抛出异常）
     """
-    search_client = SearchClient(endpoint=SEARCH_ENDPOINT, index_name=INDEX_NAME, credential=credential)
+    search_client = get_search_client(INDEX_NAME, SEARCH_ENDPOINT, get_credential())
     
+    # 使用语义搜索进行检索
+    results = search_client.search(
+        search_text=query,
+        top=top_k,
+        filter=filter,
+        select=select or DEFAULT_SELECT["semantic"],
+        include_total_count=True,
+        search_mode="all",
+        query_type="semantic",
+        semantic_configuration_name="default",
+        query_caption="extractive",
+        query_answer="extractive"
+    )
+    for result in results:
+        yield SearchHit.from_result(result)
+
+def semantic_search(query, top_k=5, filter=None, select=None):
+    """
+    执行语义检索
+    """
+    cache = get_result_cache()
+    cache_key = make_cache_key("semantic", query=query, top_k=top_k, filter=filter, select=select)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
     try:
-        # 使用语义搜索进行检索
-        results = search_client.search(
-            search_text=query,
-            top=top_k,
-            include_total_count=True,
-            search_mode="all",
-            query_type="semantic",
-            semantic_configuration_name="default",
-            query_caption="extractive",
-            query_answer="extractive"
-        )
-        
-        search_results = []
-        for result in results:
-            search_results.append({
-                "id": result.get("id"),
-                "title": result.get("title"),
-                "content": result.get("content"),
-                "score": result.get("@search.score"),
-                "captions": result.get("@search.captions", []),
-                "answers": result.get("@search.answers", [])
-            })
+        with metrics.span("search", SEARCH_SECONDS, mode="semantic"):
+            search_results = list(iter_semantic_search(query, top_k, filter, select))
         
+        if cache is not None:
+            cache.put(cache_key, search_results)
         return search_results
     
     except Exception as e:
+        SEARCH_ERRORS.inc(mode="semantic", status=metrics.error_status(e))
         print(f"语义搜索错误: {e}")
         return []
 
-def hybrid_search(query, vector=None, top_k=5):
+def iter_hybrid_search(query, vector=None, top_k=5, filter=None, select=None):
     """
-    执行混合搜索（文本 + 向量）
+    执行混合搜索（文本 + 向量），随服务端分页逐条产出 SearchHit
     """
-    search_client = SearchClient(endpoint=SEARCH_ENDPOINT, index_name=INDEX_NAME, credential=credential)
+    search_client = get_search_client(INDEX_NAME, SEARCH_ENDPOINT, get_credential())
+    
+    search_params = {
+        "search_text": query,
+        "top": top_k,
+        "filter": filter,
+        "select": select or DEFAULT_SELECT["hybrid"],
+        "include_total_count": True,
+        "search_mode": "all"
+    }
+    
+    # 如果提供了向量，添加向量搜索
+    if vector:
+        from azure.search.documents.models import VectorizedQuery
+        search_params["vector_queries"] = [
+            VectorizedQuery(
+                vector=vector,
+                k_nearest_neighbors=top_k,
+                fields="chunk_vector"
+            )
+        ]
     
+    for result in search_client.search(**search_params):
+        yield SearchHit.from_result(result)
+
+def hybrid_search(query, vector=None, top_k=5, filter=None, select=None):
+    """
+    执行混合搜索（文本 + 向量）
+    """
+    cache = get_result_cache()
+    cache_key = make_cache_key("hybrid", query=query, vector=vector, top_k=top_k, filter=filter, select=select)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
     try:
-        search_params = {
-            "search_text": query,
-            "top": top_k,
-            "include_total_count": True,
-            "search_mode": "all"
-        }
-        
-        # 如果提供了向量，添加向量搜索
-        if vector:
-            from azure.search.documents.models import VectorizedQuery
-            search_params["vector_queries"] = [
-                VectorizedQuery(
-                    vector=vector,
-                    k_nearest_neighbors=top_k,
-                    fields="chunk_vector"
-                )
-            ]
-        
-        results = search_client.search(**search_params)
-        
-        search_results = []
-        for result in results:
-            search_results.append({
-                "id": result.get("id"),
-                "title": result.get("title"),
-                "content": result.get("content"),
-                "chunk_text": result.get("chunk_text"),
-                "score": result.get("@search.score")
-            })
+        with metrics.span("search", SEARCH_SECONDS, mode="hybrid"):
+            search_results = list(iter_hybrid_search(query, vector, top_k, filter, select))
         
+        if cache is not None:
+            cache.put(cache_key, search_results)
         return search_results
     
     except Exception as e:
+        SEARCH_ERRORS.inc(mode="hybrid", status=metrics.error_status(e))
         print(f"混合搜索错误: {e}")
         return []
 
-def get_embedding(text):
+@lru_cache(maxsize=None)
+def get_openai_client():
+    """
+    获取共享的 Azure OpenAI 客户端（只创建一次）
+    """
+    from openai import AzureOpenAI
+
+    return AzureOpenAI(
+        api_key=AZURE_OPENAI_API_KEY,
+        api_version="2024-02-01",
+        azure_endpoint=AZURE_OPENAI_ENDPOINT
+    )
+
+def get_embedding(text, dimensions=None):
     """
     获取文本的嵌入向量（需要调用Azure OpenAI）
+    结果会写入两级缓存，重复的查询不会再次调用接口
+    dimensions 默认与向量索引配置一致（截取维度的配置由接口直接返回截取并归一化后的向量）
     """
+    dimensions = dimensions or get_vector_profile().request_dimensions
+    cache = get_embedding_cache()
+    cache_dimensions = dimensions or EMBEDDING_DIMENSIONS
+    if cache is not None:
+        embedding = cache.get(EMBEDDING_DEPLOYMENT_NAME, cache_dimensions, text)
+        if embedding is not None:
+            return embedding
+
     try:
-        from openai import AzureOpenAI
-        
-        client_openai = AzureOpenAI(
-            api_key=AZURE_OPENAI_API_KEY,
-            api_version="2024-02-01",
-            azure_endpoint=AZURE_OPENAI_ENDPOINT
-        )
-        
-        response = client_openai.embeddings.create(
-            input=text,
-            model="text-embedding-3-large"
-        )
-        
-        return response.data[0].embedding
+        params = {"input": text, "model": EMBEDDING_DEPLOYMENT_NAME}
+        if dimensions:
+            params["dimensions"] = dimensions
+        with metrics.span("embedding", EMBEDDING_SECONDS, op="single"):
+            response = get_openai_client().embeddings.create(**params)
+        embedding = response.data[0].embedding
+
+        if cache is not None:
+            cache.put(EMBEDDING_DEPLOYMENT_NAME, cache_dimensions, text, embedding)
+        return embedding
     
     except Exception as e:
+        EMBEDDING_ERRORS.inc(op="single", status=metrics.error_status(e))
         print(f"获取嵌入向量错误: {e}")
         return None
 
-def vector_search(query_vector, top_k=5):
+def get_embeddings(texts, dimensions=None):
     """
-    执行纯向量搜索
+    批量获取嵌入向量，结果按输入顺序返回（失败的位置为 None）
+    先查缓存并去重，剩余文本按 token 上限分批并发调用接口
+    """
+    dimensions = dimensions or get_vector_profile().request_dimensions
+    cache = get_embedding_cache()
+    cache_dimensions = dimensions or EMBEDDING_DIMENSIONS
+    results = [None] * len(texts)
+
+    # 相同文本只请求一次
+    pending = {}
+    for i, text in enumerate(texts):
+        if text in pending:
+            pending[text].append(i)
+            continue
+        embedding = cache.get(EMBEDDING_DEPLOYMENT_NAME, cache_dimensions, text) if cache is not None else None
+        if embedding is not None:
+            results[i] = embedding
+        else:
+            pending[text] = [i]
+
+    if pending:
+        missing = list(pending)
+        vectors = embed_texts(get_openai_client(), EMBEDDING_DEPLOYMENT_NAME, missing, dimensions=dimensions)
+        for text, embedding in zip(missing, vectors):
+            if embedding is None:
+                continue
+            if cache is not None:
+                cache.put(EMBEDDING_DEPLOYMENT_NAME, cache_dimensions, text, embedding)
+            for i in pending[text]:
+                results[i] = embedding
+
+    return results
+
+def warm_up(background=True):
+    """
+    提前导入 SDK 并创建检索、嵌入客户端（不发送请求），让长期运行的服务第一次调用时不再承担这部分开销
+    background 为 True 时在后台线程中执行，返回线程
+    """
+    def run():
+        get_search_client(INDEX_NAME, SEARCH_ENDPOINT, get_credential())
+        get_openai_client()
+
+    if not background:
+        run()
+        return None
+    thread = threading.Thread(target=run, name="azure-sdk-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+@lru_cache(maxsize=None)
+def get_embedding_batcher(dimensions=None):
+    """
+    获取共享的微批处理前端，并发的单条请求会在几毫秒内合并成一次接口调用
+    用法: get_embedding_batcher().embed("経費申請")
+    """
+    return EmbeddingBatcher(lambda texts: get_embeddings(texts, dimensions=dimensions))
+
+@lru_cache(maxsize=None)
+def get_local_vector_index():
+    """
+    获取本地向量索引镜像，LOCAL_VECTOR_SEARCH_MODE 为 off 时返回 None
+    """
+    if LOCAL_VECTOR_SEARCH_MODE == "off":
+        return None
+    from local_vector_index import LocalVectorIndex
+
+    return LocalVectorIndex(dim=get_vector_profile().dimensions)
+
+def sync_local_vector_index(build_ivf=False):
     """
-    search_client = SearchClient(endpoint=SEARCH_ENDPOINT, index_name=INDEX_NAME, credential=credential)
+    从检索服务全量拉取 chunk_vector 建立本地镜像
+    """
+    from local_vector_index import LocalVectorIndex
+
+    local_index = get_local_vector_index() or LocalVectorIndex(dim=get_vector_profile().dimensions)
+    total = local_index.sync_from_search(get_search_client(INDEX_NAME, SEARCH_ENDPOINT, get_credential()))
+    if build_ivf:
+        local_index.build_ivf()
+    print(f"本地向量索引已同步 {total} 条分块")
+    return total
+
+def iter_vector_search(query_vector, top_k=5, filter=None, select=None):
+    """
+    执行纯向量搜索，随服务端分页逐条产出 SearchHit
+    """
+    from azure.search.documents.models import VectorizedQuery
+
+    search_client = get_search_client(INDEX_NAME, SEARCH_ENDPOINT, get_credential())
     
+    results = search_client.search(
+        search_text=None,
+        vector_queries=[
+            VectorizedQuery(
+                vector=query_vector,
+                k_nearest_neighbors=top_k,
+                fields="chunk_vector"
+            )
+        ],
+        top=top_k,
+        filter=filter,
+        select=select or DEFAULT_SELECT["vector"]
+    )
+    for result in results:
+        yield SearchHit.from_result(result)
+
+def vector_search(query_vector, top_k=5, filter=None, select=None):
+    """
+    执行纯向量搜索
+    启用本地向量索引镜像时，prefer 模式直接由镜像回答，fallback 模式在检索服务出错或限流时由镜像回答
+    （镜像不支持 OData 过滤，带 filter 的查询始终走检索服务；镜像为空、还没有同步过时也走检索服务）
+    """
+    local_index = get_local_vector_index() if filter is None else None
+    if local_index is not None:
+        # 其他进程（同步脚本、webhook 服务）更新过镜像时重新加载
+        local_index.refresh()
+        if not len(local_index):
+            local_index = None
+    if local_index is not None and LOCAL_VECTOR_SEARCH_MODE == "prefer":
+        return local_index.search(query_vector, top_k, approximate=LOCAL_VECTOR_APPROXIMATE)
+
+    cache = get_result_cache()
+    cache_key = make_cache_key("vector", vector=query_vector, top_k=top_k, filter=filter, select=select)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
     try:
-        from azure.search.documents.models import VectorizedQuery
-        
-        results = search_client.search(
-            search_text=None,
-            vector_queries=[
-                VectorizedQuery(
-                    vector=query_vector,
-                    k_nearest_neighbors=top_k,
-                    fields="chunk_vector"
-                )
-            ],
-            top=top_k
-        )
-        
-        search_results = []
-        for result in results:
-            search_results.append({
-                "id": result.get("id"),
-                "title": result.get("title"),
-                "content": result.get("content"),
-                "chunk_text": result.get("chunk_text"),
-                "score": result.get("@search.score")
-            })
+        with metrics.span("search", SEARCH_SECONDS, mode="vector"):
+            search_results = list(iter_vector_search(query_vector, top_k, filter, select))
         
+        if cache is not None:
+            cache.put(cache_key, search_results)
         return search_results
     
     except Exception as e:
+        SEARCH_ERRORS.inc(mode="vector", status=metrics.error_status(e))
         print(f"向量搜索错误: {e}")
+        if local_index is not None:
+            print("改用本地向量索引镜像")
+            return local_index.search(query_vector, top_k, approximate=LOCAL_VECTOR_APPROXIMATE)
         return []
 
+def fusion_search(query, top_k=5, method="rrf", weights=None, rewrites=None, candidates=None):
+    """
+    客户端融合检索
+    语义检索、关键词检索（包括改写后的查询）与嵌入请求并发执行，拿到向量后执行向量检索，最后在客户端融合
+    weights 按结果列表名称设置: semantic、keyword、vector，改写查询为 semantic_1、keyword_1 ……
+    """
+    candidates = candidates or top_k * 2
+    queries = [query] + list(rewrites or [])
+
+    with metrics.span("fusion_search", SEARCH_SECONDS, mode="fusion"), \
+            ThreadPoolExecutor(max_workers=len(queries) * 2 + 1) as executor:
+        futures = {}
+        for i, text in enumerate(queries):
+            suffix = f"_{i}" if i else ""
+            futures[f"semantic{suffix}"] = executor.submit(semantic_search, text, candidates)
+            futures[f"keyword{suffix}"] = executor.submit(hybrid_search, text, None, candidates)
+
+        query_vector = get_embedding(query)
+        if query_vector:
+            futures["vector"] = executor.submit(vector_search, query_vector, candidates)
+
+        result_lists = {name: future.result() for name, future in futures.items()}
+
+    return fuse(result_lists, method=method, weights=weights, top_k=top_k)
+
 def test_search():
     """
     测试搜索功能
@@ -386,7 +653,7 @@ def test_search():
     semantic_results = semantic_search(query)
     for i, result in enumerate(semantic_results, 1):
         print(f"{i}. {result['title']} (Score: {result['score']:.4f})")
-        print(f"   Content: {result['content'][:100]}...")
+        print(f"   Content: {(result['chunk_text'] or '')[:100]}...")
         if result['captions']:
             print(f"   Caption: {result['captions'][0].get('text', '')}")
         print()
@@ -398,7 +665,7 @@ def test_search():
         vector_results = vector_search(query_vector)
         for i, result in enumerate(vector_results, 1):
             print(f"{i}. {result['title']} (Score: {result['score']:.4f})")
-            print(f"   Content: {result['content'][:100]}...")
+            print(f"   Content: {(result['chunk_text'] or '')[:100]}...")
             print()
     
     print("=== 混合搜索测试 ===")
@@ -406,7 +673,7 @@ def test_search():
         hybrid_results = hybrid_search(query, query_vector)
         for i, result in enumerate(hybrid_results, 1):
             print(f"{i}. {result['title']} (Score: {result['score']:.4f})")
-            print(f"   Content: {result['content'][:100]}...")
+            print(f"   Content: {(result['chunk_text'] or '')[:100]}...")
             print()
 
 if __name__ == "__main__":
@@ -0,0 +1,358 @@
+"""
+Azure_SDK 检索层的 asyncio 版本
+基于 azure.search.documents.aio 和 AsyncAzureOpenAI，适合在单个事件循环中服务大量并发请求
+"""
+import asyncio
+import weakref
+
+import aiohttp
+from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.search.documents.aio import SearchClient
+
+from config import (
+    SEARCH_API_KEY,SEARCH_ENDPOINT,INDEX_NAME,AZURE_OPENAI_API_KEY,AZURE_OPENAI_ENDPOINT,
+    SEARCH_POOL_MAXSIZE,SEARCH_CONNECTION_TIMEOUT,SEARCH_READ_TIMEOUT,EMBEDDING_DEPLOYMENT_NAME,EMBEDDING_DIMENSIONS
+    )
+from embedding_cache import get_embedding_cache
+from result_cache import get_result_cache, make_cache_key
+from search_hit import SearchHit, DEFAULT_SELECT
+from vector_profiles import get_vector_profile
+
+credential = AzureKeyCredential(SEARCH_API_KEY)
+
+
+class AsyncSearchClientRegistry:
+    """
+    异步 SearchClient 注册表
+    aiohttp 会话绑定在创建它的事件循环上，所以按事件循环分别缓存 (endpoint, index_name) -> SearchClient
+    """
+
+    def __init__(self, pool_maxsize=SEARCH_POOL_MAXSIZE, connection_timeout=SEARCH_CONNECTION_TIMEOUT,
+                 read_timeout=SEARCH_READ_TIMEOUT):
+        self.pool_maxsize = pool_maxsize
+        self.connection_timeout = connection_timeout
+        self.read_timeout = read_timeout
+        self._loops = weakref.WeakKeyDictionary()
+
+    def _state(self):
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            state = {"clients": {}, "sessions": {}}
+            self._loops[loop] = state
+        return state
+
+    def get(self, endpoint=SEARCH_ENDPOINT, index_name=INDEX_NAME, credential=None):
+        """
+        获取当前事件循环中 (endpoint, index_name) 对应的共享客户端
+        单个事件循环内没有并发切换点，不需要加锁
+        """
+        state = self._state()
+        key = (endpoint, index_name)
+        search_client = state["clients"].get(key)
+        if search_client is None:
+            session = state["sessions"].get(endpoint)
+            if session is None:
+                session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(limit=self.pool_maxsize, keepalive_timeout=30)
+                )
+                state["sessions"][endpoint] = session
+            transport = AioHttpTransport(
+                session=session,
+                session_owner=False,
+                connection_timeout=self.connection_timeout,
+                read_timeout=self.read_timeout
+            )
+            search_client = SearchClient(
+                endpoint=endpoint,
+                index_name=index_name,
+                credential=credential or AzureKeyCredential(SEARCH_API_KEY),
+                transport=transport
+            )
+            state["clients"][key] = search_client
+        return search_client
+
+    async def close(self):
+        """
+        关闭当前事件循环中的全部客户端和连接池
+        """
+        state = self._loops.pop(asyncio.get_running_loop(), None)
+        if not state:
+            return
+        for search_client in state["clients"].values():
+            await search_client.close()
+        for session in state["sessions"].values():
+            await session.close()
+
+
+_registry = AsyncSearchClientRegistry()
+_openai_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_search_client(index_name=INDEX_NAME, endpoint=SEARCH_ENDPOINT, credential=None):
+    """
+    获取当前事件循环共享的异步 SearchClient
+    """
+    return _registry.get(endpoint=endpoint, index_name=index_name, credential=credential)
+
+
+def get_async_openai_client():
+    """
+    获取当前事件循环共享的 AsyncAzureOpenAI 客户端
+    """
+    loop = asyncio.get_running_loop()
+    client_openai = _openai_clients.get(loop)
+    if client_openai is None:
+        from openai import AsyncAzureOpenAI
+
+        client_openai = AsyncAzureOpenAI(
+            api_key=AZURE_OPENAI_API_KEY,
+            api_version="2024-02-01",
+            azure_endpoint=AZURE_OPENAI_ENDPOINT
+        )
+        _openai_clients[loop] = client_openai
+    return client_openai
+
+
+async def close_async_clients():
+    """
+    关闭当前事件循环中的异步客户端（在应用 shutdown 钩子中调用）
+    """
+    await _registry.close()
+    client_openai = _openai_clients.pop(asyncio.get_running_loop(), None)
+    if client_openai is not None:
+        await client_openai.close()
+
+
+async def _cache_get(cache, cache_key):
+    """
+    查询结果缓存，跨进程失效标记的检查（文件系统访问）放到线程中，事件循环中只访问内存
+    """
+    if cache.stamp_due():
+        await asyncio.to_thread(cache.check_stamp)
+    return cache.get(cache_key, check_stamp=False)
+
+
+async def iter_semantic_search(query, top_k=5, filter=None, select=None):
+    """
+    执行语义检索（异步），随服务端分页逐条产出 SearchHit
+    """
+    search_client = get_async_search_client(INDEX_NAME, SEARCH_ENDPOINT, credential)
+
+    results = await search_client.search(
+        search_text=query,
+        top=top_k,
+        filter=filter,
+        select=select or DEFAULT_SELECT["semantic"],
+        include_total_count=True,
+        search_mode="all",
+        query_type="semantic",
+        semantic_configuration_name="default",
+        query_caption="extractive",
+        query_answer="extractive"
+    )
+    async for result in results:
+        yield SearchHit.from_result(result)
+
+
+async def semantic_search(query, top_k=5, filter=None, select=None):
+    """
+    执行语义检索（异步）
+    """
+    cache = get_result_cache()
+    cache_key = make_cache_key("semantic", query=query, top_k=top_k, filter=filter, select=select)
+    if cache is not None:
+        cached = await _cache_get(cache, cache_key)
+        if cached is not None:
+            return cached
+
+    try:
+        search_results = [hit async for hit in iter_semantic_search(query, top_k, filter, select)]
+
+        if cache is not None:
+            cache.put(cache_key, search_results)
+        return search_results
+
+    except Exception as e:
+        print(f"语义搜索错误: {e}")
+        return []
+
+
+async def iter_hybrid_search(query, vector=None, top_k=5, filter=None, select=None):
+    """
+    执行混合搜索（文本 + 向量，异步），随服务端分页逐条产出 SearchHit
+    """
+    search_client = get_async_search_client(INDEX_NAME, SEARCH_ENDPOINT, credential)
+
+    search_params = {
+        "search_text": query,
+        "top": top_k,
+        "filter": filter,
+        "select": select or DEFAULT_SELECT["hybrid"],
+        "include_total_count": True,
+        "search_mode": "all"
+    }
+
+    # 如果提供了向量，添加向量搜索
+    if vector:
+        from azure.search.documents.models import VectorizedQuery
+        search_params["vector_queries"] = [
+            VectorizedQuery(
+                vector=vector,
+                k_nearest_neighbors=top_k,
+                fields="chunk_vector"
+            )
+        ]
+
+    results = await search_client.search(**search_params)
+    async for result in results:
+        yield SearchHit.from_result(result)
+
+
+async def hybrid_search(query, vector=None, top_k=5, filter=None, select=None):
+    """
+    执行混合搜索（文本 + 向量，异步）
+    """
+    cache = get_result_cache()
+    cache_key = make_cache_key("hybrid", query=query, vector=vector, top_k=top_k, filter=filter, select=select)
+    if cache is not None:
+        cached = await _cache_get(cache, cache_key)
+        if cached is not None:
+            return cached
+
+    try:
+        search_results = [hit async for hit in iter_hybrid_search(query, vector, top_k, filter, select)]
+
+        if cache is not None:
+            cache.put(cache_key, search_results)
+        return search_results
+
+    except Exception as e:
+        print(f"混合搜索错误: {e}")
+        return []
+
+
+async def get_embedding(text, dimensions=None):
+    """
+    获取文本的嵌入向量（异步），与同步版本共享嵌入缓存，dimensions 默认与向量索引配置一致
+    """
+    dimensions = dimensions or get_vector_profile().request_dimensions
+    cache = get_embedding_cache()
+    cache_dimensions = dimensions or EMBEDDING_DIMENSIONS
+    if cache is not None:
+        # 事件循环中只查内存层，磁盘层（SQLite）放到线程中
+        embedding = cache.get_memory(EMBEDDING_DEPLOYMENT_NAME, cache_dimensions, text)
+        if embedding is None:
+            embedding = await asyncio.to_thread(cache.get_disk, EMBEDDING_DEPLOYMENT_NAME, cache_dimensions, text)
+        if embedding is not None:
+            return embedding
+
+    try:
+        params = {"input": text, "model": EMBEDDING_DEPLOYMENT_NAME}
+        if dimensions:
+            params["dimensions"] = dimensions
+        response = await get_async_openai_client().embeddings.create(**params)
+        embedding = response.data[0].embedding
+
+        if cache is not None:
+            cache.put_memory(EMBEDDING_DEPLOYMENT_NAME, cache_dimensions, text, embedding)
+            await asyncio.to_thread(cache.put_disk, EMBEDDING_DEPLOYMENT_NAME, cache_dimensions, text, embedding)
+        return embedding
+
+    except Exception as e:
+        print(f"获取嵌入向量错误: {e}")
+        return None
+
+
+async def iter_vector_search(query_vector, top_k=5, filter=None, select=None):
+    """
+    执行纯向量搜索（异步），随服务端分页逐条产出 SearchHit
+    """
+    from azure.search.documents.models import VectorizedQuery
+
+    search_client = get_async_search_client(INDEX_NAME, SEARCH_ENDPOINT, credential)
+
+    results = await search_client.search(
+        search_text=None,
+        vector_queries=[
+            VectorizedQuery(
+                vector=query_vector,
+                k_nearest_neighbors=top_k,
+                fields="chunk_vector"
+            )
+        ],
+        top=top_k,
+        filter=filter,
+        select=select or DEFAULT_SELECT["vector"]
+    )
+    async for result in results:
+        yield SearchHit.from_result(result)
+
+
+async def vector_search(query_vector, top_k=5, filter=None, select=None):
+    """
+    执行纯向量搜索（异步）
+    """
+    cache = get_result_cache()
+    cache_key = make_cache_key("vector", vector=query_vector, top_k=top_k, filter=filter, select=select)
+    if cache is not None:
+        cached = await _cache_get(cache, cache_key)
+        if cached is not None:
+            return cached
+
+    try:
+        search_results = [hit async for hit in iter_vector_search(query_vector, top_k, filter, select)]
+
+        if cache is not None:
+            cache.put(cache_key, search_results)
+        return search_results
+
+    except Exception as e:
+        print(f"向量搜索错误: {e}")
+        return []
+
+
+async def search_all_modes(query, top_k=5):
+    """
+    并发执行三种检索
+    嵌入向量请求与语义检索同时发出，拿到向量后再并发执行向量检索和混合检索
+    """
+    semantic_task = asyncio.create_task(semantic_search(query, top_k))
+    query_vector = await get_embedding(query)
+
+    if query_vector:
+        vector_results, hybrid_results = await asyncio.gather(
+            vector_search(query_vector, top_k),
+            hybrid_search(query, query_vector, top_k)
+        )
+    else:
+        vector_results, hybrid_results = [], []
+
+    return {
+        "semantic": await semantic_task,
+        "vector": vector_results,
+        "hybrid": hybrid_results
+    }
+
+
+async def test_search():
+    """
+    测试异步搜索功能
+    """
+    query = "SharePoint文档管理"
+
+    try:
+        results = await search_all_modes(query)
+    finally:
+        await close_async_clients()
+
+    for mode, mode_results in results.items():
+        print(f"=== {mode} ===")
+        for i, result in enumerate(mode_results, 1):
+            print(f"{i}. {result['title']} (Score: {result['score']:.4f})")
+        print()
+
+
+if __name__ == "__main__":
+    asyncio.run(test_search())
@@ -0,0 +1,209 @@
+"""
+各检索模式的延迟与吞吐基准测试
+在本地启动桩服务（同时充当 Azure AI Search 和 Azure OpenAI），按指定并发驱动
+semantic_search、vector_search、hybrid_search 和 get_embedding，统计:
+- 延迟 p50/p95/p99、QPS
+- 每次查询的内存分配峰值（tracemalloc，单独的顺序采样，不影响计时）
+- 每次查询的 HTTP 请求数和请求/响应字节数
+结果可以输出为 JSON，便于在 CI 中与基线比较
+
+    python benchmarks/bench_retrieval.py --queries 500 --concurrency 1,8 --latency 0.002 --output bench.json
+    python benchmarks/bench_retrieval.py --recording recorded.json --modes semantic,hybrid
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.stub_server import StubSearchServer
+
+MODES = ("semantic", "vector", "hybrid", "embedding")
+
+
+def percentile(sorted_values, p):
+    """
+    最近秩法百分位数，sorted_values 需已排序
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def configure_environment(endpoint, cache):
+    # 必须在导入 config / Azure_SDK 之前设置，环境变量优先于 .env
+    os.environ["SEARCH_ENDPOINT"] = endpoint
+    os.environ["SEARCH_API_KEY"] = "bench-key"
+    os.environ["AZURE_OPENAI_ENDPOINT"] = endpoint
+    os.environ["AZURE_OPENAI_API_KEY"] = "bench-key"
+    os.environ["LOCAL_VECTOR_SEARCH_MODE"] = "off"
+    os.environ["RESULT_CACHE_ENABLED"] = "true" if cache else "false"
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "true" if cache else "false"
+
+
+def make_calls(sdk, query_vector):
+    """
+    返回 {模式: fn(i)}，fn 返回结果，出错（函数内部吞掉异常后返回空结果）时返回假值
+    """
+    def query(i):
+        return f"SharePoint文档管理 {i}"
+
+    return {
+        "semantic": lambda i: sdk.semantic_search(query(i)),
+        "vector": lambda i: sdk.vector_search(query_vector),
+        "hybrid": lambda i: sdk.hybrid_search(query(i), query_vector),
+        "embedding": lambda i: sdk.get_embedding(query(i)),
+    }
+
+
+def run_timed(call, queries, concurrency):
+    timings = [0.0] * queries
+
+    def task(i):
+        start = time.perf_counter()
+        result = call(i)
+        timings[i] = time.perf_counter() - start
+        return bool(result) if not isinstance(result, list) else len(result) > 0
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        outcomes = [task(i) for i in range(queries)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(task, range(queries)))
+    elapsed = time.perf_counter() - started
+    errors = sum(1 for ok in outcomes if not ok)
+    return timings, elapsed, errors
+
+
+def measure_allocations(call, samples):
+    """
+    顺序执行 samples 次，返回每次调用 tracemalloc 峰值（相对调用前）的平均字节数
+    """
+    peaks = []
+    tracemalloc.start()
+    try:
+        for i in range(samples):
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            call(i)
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+    return statistics.mean(peaks) if peaks else None
+
+
+def bench_mode(stub, mode, call, queries, concurrency, warmup, alloc_samples):
+    for i in range(warmup):
+        call(i)
+
+    stub.reset_stats()
+    timings, elapsed, errors = run_timed(call, queries, concurrency)
+    stats = dict(stub.stats)
+    alloc = measure_allocations(call, alloc_samples) if alloc_samples else None
+
+    timings_ms = sorted(t * 1000 for t in timings)
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "queries": queries,
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "qps": queries / elapsed if elapsed else None,
+        "latency_ms": {
+            "mean": statistics.mean(timings_ms),
+            "p50": percentile(timings_ms, 50),
+            "p95": percentile(timings_ms, 95),
+            "p99": percentile(timings_ms, 99),
+            "max": timings_ms[-1],
+        },
+        "alloc_peak_bytes_per_query": alloc,
+        "http_requests_per_query": stats["requests"] / queries,
+        "request_bytes_per_query": stats["bytes_in"] / queries,
+        "response_bytes_per_query": stats["bytes_out"] / queries,
+        "connections": stats["connections"],
+    }
+
+
+def print_table(results, file=sys.stdout):
+    print(f"{'mode':<10} {'conc':>4} {'qps':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'alloc':>9} "
+          f"{'req/q':>6} {'in B/q':>8} {'out B/q':>9} {'err':>4}", file=file)
+    for r in results:
+        latency = r["latency_ms"]
+        alloc = f"{r['alloc_peak_bytes_per_query'] / 1024:.1f}K" if r["alloc_peak_bytes_per_query"] else "-"
+        print(f"{r['mode']:<10} {r['concurrency']:>4} {r['qps']:>9.1f} {latency['p50']:>7.2f}m {latency['p95']:>7.2f}m "
+              f"{latency['p99']:>7.2f}m {alloc:>9} {r['http_requests_per_query']:>6.2f} "
+              f"{r['request_bytes_per_query']:>8.0f} {r['response_bytes_per_query']:>9.0f} {r['errors']:>4}", file=file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default=",".join(MODES), help=f"逗号分隔，可选 {', '.join(MODES)}")
+    parser.add_argument("--queries", type=int, default=300, help="每个模式、每档并发的查询次数")
+    parser.add_argument("--concurrency", default="1,8", help="逗号分隔的并发档位")
+    parser.add_argument("--latency", type=float, default=0.0, help="检索接口的模拟延迟（秒）")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="embeddings 接口的模拟延迟（秒）")
+    parser.add_argument("--recording", help="录制的响应文件（见 stub_server 说明）")
+    parser.add_argument("--cache", action="store_true", help="启用结果缓存和嵌入缓存（默认关闭，测量无缓存的热路径）")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--alloc-samples", type=int, default=50, help="内存分配采样次数，0 表示不采样")
+    parser.add_argument("--output", help="把结果写入 JSON 文件")
+    parser.add_argument("--json", action="store_true", help="在标准输出打印 JSON（表格改为输出到标准错误）")
+    args = parser.parse_args()
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"未知的模式: {', '.join(sorted(unknown))}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    stub_kwargs = {"latency": args.latency, "embedding_latency": args.embedding_latency}
+    stub = StubSearchServer.from_recording(args.recording, **stub_kwargs) if args.recording else StubSearchServer(**stub_kwargs)
+    with stub:
+        configure_environment(stub.endpoint, args.cache)
+        import Azure_SDK
+
+        query_vector = Azure_SDK.get_embedding("SharePoint文档管理")
+        if query_vector is None:
+            raise SystemExit("无法从桩服务获取嵌入向量")
+        calls = make_calls(Azure_SDK, query_vector)
+
+        results = []
+        for mode in modes:
+            for concurrency in levels:
+                results.append(bench_mode(
+                    stub, mode, calls[mode], args.queries, concurrency, args.warmup, args.alloc_samples
+                ))
+
+    report = {
+        "config": {
+            "modes": modes,
+            "queries": args.queries,
+            "concurrency": levels,
+            "latency_s": args.latency,
+            "embedding_latency_s": args.embedding_latency,
+            "recording": args.recording,
+            "cache": args.cache,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    print_table(results, file=sys.stderr if args.json else sys.stdout)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.json:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
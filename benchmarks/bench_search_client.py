@@ -0,0 +1,77 @@
+"""
+对比每次查询新建 SearchClient 与复用共享客户端的单次查询开销
+
+    python benchmarks/bench_search_client.py --queries 500 --latency 0.001
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from azure.core.credentials import AzureKeyCredential
+from azure.search.documents import SearchClient
+
+from search_clients import SearchClientRegistry
+from benchmarks.stub_server import StubSearchServer
+
+INDEX = "bench-index"
+
+
+def run_query(search_client):
+    return list(search_client.search(search_text="SharePoint文档管理", top=5))
+
+
+def bench_fresh_client(endpoint, credential, queries):
+    timings = []
+    for _ in range(queries):
+        start = time.perf_counter()
+        # 与改造前的 semantic_search / hybrid_search / vector_search 行为一致
+        search_client = SearchClient(endpoint=endpoint, index_name=INDEX, credential=credential)
+        run_query(search_client)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_shared_client(endpoint, credential, queries):
+    registry = SearchClientRegistry()
+    timings = []
+    try:
+        for _ in range(queries):
+            start = time.perf_counter()
+            run_query(registry.get(endpoint, INDEX, credential))
+            timings.append(time.perf_counter() - start)
+    finally:
+        registry.close()
+    return timings
+
+
+def report(name, timings, stats):
+    timings_ms = sorted(t * 1000 for t in timings)
+    p95 = timings_ms[int(len(timings_ms) * 0.95) - 1]
+    print(f"{name:<14} mean={statistics.mean(timings_ms):7.3f}ms  p50={statistics.median(timings_ms):7.3f}ms  "
+          f"p95={p95:7.3f}ms  connections={stats['connections']}  requests={stats['requests']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.0, help="桩服务每个请求的模拟延迟（秒）")
+    parser.add_argument("--warmup", type=int, default=20)
+    args = parser.parse_args()
+
+    credential = AzureKeyCredential("bench-key")
+    with StubSearchServer(latency=args.latency) as stub:
+        print(f"stub endpoint: {stub.endpoint}  queries={args.queries}  latency={args.latency * 1000:.1f}ms")
+        print("（本地 HTTP 无 TLS 握手，真实服务上新建连接的开销更大）")
+
+        for name, bench in (("fresh client", bench_fresh_client), ("shared client", bench_shared_client)):
+            bench(stub.endpoint, credential, args.warmup)
+            stub.reset_stats()
+            timings = bench(stub.endpoint, credential, args.queries)
+            report(name, timings, dict(stub.stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+启动开销基准测试
+每次测量都在新的解释器进程中进行（模块缓存、连接池都是冷的），统计:
+- 导入耗时: 各模块 import 语句本身的耗时，以及包含解释器启动的进程总耗时
+- 首次调用延迟: 导入 Azure_SDK 之后第一次 / 第二次调用 semantic_search、get_embedding 的耗时
+  （第一次包含延迟导入 SDK、创建客户端和建立连接），对象为本地桩服务；--warm-up 时先调用 Azure_SDK.warm_up
+结果取各次运行的中位数
+
+    python benchmarks/bench_startup.py --runs 10
+    python benchmarks/bench_startup.py --modules Azure_SDK,chatbot --output startup.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from benchmarks.stub_server import StubSearchServer
+
+DEFAULT_MODULES = ("config", "Azure_SDK", "chat", "chatbot", "rag", "search_clients", "push_indexer")
+HEAVY_PACKAGES = ("azure", "openai", "requests", "numpy", "aiohttp")
+
+_IMPORT_SNIPPET = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+heavy = sorted({{name.split(".")[0] for name in sys.modules}} & set({heavy!r}))
+print(json.dumps({{"import": elapsed, "modules": len(sys.modules), "heavy": heavy}}))
+"""
+
+_FIRST_CALL_SNIPPET = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+timings = {{}}
+started = time.perf_counter()
+import Azure_SDK
+timings["import"] = time.perf_counter() - started
+if {warm_up!r}:
+    started = time.perf_counter()
+    Azure_SDK.warm_up(background=False)
+    timings["warm_up"] = time.perf_counter() - started
+for name, call in (
+    ("semantic_search", lambda: Azure_SDK.semantic_search("SharePoint文档管理")),
+    ("get_embedding", lambda: Azure_SDK.get_embedding("SharePoint文档管理")),
+):
+    for attempt in ("first", "second"):
+        started = time.perf_counter()
+        result = call()
+        timings[f"{{name}}_{{attempt}}"] = time.perf_counter() - started
+        if not result:
+            raise SystemExit(f"{{name}} 没有返回结果")
+print(json.dumps(timings))
+"""
+
+
+def run_snippet(code, env):
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, cwd=ROOT)
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip() or proc.stdout.strip())
+    # 模块导入时可能有输出，结果在最后一行
+    return json.loads(proc.stdout.strip().splitlines()[-1]), wall
+
+
+def bench_imports(modules, runs, env):
+    results = []
+    for module in modules:
+        imports = []
+        walls = []
+        info = None
+        for _ in range(runs):
+            info, wall = run_snippet(_IMPORT_SNIPPET.format(root=ROOT, module=module, heavy=HEAVY_PACKAGES), env)
+            imports.append(info["import"])
+            walls.append(wall)
+        results.append({
+            "module": module,
+            "import_ms": statistics.median(imports) * 1000,
+            "process_ms": statistics.median(walls) * 1000,
+            "modules_loaded": info["modules"],
+            "heavy_packages": info["heavy"],
+        })
+    return results
+
+
+def bench_first_call(runs, env, latency, warm_up=False):
+    with StubSearchServer(latency=latency) as stub:
+        env = dict(env, SEARCH_ENDPOINT=stub.endpoint, AZURE_OPENAI_ENDPOINT=stub.endpoint)
+        code = _FIRST_CALL_SNIPPET.format(root=ROOT, warm_up=warm_up)
+        samples = [run_snippet(code, env)[0] for _ in range(runs)]
+    return {name: statistics.median(sample[name] for sample in samples) * 1000 for name in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", default=",".join(DEFAULT_MODULES), help="逗号分隔的模块名")
+    parser.add_argument("--runs", type=int, default=5, help="每项测量的进程数")
+    parser.add_argument("--latency", type=float, default=0.0, help="桩服务的模拟延迟（秒）")
+    parser.add_argument("--skip-first-call", action="store_true", help="只测量导入耗时")
+    parser.add_argument("--warm-up", action="store_true", help="首次调用之前先执行 Azure_SDK.warm_up")
+    parser.add_argument("--output", help="把结果写入 JSON 文件")
+    parser.add_argument("--json", action="store_true", help="在标准输出打印 JSON（表格改为输出到标准错误）")
+    args = parser.parse_args()
+
+    # 没有凭据也要能导入；关闭缓存，首次调用一定会访问桩服务
+    env = dict(
+        os.environ,
+        SEARCH_API_KEY="bench-key",
+        AZURE_OPENAI_API_KEY="bench-key",
+        RESULT_CACHE_ENABLED="false",
+        EMBEDDING_CACHE_ENABLED="false",
+        LOCAL_VECTOR_SEARCH_MODE="off",
+    )
+    modules = [module.strip() for module in args.modules.split(",") if module.strip()]
+    report = {
+        "config": {
+            "runs": args.runs,
+            "latency_s": args.latency,
+            "warm_up": args.warm_up,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "imports": bench_imports(modules, args.runs, env),
+        "first_call_ms": None if args.skip_first_call else bench_first_call(args.runs, env, args.latency, args.warm_up),
+    }
+
+    out = sys.stderr if args.json else sys.stdout
+    print(f"{'module':<16} {'import':>9} {'process':>9} {'modules':>8}  heavy", file=out)
+    for r in report["imports"]:
+        print(f"{r['module']:<16} {r['import_ms']:>7.1f}ms {r['process_ms']:>7.1f}ms {r['modules_loaded']:>8}  "
+              f"{','.join(r['heavy_packages']) or '-'}", file=out)
+    if report["first_call_ms"]:
+        print(file=out)
+        for name, value in report["first_call_ms"].items():
+            print(f"{name:<24} {value:>8.2f}ms", file=out)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.json:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
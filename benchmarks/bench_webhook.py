@@ -0,0 +1,424 @@
+"""
+webhook 变更同步链路压测
+在同一个进程中启动 fastWeb.app（uvicorn）、本地 Graph 桩（登录、delta 分页、文件下载）和检索服务桩，
+先完成一次初始全量同步，再按指定速率发送变更通知风暴，统计:
+- 应答延迟: POST /api/notify 返回的耗时
+- 变更落盘延迟: 桩服务中文件变更到新版本出现在下载目录的耗时（按 --poll-interval 轮询，精度受其限制）
+- 内存: 进程 RSS 峰值（包含桩服务和压测本身），以及提取进程池子进程的 RSS 峰值
+- 同步次数: worker 池执行次数、合并的通知数、实际发起的 delta 同步、没有任何变更的空同步、下载了已过期版本的次数
+
+    python benchmarks/bench_webhook.py --files 2000 --file-size 65536 --notifications 500 --rate 100
+    python benchmarks/bench_webhook.py --notifications 200 --changes 5 --push-indexing --output webhook.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "sharepoint_update"))
+import requests
+
+from benchmarks.graph_stub import GraphStubServer, read_version
+from benchmarks.stub_server import StubSearchServer
+from benchmarks.bench_retrieval import percentile
+
+CLIENT_STATE = "bench-client-state"
+SUBSCRIPTION_ID = "bench-subscription"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # 非 Linux 平台只能取历史峰值
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class DiskWatcher:
+    """
+    轮询下载目录（文件保存在按条目 id 划分的子目录中），记录每个文件各版本第一次出现的时间
+    """
+
+    def __init__(self, directory, interval=0.005):
+        self.directory = directory
+        self.interval = interval
+        self.observed = {}
+        self.latest = {}
+        self._seen = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="disk-watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _entries(self):
+        try:
+            item_dirs = [entry for entry in os.scandir(self.directory) if entry.is_dir() and not entry.name.startswith(".")]
+        except FileNotFoundError:
+            return []
+        entries = []
+        for item_dir in item_dirs:
+            try:
+                entries.extend(entry for entry in os.scandir(item_dir.path) if not entry.name.startswith("."))
+            except FileNotFoundError:
+                continue
+        return entries
+
+    def _scan(self):
+        entries = self._entries()
+        now = time.perf_counter()
+        for entry in entries:
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+            if self._seen.get(entry.path) == signature:
+                continue
+            self._seen[entry.path] = signature
+            version = read_version(entry.path)
+            if version is None:
+                continue
+            item_id, number = version
+            with self._lock:
+                self.observed.setdefault(item_id, []).append((number, now))
+                self.latest[item_id] = max(number, self.latest.get(item_id, 0))
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._scan()
+            self._stop.wait(self.interval)
+
+    def has(self, item_id, version):
+        with self._lock:
+            return self.latest.get(item_id, 0) >= version
+
+    def first_seen(self, item_id, version, after):
+        """
+        版本不低于 version 的文件在 after 之后第一次出现的时间，没有出现返回 None
+        """
+        with self._lock:
+            times = [t for number, t in self.observed.get(item_id, ()) if number >= version and t >= after]
+        return min(times) if times else None
+
+
+class MemorySampler:
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+
+    def start(self):
+        self.peak = rss_bytes()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.peak
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+
+def configure_environment(args, workdir, graph, search):
+    # 必须在导入 fastWeb 之前设置，环境变量优先于 .env
+    os.environ.update({
+        "GRAPH_ENDPOINT": graph.endpoint,
+        "LOGIN_ENDPOINT": graph.endpoint,
+        "SHAREPOINT_TENANT_ID": "bench-tenant",
+        "SHAREPOINT_APP_ID": "bench-app",
+        "SHAREPOINT_CLIENT_SECRET": "bench-secret",
+        "SHAREPOINT_DRIVE_ID": "bench-drive",
+        "SUBSCRIPTION_CLIENT_STATE": CLIENT_STATE,
+        "SYNC_WORKERS": str(args.sync_workers),
+        "DOWNLOAD_WORKERS": str(args.download_workers),
+        "NOTIFY_RETRY_INTERVAL": str(args.retry_interval),
+        "NOTIFY_QUEUE_PATH": os.path.join(workdir, "notify_queue.db"),
+        "DELTA_STORE_PATH": os.path.join(workdir, "delta_links.db"),
+        "DOWNLOADS_DIR": os.path.join(workdir, "downloads"),
+        "CHUNK_MANIFEST_PATH": os.path.join(workdir, "chunk_manifest.db"),
+        "RESULT_CACHE_STAMP_PATH": os.path.join(workdir, "result_cache.stamp"),
+        "PUSH_INDEXING_ENABLED": "true" if args.push_indexing else "false",
+        "SEARCH_ENDPOINT": search.endpoint,
+        "SEARCH_API_KEY": "bench-key",
+        "AZURE_OPENAI_ENDPOINT": search.endpoint,
+        "AZURE_OPENAI_API_KEY": "bench-key",
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.db"),
+    })
+
+
+def notification_body(batch):
+    return {
+        "value": [
+            {
+                "subscriptionId": SUBSCRIPTION_ID,
+                "clientState": CLIENT_STATE,
+                "changeType": "updated",
+                "resource": "/drives/bench-drive/root",
+                "resourceData": {"@odata.type": "#Microsoft.Graph.DriveItem"},
+            }
+            for _ in range(batch)
+        ]
+    }
+
+
+def wait_on_disk(watcher, expected, timeout):
+    """
+    等待 expected（{id: version}）全部落盘，返回是否在 timeout 内完成
+    """
+    deadline = time.perf_counter() + timeout
+    pending = dict(expected)
+    while pending and time.perf_counter() < deadline:
+        pending = {item_id: version for item_id, version in pending.items() if not watcher.has(item_id, version)}
+        if pending:
+            time.sleep(0.01)
+    return not pending
+
+
+def run_storm(args, graph, notify_url):
+    """
+    开环发送通知: 第 i 条在 start + i / rate 时刻修改 --changes 个文件并发送
+    返回 (应答耗时列表, 应答状态计数, [(id, version, 变更时间)])
+    """
+    local = threading.local()
+    changes = []
+    changes_lock = threading.Lock()
+    acks = []
+    statuses = {}
+    start = time.perf_counter()
+
+    def send(i):
+        if args.rate:
+            delay = start + i / args.rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        changed = graph.change(args.changes, start=i * args.changes) + graph.add(args.adds)
+        changed_at = time.perf_counter()
+        with changes_lock:
+            changes.extend((item_id, version, changed_at) for item_id, version in changed)
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        sent = time.perf_counter()
+        try:
+            status = session.post(notify_url, json=notification_body(args.batch), timeout=30).status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - sent
+        with changes_lock:
+            acks.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    with ThreadPoolExecutor(max_workers=args.senders) as executor:
+        list(executor.map(send, range(args.notifications)))
+    return acks, statuses, changes
+
+
+def summarize(values_s):
+    if not values_s:
+        return None
+    values_ms = sorted(v * 1000 for v in values_s)
+    return {
+        "count": len(values_ms),
+        "mean": statistics.mean(values_ms),
+        "p50": percentile(values_ms, 50),
+        "p95": percentile(values_ms, 95),
+        "p99": percentile(values_ms, 99),
+        "max": values_ms[-1],
+    }
+
+
+def print_report(report, file=sys.stdout):
+    initial = report["initial_sync"]
+    print(f"初始同步: {initial['files']} 个文件，{initial['seconds']:.2f}s，完成={initial['completed']}", file=file)
+    for name, label in (("ack_ms", "应答延迟"), ("change_to_disk_ms", "变更落盘延迟")):
+        s = report[name]
+        if s:
+            print(f"{label}: n={s['count']} p50={s['p50']:.2f}ms p95={s['p95']:.2f}ms p99={s['p99']:.2f}ms "
+                  f"max={s['max']:.2f}ms", file=file)
+    storm = report["storm"]
+    print(f"通知: {storm['notifications']} 条，{storm['seconds']:.2f}s，状态 {storm['ack_statuses']}，"
+          f"未落盘的变更 {storm['missing_changes']}", file=file)
+    syncs = report["syncs"]
+    print(f"同步: worker 执行 {syncs['runs']} 次，合并 {syncs['coalesced']} 条，delta 同步 {syncs['delta_syncs']} 次"
+          f"（空同步 {syncs['empty_syncs']}），delta 请求 {syncs['delta_requests']}，"
+          f"下载 {syncs['downloads']}（过期版本 {syncs['stale_downloads']}），token 请求 {syncs['token_requests']}", file=file)
+    memory = report["memory"]
+    print(f"内存: 基线 {memory['baseline_rss'] / 2 ** 20:.1f}MB，峰值 {memory['peak_rss'] / 2 ** 20:.1f}MB，"
+          f"子进程峰值 {memory['children_max_rss'] / 2 ** 20:.1f}MB", file=file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=500, help="初始文件数")
+    parser.add_argument("--file-size", type=int, default=64 * 1024, help="合成文件大小（字节）")
+    parser.add_argument("--page-size", type=int, default=200, help="delta 每页条数")
+    parser.add_argument("--notifications", type=int, default=300, help="通知风暴中的 POST 次数")
+    parser.add_argument("--batch", type=int, default=1, help="每次 POST 中的通知条数")
+    parser.add_argument("--changes", type=int, default=2, help="每次 POST 之前修改的文件数")
+    parser.add_argument("--adds", type=int, default=0, help="每次 POST 之前新增的文件数")
+    parser.add_argument("--rate", type=float, default=50.0, help="每秒 POST 次数，0 表示尽快发送")
+    parser.add_argument("--senders", type=int, default=16, help="发送通知的并发线程数")
+    parser.add_argument("--sync-workers", type=int, default=4)
+    parser.add_argument("--download-workers", type=int, default=4)
+    parser.add_argument("--retry-interval", type=float, default=5.0, help="NOTIFY_RETRY_INTERVAL")
+    parser.add_argument("--delta-latency", type=float, default=0.0, help="delta 接口的模拟延迟（秒）")
+    parser.add_argument("--download-latency", type=float, default=0.0, help="下载接口的模拟延迟（秒）")
+    parser.add_argument("--push-indexing", action="store_true", help="同时提取、嵌入并推送到检索服务桩")
+    parser.add_argument("--poll-interval", type=float, default=0.005, help="下载目录轮询间隔（秒）")
+    parser.add_argument("--drain-timeout", type=float, default=120.0, help="等待全部变更落盘的最长时间（秒）")
+    parser.add_argument("--workdir", help="队列、检查点和下载文件的目录，默认使用临时目录并在结束后删除")
+    parser.add_argument("--log", help="fastWeb 输出的日志文件，默认写入工作目录")
+    parser.add_argument("--output", help="把结果写入 JSON 文件")
+    parser.add_argument("--json", action="store_true", help="在标准输出打印 JSON（摘要改为输出到标准错误）")
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="bench-webhook-")
+    os.makedirs(workdir, exist_ok=True)
+    graph = GraphStubServer(
+        files=args.files, file_size=args.file_size, page_size=args.page_size,
+        delta_latency=args.delta_latency, download_latency=args.download_latency
+    )
+    search = StubSearchServer()
+    log = open(args.log or os.path.join(workdir, "fastweb.log"), "w", encoding="utf-8")
+    stdout = sys.stdout
+    cwd = os.getcwd()
+    try:
+        with graph, search:
+            configure_environment(args, workdir, graph, search)
+            # fastWeb 的旧版 delta_links.json 等相对路径落在工作目录中
+            os.chdir(workdir)
+            # 服务的逐条日志写入文件，不与压测输出混在一起
+            sys.stdout = log
+            import uvicorn
+            import fastWeb
+
+            port = free_port()
+            server = uvicorn.Server(uvicorn.Config(
+                fastWeb.app, host="127.0.0.1", port=port, log_level="warning", access_log=False
+            ))
+            server_thread = threading.Thread(target=server.run, name="uvicorn", daemon=True)
+            server_thread.start()
+            while not server.started:
+                time.sleep(0.01)
+            notify_url = f"http://127.0.0.1:{port}/api/notify"
+            watcher = DiskWatcher(os.environ["DOWNLOADS_DIR"], args.poll_interval).start()
+
+            try:
+                # 初始全量同步
+                started = time.perf_counter()
+                requests.post(notify_url, json=notification_body(1), timeout=30)
+                initial_ok = wait_on_disk(watcher, {item_id: 1 for item_id in graph.item_ids()}, args.drain_timeout)
+                initial_seconds = time.perf_counter() - started
+                fastWeb.SYNC_POOL.join()
+
+                graph.reset_stats()
+                pool_before = dict(fastWeb.SYNC_POOL.stats)
+                baseline_rss = rss_bytes()
+                sampler = MemorySampler().start()
+
+                storm_started = time.perf_counter()
+                acks, statuses, changes = run_storm(args, graph, notify_url)
+                storm_seconds = time.perf_counter() - storm_started
+                latest = {}
+                for item_id, version, _ in changes:
+                    latest[item_id] = max(version, latest.get(item_id, 0))
+                wait_on_disk(watcher, latest, args.drain_timeout)
+                fastWeb.SYNC_POOL.join()
+                peak_rss = sampler.stop()
+            finally:
+                watcher.stop()
+                server.should_exit = True
+                server_thread.join()
+    finally:
+        sys.stdout = stdout
+        os.chdir(cwd)
+        log.close()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    to_disk = []
+    missing = 0
+    for item_id, version, changed_at in changes:
+        seen = watcher.first_seen(item_id, version, changed_at)
+        if seen is None:
+            missing += 1
+        else:
+            to_disk.append(seen - changed_at)
+    pool = {name: value - pool_before.get(name, 0) for name, value in fastWeb.SYNC_POOL.stats.items()}
+    scale = 1 if sys.platform == "darwin" else 1024
+
+    report = {
+        "config": {
+            name: getattr(args, name) for name in (
+                "files", "file_size", "page_size", "notifications", "batch", "changes", "adds", "rate", "senders",
+                "sync_workers", "download_workers", "delta_latency", "download_latency", "push_indexing",
+                "poll_interval",
+            )
+        } | {"python": platform.python_version(), "platform": platform.platform()},
+        "initial_sync": {"files": args.files, "seconds": initial_seconds, "completed": initial_ok},
+        "ack_ms": summarize(acks),
+        "change_to_disk_ms": summarize(to_disk),
+        "storm": {
+            "notifications": args.notifications,
+            "seconds": storm_seconds,
+            "ack_statuses": {str(status): count for status, count in statuses.items()},
+            "changes": len(changes),
+            "missing_changes": missing,
+        },
+        "syncs": {
+            "notifications": pool.get("notifications", 0),
+            "coalesced": pool.get("coalesced", 0),
+            "runs": pool.get("runs", 0),
+            **{name: graph.stats[name] for name in (
+                "delta_syncs", "empty_syncs", "delta_requests", "delta_items", "downloads", "stale_downloads",
+                "token_requests",
+            )},
+            "indexed": search.stats["indexed"],
+        },
+        "memory": {
+            "baseline_rss": baseline_rss,
+            "peak_rss": peak_rss,
+            "children_max_rss": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+        },
+    }
+    print_report(report, file=sys.stderr if args.json else sys.stdout)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.json:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
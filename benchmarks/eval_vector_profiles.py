@@ -0,0 +1,253 @@
+"""
+向量索引配置的离线评估
+在本地向量样本上以全维 float32 精确检索为基准，统计每种索引配置（vector_profiles）的:
+- recall@k: 配置返回的 top-k 与精确 top-k 的重合比例；压缩配置同时给出不重新打分（raw）和
+  取 k * oversampling 个候选后用原始向量重新打分的结果（与索引的 rescoring 设置对应）
+- 每次查询的扫描耗时（单条查询顺序执行，numpy 暴力扫描，用于配置间的相对比较，不代表服务端延迟）
+- 每个向量在向量索引中占用的字节数，以及相对 float32 全维的压缩比
+检索服务使用 HNSW 近似检索，这里对每种表示都做精确扫描，只衡量截取维度和量化本身带来的损失
+
+向量样本（任选其一）:
+- --local-index: 本地向量索引镜像目录（sync_local_vector_index 生成）
+- --vectors: .npy 文件，每行一个向量
+- 都不指定时生成合成向量（各维方差递减、带簇结构，只用于验证脚本，结论以真实向量为准）
+查询向量默认从样本中留出 --queries 条（不参与建库），也可以用 --query-vectors 指定
+
+需要 numpy（pip install ".[local-index]"）
+
+    python benchmarks/eval_vector_profiles.py --local-index local_vector_index --queries 200 --k 10
+    python benchmarks/eval_vector_profiles.py --vectors sample.npy --profiles int8,binary,binary-1024 --oversampling 4,10
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    raise SystemExit('需要 numpy: pip install ".[local-index]"')
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.bench_retrieval import percentile
+from vector_profiles import DEFAULT_PROFILES, VectorProfile
+
+# 每个字节中 1 的个数，numpy 2.0 之前没有 bitwise_count
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _popcount(bits):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bits)
+    return _POPCOUNT[bits]
+
+
+def _top(scores, k):
+    """
+    分数最高的 k 个下标（按分数降序）
+    """
+    k = min(k, len(scores))
+    index = np.argpartition(-scores, k - 1)[:k]
+    return index[np.argsort(-scores[index])]
+
+
+def load_local_index(path, limit=None):
+    """
+    读取本地向量索引镜像中现存的向量（已删除的行不读取）
+    """
+    matrix = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+    db = sqlite3.connect(os.path.join(path, "meta.db"))
+    try:
+        rows = [row for (row,) in db.execute("SELECT row FROM rows WHERE id IS NOT NULL ORDER BY row")]
+    finally:
+        db.close()
+    if limit:
+        rows = rows[:limit]
+    return np.asarray(matrix[rows], dtype=np.float32)
+
+
+def synthetic_vectors(count, dimensions, clusters=64, seed=0):
+    """
+    合成向量: 簇中心加噪声，第 i 维的尺度为 1 / sqrt(1 + i / 64)，靠前的维度信息更多（近似 Matryoshka 嵌入）
+    """
+    rng = np.random.default_rng(seed)
+    scale = (1.0 / np.sqrt(1.0 + np.arange(dimensions) / 64.0)).astype(np.float32)
+    centers = rng.standard_normal((clusters, dimensions), dtype=np.float32) * scale
+    labels = rng.integers(0, clusters, count)
+    noise = rng.standard_normal((count, dimensions), dtype=np.float32) * scale * 0.8
+    return _normalize(centers[labels] + noise)
+
+
+class ProfileIndex:
+    """
+    按配置截取维度、量化后的暴力扫描索引
+    int8 按维度取 min/max 线性量化到 256 级；binary 按符号取 1 位，用汉明距离排序
+    """
+
+    def __init__(self, profile, corpus):
+        self.profile = profile
+        self.dimensions = min(profile.dimensions, corpus.shape[1])
+        # 重新打分使用截取后的原始向量
+        self.originals = _normalize(corpus[:, :self.dimensions])
+        if profile.compression == "int8":
+            low = self.originals.min(axis=0)
+            step = (self.originals.max(axis=0) - low) / 255.0
+            step[step == 0] = 1.0
+            self.step = step
+            self.codes = (np.rint((self.originals - low) / step) - 128).astype(np.int8)
+            # numpy 没有 int8 矩阵乘法的 BLAS 实现，扫描时使用 float32 副本，耗时差异主要来自重新打分
+            self._scan = self.codes.astype(np.float32)
+        elif profile.compression == "binary":
+            self.codes = np.packbits(self.originals > 0, axis=1)
+
+    @property
+    def bytes_per_vector(self):
+        return VectorProfile(self.profile.compression, self.dimensions).bytes_per_vector
+
+    def prepare_query(self, query):
+        return _normalize(query[None, :self.dimensions])[0]
+
+    def approximate_scores(self, query):
+        if self.profile.compression == "int8":
+            # doc ≈ low + step * (code + 128)，与 query 的点积中只有 code 项随文档变化
+            return self._scan @ (self.step * query)
+        if self.profile.compression == "binary":
+            bits = np.packbits(query > 0)
+            return -_popcount(self.codes ^ bits).sum(axis=1, dtype=np.int32).astype(np.float32)
+        return self.originals @ query
+
+    def search(self, query, k, oversampling=None):
+        """
+        oversampling 为 None 时只按压缩表示排序，否则取 k * oversampling 个候选后用原始向量重新打分
+        """
+        scores = self.approximate_scores(query)
+        if self.profile.compression == "float32" or oversampling is None:
+            return _top(scores, k)
+        candidates = _top(scores, max(k, int(k * oversampling)))
+        return candidates[_top(self.originals[candidates] @ query, k)]
+
+
+def recall(found, expected):
+    return len(set(found.tolist()) & set(expected.tolist())) / len(expected)
+
+
+def evaluate(index, queries, truth, k, oversampling):
+    recalls = []
+    timings = []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        found = index.search(index.prepare_query(query), k, oversampling)
+        timings.append(time.perf_counter() - started)
+        recalls.append(recall(found, expected))
+    timings.sort()
+    return {
+        "recall": float(np.mean(recalls)),
+        "p50_ms": percentile(timings, 50) * 1000,
+        "p95_ms": percentile(timings, 95) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--local-index", help="本地向量索引镜像目录")
+    parser.add_argument("--vectors", help=".npy 向量样本")
+    parser.add_argument("--query-vectors", help=".npy 查询向量，不指定时从样本中留出")
+    parser.add_argument("--limit", type=int, help="最多使用的样本条数")
+    parser.add_argument("--synthetic", type=int, default=20000, help="没有样本时生成的合成向量条数")
+    parser.add_argument("--dim", type=int, default=3072, help="合成向量维度")
+    parser.add_argument("--queries", type=int, default=200, help="留出的查询条数")
+    parser.add_argument("--k", type=int, default=10, help="recall@k 的 k")
+    parser.add_argument("--profiles", default=",".join(DEFAULT_PROFILES), help="逗号分隔的索引配置名")
+    parser.add_argument("--oversampling", help="逗号分隔的过采样倍数，默认为 VECTOR_OVERSAMPLING")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="把结果写入 JSON 文件")
+    parser.add_argument("--json", action="store_true", help="在标准输出打印 JSON（表格改为输出到标准错误）")
+    args = parser.parse_args()
+
+    if args.local_index:
+        sample, source = load_local_index(args.local_index, args.limit), args.local_index
+    elif args.vectors:
+        sample, source = np.load(args.vectors, mmap_mode="r")[:args.limit], args.vectors
+    else:
+        sample, source = synthetic_vectors(args.synthetic, args.dim, seed=args.seed), "synthetic"
+    sample = _normalize(sample)
+
+    if args.query_vectors:
+        corpus, queries = sample, _normalize(np.load(args.query_vectors))[:args.queries]
+    else:
+        order = np.random.default_rng(args.seed).permutation(len(sample))
+        queries, corpus = sample[order[:args.queries]], sample[order[args.queries:]]
+    if len(corpus) < args.k or not len(queries):
+        raise SystemExit(f"样本太少: {len(corpus)} 条建库向量，{len(queries)} 条查询")
+    if queries.shape[1] != corpus.shape[1]:
+        raise SystemExit(f"查询向量维度 {queries.shape[1]} 与样本维度 {corpus.shape[1]} 不一致")
+
+    profiles = [VectorProfile.parse(name) for name in args.profiles.split(",") if name.strip()]
+    oversampling = [float(value) for value in args.oversampling.split(",")] if args.oversampling else None
+
+    # 基准: 全维 float32 精确检索
+    baseline = ProfileIndex(VectorProfile("float32", corpus.shape[1]), corpus)
+    truth = [baseline.search(query, args.k) for query in queries]
+    full_bytes = baseline.bytes_per_vector
+
+    results = []
+    for profile in profiles:
+        index = ProfileIndex(profile, corpus)
+        row = {
+            "profile": profile.name,
+            "dimensions": index.dimensions,
+            "compression": profile.compression,
+            "bytes_per_vector": index.bytes_per_vector,
+            "compression_ratio": full_bytes / index.bytes_per_vector,
+        }
+        if profile.compression == "float32":
+            results.append(dict(row, oversampling=None, raw_recall=None, **evaluate(index, queries, truth, args.k, None)))
+            continue
+        raw_recall = evaluate(index, queries, truth, args.k, None)["recall"]
+        for factor in oversampling or [profile.oversampling]:
+            results.append(dict(row, oversampling=factor, raw_recall=raw_recall,
+                                **evaluate(index, queries, truth, args.k, factor)))
+
+    report = {
+        "config": {
+            "source": source,
+            "corpus": len(corpus),
+            "queries": len(queries),
+            "dimensions": int(corpus.shape[1]),
+            "k": args.k,
+            "numpy": np.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+    out = sys.stderr if args.json else sys.stdout
+    print(f"样本 {source}: {len(corpus)} 条向量 x {corpus.shape[1]} 维，{len(queries)} 条查询，recall@{args.k}", file=out)
+    print(f"{'profile':<14} {'dims':>5} {'bytes':>6} {'ratio':>6} {'oversamp':>8} {'raw':>6} {'recall':>6} "
+          f"{'p50':>8} {'p95':>8}", file=out)
+    for r in results:
+        oversamp = "-" if r["oversampling"] is None else f"{r['oversampling']:g}"
+        raw = "-" if r["raw_recall"] is None else f"{r['raw_recall']:.3f}"
+        print(f"{r['profile']:<14} {r['dimensions']:>5} {r['bytes_per_vector']:>6} {r['compression_ratio']:>5.1f}x "
+              f"{oversamp:>8} {raw:>6} {r['recall']:>6.3f} {r['p50_ms']:>6.2f}ms {r['p95_ms']:>6.2f}ms", file=out)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.json:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
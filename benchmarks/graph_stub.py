@@ -0,0 +1,290 @@
+"""
+本地 Microsoft Graph / 登录服务桩
+只实现 webhook 同步链路用到的接口:
+- POST /{tenant}/oauth2/v2.0/token: 返回固定的 access token
+- GET /v1.0/drives/{drive}/root/delta: 按变更序号返回 driveItem，超过 page_size 时用 @odata.nextLink 分页
+- GET /download/{id}/{version}: 返回指定大小的合成文件内容，支持 Range
+
+文件内容的第一行为 "{id} {version}"，压测时据此判断磁盘上是哪个版本
+delta/next 链接中的 token 是变更序号，nextLink 额外带上首页时的序号上限和已返回的最后一个序号，
+翻页过程中再次变更的文件序号超出上限，留到下一次同步返回，不会漏掉
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+_FILLER = b"SharePoint document body for webhook load testing. "
+_DOWNLOAD_PATH = re.compile(r"/download/([^/]+)/(\d+)")
+_RANGE = re.compile(r"bytes=(\d+)-")
+
+
+def file_content(item_id, version, size):
+    """
+    合成的文件内容，长度恰好为 size（至少包含第一行）
+    """
+    header = f"{item_id} {version}\n".encode("utf-8")
+    if size <= len(header):
+        return header
+    body_size = size - len(header)
+    repeat = body_size // len(_FILLER) + 1
+    return header + (_FILLER * repeat)[:body_size]
+
+
+def read_version(path):
+    """
+    读取下载文件第一行，返回 (id, version)，格式不符时返回 None
+    """
+    try:
+        with open(path, "rb") as f:
+            parts = f.readline().split()
+    except OSError:
+        return None
+    if len(parts) != 2 or not parts[1].isdigit():
+        return None
+    return parts[0].decode("utf-8"), int(parts[1])
+
+
+class _Item:
+    __slots__ = ("id", "name", "size", "version", "seq", "deleted")
+
+    def __init__(self, item_id, name, size):
+        self.id = item_id
+        self.name = name
+        self.size = size
+        self.version = 0
+        self.seq = 0
+        self.deleted = False
+
+
+class _GraphHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_body(self, body, status=200, content_type="application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.stats_add("bytes_out", len(body))
+
+    def _send_json(self, payload, status=200):
+        self._send_body(json.dumps(payload).encode("utf-8"), status)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        if self.path.endswith("/oauth2/v2.0/token"):
+            self.server.stats_add("token_requests")
+            self._send_json({"token_type": "Bearer", "access_token": "stub-token", "expires_in": self.server.token_lifetime})
+        else:
+            self._send_json({"error": {"code": "NotFound", "message": self.path}}, status=404)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.endswith("/root/delta"):
+            if self.headers.get("Authorization") != "Bearer stub-token":
+                self._send_json({"error": {"code": "InvalidAuthenticationToken"}}, status=401)
+                return
+            if self.server.delta_latency:
+                time.sleep(self.server.delta_latency)
+            self._send_json(self.server.delta_page(url.path, parse_qs(url.query)))
+            return
+
+        m = _DOWNLOAD_PATH.fullmatch(url.path)
+        if m is None:
+            self._send_json({"error": {"code": "NotFound", "message": self.path}}, status=404)
+            return
+        if self.server.download_latency:
+            time.sleep(self.server.download_latency)
+        content = self.server.download(m.group(1), int(m.group(2)))
+        if content is None:
+            self._send_json({"error": {"code": "itemNotFound"}}, status=404)
+            return
+        rng = _RANGE.fullmatch(self.headers.get("Range") or "")
+        if rng:
+            start = int(rng.group(1))
+            if start >= len(content):
+                self._send_body(b"", status=416, headers={"Content-Range": f"bytes */{len(content)}"})
+                return
+            self._send_body(
+                content[start:], status=206, content_type="application/octet-stream",
+                headers={"Content-Range": f"bytes {start}-{len(content) - 1}/{len(content)}"}
+            )
+        else:
+            self._send_body(content, content_type="application/octet-stream")
+
+
+class GraphStubServer(ThreadingHTTPServer):
+    """
+    同一个端口同时充当登录服务、Graph 和文件下载地址
+
+    用法:
+        with GraphStubServer(files=1000, file_size=64 * 1024) as graph:
+            os.environ["GRAPH_ENDPOINT"] = os.environ["LOGIN_ENDPOINT"] = graph.endpoint
+            graph.change(10)
+    """
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, files=100, file_size=64 * 1024, page_size=200,
+                 delta_latency=0.0, download_latency=0.0, token_lifetime=3599):
+        super().__init__((host, port), _GraphHandler)
+        self.file_size = file_size
+        self.page_size = page_size
+        self.delta_latency = delta_latency
+        self.download_latency = download_latency
+        self.token_lifetime = token_lifetime
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._items = {}
+        self._order = []
+        self._next_index = 0
+        # 合成内容只为最新版本缓存一份
+        self._content = {}
+        self.stats = {
+            "token_requests": 0, "delta_requests": 0, "delta_syncs": 0, "empty_syncs": 0, "delta_items": 0,
+            "downloads": 0, "stale_downloads": 0, "bytes_out": 0,
+        }
+        self._thread = None
+        self.add(files)
+
+    @property
+    def endpoint(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stats_add(self, name, value=1):
+        with self._lock:
+            self.stats[name] = self.stats.get(name, 0) + value
+
+    def reset_stats(self):
+        with self._lock:
+            for name in self.stats:
+                self.stats[name] = 0
+
+    def _touch(self, item):
+        # 调用方持有 _lock
+        self._seq += 1
+        item.seq = self._seq
+        item.version += 1
+        self._content.pop(item.id, None)
+
+    def add(self, count, size=None):
+        """
+        新增 count 个文件，返回 [(id, version)]
+        """
+        changed = []
+        with self._lock:
+            for _ in range(count):
+                n = self._next_index
+                self._next_index += 1
+                item = _Item(f"item-{n:06d}", f"file-{n:06d}.txt", size or self.file_size)
+                self._items[item.id] = item
+                self._order.append(item.id)
+                self._touch(item)
+                changed.append((item.id, item.version))
+        return changed
+
+    def change(self, count, start=None):
+        """
+        修改 count 个文件（从 start 开始轮转选取），返回 [(id, version)]
+        """
+        changed = []
+        with self._lock:
+            live = [item_id for item_id in self._order if not self._items[item_id].deleted]
+            if not live:
+                return changed
+            offset = self._seq if start is None else start
+            for i in range(min(count, len(live))):
+                item = self._items[live[(offset + i) % len(live)]]
+                self._touch(item)
+                changed.append((item.id, item.version))
+        return changed
+
+    def delete(self, item_ids):
+        with self._lock:
+            for item_id in item_ids:
+                item = self._items.get(item_id)
+                if item is not None and not item.deleted:
+                    self._touch(item)
+                    item.deleted = True
+
+    def item_ids(self):
+        with self._lock:
+            return [item_id for item_id in self._order if not self._items[item_id].deleted]
+
+    def _item_json(self, item):
+        if item.deleted:
+            return {"id": item.id, "name": item.name, "deleted": {"state": "deleted"}}
+        return {
+            "id": item.id,
+            "name": item.name,
+            "size": item.size,
+            "eTag": f'"{{{item.id}}},{item.version}"',
+            "file": {"mimeType": "text/plain"},
+            "@microsoft.graph.downloadUrl": f"{self.endpoint}/download/{item.id}/{item.version}",
+        }
+
+    def delta_page(self, path, query):
+        """
+        token: 上次同步到的变更序号；until: 本轮同步的序号上限；after: 本轮已返回的最后一个序号
+        """
+        token = int(query.get("token", ["0"])[0])
+        after = int(query.get("after", [str(token)])[0])
+        with self._lock:
+            self.stats["delta_requests"] += 1
+            if "until" in query:
+                until = int(query["until"][0])
+            else:
+                until = self._seq
+                self.stats["delta_syncs"] += 1
+            changed = sorted(
+                (item for item in self._items.values() if after < item.seq <= until), key=lambda item: item.seq
+            )
+            if after == token and not changed:
+                self.stats["empty_syncs"] += 1
+            page = changed[:self.page_size]
+            self.stats["delta_items"] += len(page)
+            value = [self._item_json(item) for item in page]
+        link = f"{self.endpoint}{path}?token="
+        if len(changed) > self.page_size:
+            return {"value": value, "@odata.nextLink": f"{link}{token}&until={until}&after={page[-1].seq}"}
+        return {"value": value, "@odata.deltaLink": f"{link}{until}"}
+
+    def download(self, item_id, version):
+        with self._lock:
+            item = self._items.get(item_id)
+            if item is None or item.deleted:
+                return None
+            self.stats["downloads"] += 1
+            if version < item.version:
+                # 下载时文件已经有更新的版本（Graph 返回的是下载时的最新内容）
+                self.stats["stale_downloads"] += 1
+            content = self._content.get(item_id)
+            if content is None:
+                content = self._content[item_id] = file_content(item.id, item.version, item.size)
+        return content
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -0,0 +1,283 @@
+"""
+本地 Azure AI Search / Azure OpenAI 桩服务
+只实现基准测试需要的接口，按固定延迟返回构造好的（或录制的）响应
+- docs/search.post.search: 返回构造好的检索结果；带 filter 时改为在 documents 中按简单过滤条件查找
+- docs/search.index: 把写入/删除的文档保存在内存中（documents），可注入单条文档的失败状态码
+- openai/deployments/*/embeddings: 按输入文本哈希返回固定的向量，支持 base64 和 float 两种编码
+
+录制文件为 JSON: {"search": 检索接口的原始响应体, "embeddings": embeddings 接口的原始响应体}，两项都可省略
+"""
+import base64
+import hashlib
+import json
+import re
+import threading
+import time
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+_FILTER_CLAUSE = re.compile(
+    r"search\.in\((\w+), '((?:[^']|'')*)', '(.)'\)|(\w+) (eq|gt) '((?:[^']|'')*)'"
+)
+
+
+def match_filter(doc, filter):
+    """
+    只支持推送索引用到的形式: search.in(字段, 'a|b', '|')、字段 eq/gt '值'，用 and 连接
+    """
+    for clause in filter.split(" and "):
+        m = _FILTER_CLAUSE.fullmatch(clause.strip())
+        if m is None:
+            raise ValueError(f"不支持的过滤条件: {clause}")
+        if m.group(1):
+            values = m.group(2).replace("''", "'").split(m.group(3))
+            if doc.get(m.group(1)) not in values:
+                return False
+        else:
+            value = doc.get(m.group(4))
+            expected = m.group(6).replace("''", "'")
+            if value is None or (m.group(5) == "eq" and value != expected) or (m.group(5) == "gt" and value <= expected):
+                return False
+    return True
+
+
+def make_vectors(count, dimensions, seed=0):
+    """
+    生成 count 个确定性的单位向量（不依赖 numpy）
+    """
+    vectors = []
+    for i in range(count):
+        state = (seed * 1000003 + i * 7919 + 1) & 0xFFFFFFFF
+        values = []
+        for _ in range(dimensions):
+            # 线性同余发生器，足够作为桩数据
+            state = (state * 1664525 + 1013904223) & 0xFFFFFFFF
+            values.append(state / 0xFFFFFFFF - 0.5)
+        norm = sum(v * v for v in values) ** 0.5 or 1.0
+        vectors.append([v / norm for v in values])
+    return vectors
+
+
+def load_recording(path):
+    """
+    读取录制文件，返回 (hits, embedding_vectors)，缺少的部分为 None
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        recording = json.load(f)
+    hits = recording["search"]["value"] if "search" in recording else None
+    vectors = None
+    if "embeddings" in recording:
+        vectors = []
+        for item in recording["embeddings"]["data"]:
+            embedding = item["embedding"]
+            if isinstance(embedding, str):
+                embedding = array("f", base64.b64decode(embedding)).tolist()
+            vectors.append(embedding)
+    return hits, vectors
+
+
+def make_hits(count, text_size=200):
+    return [
+        {
+            "@search.score": 1.0 / (i + 1),
+            "id": f"doc-{i}",
+            "parent_id": f"parent-{i // 2}",
+            "title": f"文档 {i}",
+            "chunk_text": "SharePoint文档管理 " * (text_size // 16)
+        }
+        for i in range(count)
+    ]
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    # 使用 HTTP/1.1 以支持 keep-alive 连接复用
+    protocol_version = "HTTP/1.1"
+    # 响应头和响应体分两次写出，关闭 Nagle 避免与 delayed ACK 叠加出 40ms 延迟
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.stats_add("connections")
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_body(self, body, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.stats_add("bytes_out", len(body))
+
+    def _send_json(self, payload, status=200):
+        self._send_body(json.dumps(payload).encode("utf-8"), status)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        self.server.stats_add("requests")
+        self.server.stats_add("bytes_in", len(body))
+
+        if "/embeddings" in self.path:
+            self.server.stats_add("embedding_requests")
+            if self.server.embedding_latency:
+                time.sleep(self.server.embedding_latency)
+            self._send_body(self.server.embeddings_body(json.loads(body)))
+            return
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if "/docs/search.post.search" in self.path:
+            request = json.loads(body) if body else {}
+            if request.get("filter"):
+                self._send_json({"value": self.server.filter_documents(request)})
+            else:
+                self._send_body(self.server.hits_body())
+        elif "/docs/search.index" in self.path:
+            results = self.server.index_actions(json.loads(body)["value"])
+            # 与服务端一致：有任何一条失败时返回 207
+            status = 200 if all(result["status"] for result in results) else 207
+            self._send_json({"value": results}, status=status)
+        else:
+            self._send_json({"error": {"code": "NotFound", "message": self.path}}, status=404)
+
+
+class StubSearchServer(ThreadingHTTPServer):
+    """
+    同一个端口同时充当 Azure AI Search 和 Azure OpenAI 的 endpoint
+
+    用法:
+        with StubSearchServer(latency=0.002) as stub:
+            client = SearchClient(stub.endpoint, "index", AzureKeyCredential("key"))
+    """
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, hits=None, embedding_latency=0.0,
+                 embedding_vectors=None, dimensions=3072):
+        super().__init__((host, port), _StubHandler)
+        self.latency = latency
+        self.embedding_latency = embedding_latency
+        self.hits = hits if hits is not None else make_hits(5)
+        self.dimensions = dimensions
+        # 按文本哈希从向量池中挑选，相同文本总是得到相同向量
+        self.embedding_vectors = embedding_vectors or make_vectors(16, dimensions)
+        self._hits_body = None
+        self._encoded_vectors = {}
+        self.documents = {}
+        # 文档 id -> 剩余失败次数及状态码，例如 {"doc-1": [2, 503]}
+        self.index_failures = {}
+        self.stats = {
+            "connections": 0, "requests": 0, "embedding_requests": 0, "bytes_in": 0, "bytes_out": 0,
+            "indexed": 0, "deleted": 0
+        }
+        self._stats_lock = threading.Lock()
+        self._thread = None
+
+    @classmethod
+    def from_recording(cls, path, **kwargs):
+        hits, vectors = load_recording(path)
+        return cls(hits=hits, embedding_vectors=vectors, **kwargs)
+
+    def hits_body(self):
+        # 响应体只序列化一次，桩服务与被测代码在同一个进程中，尽量少占用 GIL
+        body = self._hits_body
+        if body is None or body[0] is not self.hits:
+            body = self._hits_body = (self.hits, json.dumps({"value": self.hits}).encode("utf-8"))
+        return body[1]
+
+    def _encoded_vector(self, index, dimensions, encoding):
+        key = (index, dimensions, encoding)
+        encoded = self._encoded_vectors.get(key)
+        if encoded is None:
+            vector = self.embedding_vectors[index][:dimensions]
+            if encoding == "base64":
+                encoded = json.dumps(base64.b64encode(array("f", vector).tobytes()).decode("ascii"))
+            else:
+                encoded = json.dumps(vector)
+            self._encoded_vectors[key] = encoded
+        return encoded
+
+    def embeddings_body(self, request):
+        inputs = request.get("input")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        dimensions = request.get("dimensions") or self.dimensions
+        encoding = request.get("encoding_format") or "float"
+        items = []
+        for i, text in enumerate(inputs):
+            index = int(hashlib.md5(str(text).encode("utf-8")).hexdigest(), 16) % len(self.embedding_vectors)
+            items.append(
+                f'{{"object":"embedding","index":{i},"embedding":{self._encoded_vector(index, dimensions, encoding)}}}'
+            )
+        tokens = sum(len(str(text)) for text in inputs)
+        return (
+            f'{{"object":"list","model":{json.dumps(request.get("model", ""))},"data":[{",".join(items)}],'
+            f'"usage":{{"prompt_tokens":{tokens},"total_tokens":{tokens}}}}}'
+        ).encode("utf-8")
+
+    @property
+    def endpoint(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stats_add(self, name, value=1):
+        with self._stats_lock:
+            self.stats[name] = self.stats.get(name, 0) + value
+
+    def index_actions(self, actions):
+        results = []
+        with self._stats_lock:
+            for action in actions:
+                action = dict(action)
+                kind = action.pop("@search.action", "upload")
+                key = action.get("id")
+                failure = self.index_failures.get(key)
+                if failure and failure[0] > 0:
+                    failure[0] -= 1
+                    results.append({"key": key, "status": False, "errorMessage": "injected", "statusCode": failure[1]})
+                    continue
+                if kind == "delete":
+                    self.documents.pop(key, None)
+                    self.stats["deleted"] += 1
+                elif kind in ("merge", "mergeOrUpload"):
+                    self.documents.setdefault(key, {}).update(action)
+                    self.stats["indexed"] += 1
+                else:
+                    self.documents[key] = action
+                    self.stats["indexed"] += 1
+                results.append({"key": key, "status": True, "errorMessage": None, "statusCode": 200})
+        return results
+
+    def filter_documents(self, request):
+        with self._stats_lock:
+            docs = [doc for doc in self.documents.values() if match_filter(doc, request["filter"])]
+        if request.get("orderby") == "id asc":
+            docs.sort(key=lambda doc: doc["id"])
+        docs = docs[:request.get("top") or 50]
+        select = request.get("select")
+        if select:
+            fields = select.split(",")
+            docs = [{name: doc.get(name) for name in fields} for doc in docs]
+        return [dict(doc, **{"@search.score": 1.0}) for doc in docs]
+
+    def reset_stats(self):
+        with self._stats_lock:
+            for name in self.stats:
+                self.stats[name] = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
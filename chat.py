@@ -0,0 +1,263 @@
+"""
+聊天补全
+- chat: 一次性返回完整回答
+- stream_chat: 流式返回，逐段产出回答文本和引用，用户不用等到全部生成完才看到内容
+两者共享同一个 AzureOpenAI 客户端，并为每次请求记录首 token 时间（TTFT）、总耗时和 token 数
+检索方式通过 mode 选择:
+- on_your_data: 由 Azure OpenAI 的 azure_search 数据源（On Your Data）检索
+- rag: 客户端检索（rag 模块），上下文按 token 预算裁剪后以普通聊天请求发送，另外记录检索耗时
+"""
+import time
+from functools import lru_cache
+
+from config import (
+    AZURE_OPENAI_API_KEY,AZURE_OPENAI_ENDPOINT,CHAT_DEPLOYMENT_NAME,SEARCH_ENDPOINT,SEARCH_API_KEY,INDEX_NAME
+    )
+from embedding_batch import estimate_tokens
+from rag import RAG_RETRIEVAL_MODES, last_user_message, prepare_context, rag_messages
+from metrics import counter, histogram
+
+CHAT_API_VERSION = "2025-01-01-preview"
+CHAT_MODES = ("on_your_data", "rag")
+DEFAULT_SYSTEM_PROMPT = "You are an AI assistant."
+
+CHAT_TTFT_SECONDS = histogram("chat_ttft_seconds", "聊天请求到首个 token 的耗时（秒）", ("mode", "stream"))
+CHAT_SECONDS = histogram("chat_seconds", "聊天请求总耗时（秒）", ("mode", "stream"))
+CHAT_RETRIEVAL_SECONDS = histogram("chat_retrieval_seconds", "rag 模式客户端检索耗时（秒）")
+CHAT_TOKENS = counter("chat_tokens_total", "聊天请求的 token 数（流式响应为本地估算）", ("mode", "kind"))
+
+
+@lru_cache(maxsize=None)
+def get_chat_client():
+    """
+    获取共享的 Azure OpenAI 客户端（第一次调用时创建）
+    """
+    from openai import AzureOpenAI
+
+    return AzureOpenAI(
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+        api_key=AZURE_OPENAI_API_KEY,
+        api_version=CHAT_API_VERSION,
+    )
+
+
+def build_messages(question, system_prompt=DEFAULT_SYSTEM_PROMPT, history=None):
+    messages = [{"role": "system", "content": system_prompt}]
+    messages.extend(history or [])
+    messages.append({"role": "user", "content": question})
+    return messages
+
+
+def azure_search_data_source(top_n_documents=5, filter=None, strictness=3, in_scope=True):
+    return {
+        "type": "azure_search",
+        "parameters": {
+            "endpoint": f"{SEARCH_ENDPOINT}",
+            "index_name": f"{INDEX_NAME}",
+            "semantic_configuration": "default",
+            "query_type": "simple",
+            "fields_mapping": {},
+            "in_scope": in_scope,
+            "filter": filter,
+            "strictness": strictness,
+            "top_n_documents": top_n_documents,
+            "authentication": {
+                "type": "api_key",
+                "key": f"{SEARCH_API_KEY}"
+            }
+        }
+    }
+
+
+class ChatMetrics:
+    """
+    单次请求的耗时和 token 统计（秒）
+    usage_estimated 为 True 时 token 数是本地估算的（响应没有返回 usage，例如服务端不支持流式 usage）
+    rag 模式下 retrieval 为客户端检索耗时（包含在 ttft 和 latency 中），context_tokens 为上下文 token 数
+    """
+    __slots__ = ("started", "ttft", "latency", "prompt_tokens", "completion_tokens", "usage_estimated",
+                 "retrieval", "context_tokens")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.ttft = None
+        self.latency = None
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.usage_estimated = False
+        self.retrieval = None
+        self.context_tokens = None
+
+    def first_token(self):
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started
+
+    def finish(self, usage=None, messages=None, content=""):
+        self.latency = time.perf_counter() - self.started
+        if self.ttft is None:
+            self.ttft = self.latency
+        if usage is not None:
+            self.prompt_tokens = usage.prompt_tokens
+            self.completion_tokens = usage.completion_tokens
+        else:
+            self.usage_estimated = True
+            self.prompt_tokens = sum(estimate_tokens(m.get("content") or "") for m in messages or [])
+            self.completion_tokens = estimate_tokens(content) if content else 0
+
+    @property
+    def tokens_per_second(self):
+        generation = (self.latency or 0) - (self.ttft or 0)
+        if not self.completion_tokens or generation <= 0:
+            return None
+        return self.completion_tokens / generation
+
+    def as_dict(self):
+        return {
+            "ttft": self.ttft,
+            "latency": self.latency,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "usage_estimated": self.usage_estimated,
+            "tokens_per_second": self.tokens_per_second,
+            "retrieval": self.retrieval,
+            "context_tokens": self.context_tokens,
+        }
+
+    def __repr__(self):
+        ttft = f"{self.ttft:.3f}s" if self.ttft is not None else None
+        latency = f"{self.latency:.3f}s" if self.latency is not None else None
+        retrieval = f", retrieval={self.retrieval:.3f}s" if self.retrieval is not None else ""
+        return (f"ChatMetrics(ttft={ttft}, latency={latency}{retrieval}, "
+                f"prompt_tokens={self.prompt_tokens}, completion_tokens={self.completion_tokens})")
+
+
+def _record(chat_metrics, mode, stream):
+    stream = "true" if stream else "false"
+    CHAT_TTFT_SECONDS.observe(chat_metrics.ttft, mode=mode, stream=stream)
+    CHAT_SECONDS.observe(chat_metrics.latency, mode=mode, stream=stream)
+    if chat_metrics.retrieval is not None:
+        CHAT_RETRIEVAL_SECONDS.observe(chat_metrics.retrieval)
+    CHAT_TOKENS.inc(chat_metrics.prompt_tokens or 0, mode=mode, kind="prompt")
+    CHAT_TOKENS.inc(chat_metrics.completion_tokens or 0, mode=mode, kind="completion")
+
+
+class ChatResult:
+    __slots__ = ("content", "citations", "metrics")
+
+    def __init__(self, content, citations, metrics):
+        self.content = content
+        self.citations = citations
+        self.metrics = metrics
+
+
+def _request_params(messages, max_tokens, temperature, data_sources):
+    params = {
+        "model": CHAT_DEPLOYMENT_NAME,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "top_p": 1,
+        "frequency_penalty": 0,
+        "presence_penalty": 0,
+        "stop": None,
+    }
+    if data_sources:
+        params["extra_body"] = {"data_sources": data_sources}
+    return params
+
+
+def _citations(message):
+    # On Your Data 的引用在 message/delta 的扩展字段 context 中
+    context = getattr(message, "context", None)
+    if not context:
+        return []
+    return context.get("citations") or []
+
+
+def _prepare(messages, metrics, mode, data_sources, rag_context, retrieval, top_k, context_tokens):
+    """
+    按 mode 准备请求，返回 (messages, data_sources, 客户端检索得到的来源或 None)
+    """
+    if mode == "on_your_data":
+        return messages, data_sources if data_sources is not None else [azure_search_data_source()], None
+    if mode != "rag":
+        raise ValueError(f"未知的聊天模式: {mode}，可选 {CHAT_MODES}")
+    if retrieval not in RAG_RETRIEVAL_MODES:
+        raise ValueError(f"未知的检索模式: {retrieval}，可选 {RAG_RETRIEVAL_MODES}")
+    if rag_context is None:
+        rag_context = prepare_context(
+            last_user_message(messages), retrieval=retrieval, top_k=top_k, max_tokens=context_tokens
+        )
+    metrics.retrieval = rag_context.retrieval
+    metrics.context_tokens = rag_context.tokens
+    return rag_messages(messages, rag_context), [], rag_context.sources
+
+
+def chat(messages, max_tokens=800, temperature=1, data_sources=None, mode="on_your_data",
+         rag_context=None, retrieval="hybrid", top_k=8, context_tokens=3000):
+    """
+    一次性生成完整回答
+    on_your_data 模式下 data_sources 为 None 时使用 azure_search 数据源；
+    rag 模式下可以传入提前准备好的 rag_context（rag.prepare_context），否则按 retrieval / top_k / context_tokens 检索
+    """
+    metrics = ChatMetrics()
+    messages, data_sources, sources = _prepare(
+        messages, metrics, mode, data_sources, rag_context, retrieval, top_k, context_tokens
+    )
+    completion = get_chat_client().chat.completions.create(
+        stream=False, **_request_params(messages, max_tokens, temperature, data_sources)
+    )
+    message = completion.choices[0].message
+    metrics.finish(usage=completion.usage, messages=messages, content=message.content or "")
+    _record(metrics, mode, stream=False)
+    citations = sources if sources is not None else _citations(message)
+    return ChatResult(message.content or "", citations, metrics)
+
+
+def stream_chat(messages, max_tokens=800, temperature=1, data_sources=None, mode="on_your_data",
+                rag_context=None, retrieval="hybrid", top_k=8, context_tokens=3000):
+    """
+    流式生成回答，参数与 chat 相同，逐个产出 (类型, 内容):
+    - ("citations", [引用, ...]): 数据源返回的引用（rag 模式下为检索到的来源），在第一段文本之前
+    - ("token", 文本片段)
+    - ("done", ChatMetrics): 最后一个事件
+
+    用法:
+        for kind, value in stream_chat(build_messages("経費申請"), mode="rag"):
+            if kind == "token":
+                print(value, end="", flush=True)
+    """
+    metrics = ChatMetrics()
+    messages, data_sources, sources = _prepare(
+        messages, metrics, mode, data_sources, rag_context, retrieval, top_k, context_tokens
+    )
+    if sources:
+        yield "citations", sources
+    # include_usage: 最后一个 chunk（choices 为空）带上整个请求的 usage，没有返回时再按文本估算
+    stream = get_chat_client().chat.completions.create(
+        stream=True, stream_options={"include_usage": True},
+        **_request_params(messages, max_tokens, temperature, data_sources)
+    )
+
+    parts = []
+    usage = None
+    try:
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            citations = _citations(delta)
+            if citations:
+                yield "citations", citations
+            if delta.content:
+                metrics.first_token()
+                parts.append(delta.content)
+                yield "token", delta.content
+    finally:
+        stream.close()
+
+    metrics.finish(usage=usage, messages=messages, content="".join(parts))
+    _record(metrics, mode, stream=True)
+    yield "done", metrics
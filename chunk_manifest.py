@@ -0,0 +1,98 @@
+"""
+分块清单
+记录每个父文档（driveItem）上次写入索引的分块：分块 id 与内容哈希，以及写入时的标题
+文档更新时与清单比较，只对内容变化的分块重新获取嵌入向量并上传，消失的分块从索引中删除
+"""
+import sqlite3
+import threading
+import time
+
+from config import CHUNK_MANIFEST_PATH
+
+
+class ChunkManifest:
+    """
+    SQLite（WAL 模式）存储的分块清单，每个线程使用各自的连接
+    """
+
+    def __init__(self, path=CHUNK_MANIFEST_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS parents (
+                parent_id TEXT PRIMARY KEY,
+                title TEXT,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                parent_id TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                PRIMARY KEY (parent_id, chunk_id)
+            ) WITHOUT ROWID
+            """
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, parent_id):
+        """
+        返回 (标题, {分块 id: 内容哈希})，没有记录时返回 (None, {})
+        """
+        conn = self._conn()
+        row = conn.execute("SELECT title FROM parents WHERE parent_id = ?", (parent_id,)).fetchone()
+        chunks = dict(conn.execute("SELECT chunk_id, content_hash FROM chunks WHERE parent_id = ?", (parent_id,)))
+        return (row[0] if row else None), chunks
+
+    def replace(self, parent_id, title, chunks):
+        """
+        用本次写入的分块 {分块 id: 内容哈希} 整体替换父文档的清单
+        """
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            conn.execute(
+                """
+                INSERT INTO parents (parent_id, title, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT (parent_id) DO UPDATE SET title = excluded.title, updated_at = excluded.updated_at
+                """,
+                (parent_id, title, time.time())
+            )
+            conn.execute("DELETE FROM chunks WHERE parent_id = ?", (parent_id,))
+            conn.executemany(
+                "INSERT INTO chunks (parent_id, chunk_id, content_hash) VALUES (?, ?, ?)",
+                [(parent_id, chunk_id, content_hash) for chunk_id, content_hash in chunks.items()]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def remove(self, parent_id):
+        """
+        删除父文档的清单，返回其中记录的分块 id
+        """
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            chunk_ids = [row[0] for row in conn.execute("SELECT chunk_id FROM chunks WHERE parent_id = ?", (parent_id,))]
+            conn.execute("DELETE FROM chunks WHERE parent_id = ?", (parent_id,))
+            conn.execute("DELETE FROM parents WHERE parent_id = ?", (parent_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return chunk_ids
@@ -7,13 +7,20 @@ load_dotenv()
 # Azure Search 配置
 SEARCH_SERVICE_NAME = os.getenv("SEARCH_SERVICE_NAME", "")
 SEARCH_API_KEY = os.getenv("SEARCH_API_KEY", "")
-SEARCH_ENDPOINT = f"https://{SEARCH_SERVICE_NAME}.search.windows.net"
+# 可以直接指定 endpoint（例如基准测试使用的本地桩服务），默认由服务名拼接
+SEARCH_ENDPOINT = os.getenv("SEARCH_ENDPOINT") or f"https://{SEARCH_SERVICE_NAME}.search.windows.net"
 
 # SharePoint 配置
 SHAREPOINT_SITE_URL = os.getenv("SHAREPOINT_SITE_URL", "")
 SHAREPOINT_APP_ID = os.getenv("SHAREPOINT_APP_ID", "")
 SHAREPOINT_CLIENT_SECRET = os.getenv("SHAREPOINT_CLIENT_SECRET", "")
 SHAREPOINT_TENANT_ID = os.getenv("SHAREPOINT_TENANT_ID", "")
+SHAREPOINT_DRIVE_ID = os.getenv(
+    "SHAREPOINT_DRIVE_ID", "b!15loqcZkLUGK6C0oCOL3vvvNNWQegURNvY-5ZGBF091rDBpKdJ6IS6RbBIfXEnsk"
+)
+# Microsoft Graph 和登录服务的地址，可以指向本地桩服务（例如 webhook 压测）
+GRAPH_ENDPOINT = os.getenv("GRAPH_ENDPOINT", "https://graph.microsoft.com").rstrip("/")
+LOGIN_ENDPOINT = os.getenv("LOGIN_ENDPOINT", "https://login.microsoftonline.com").rstrip("/")
 
 # Azure OpenAI 配置
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT", "https://xxx.openai.azure.com/")
@@ -27,3 +34,81 @@ INDEX_NAME = os.getenv("INDEX_NAME", "sharepoint-index")
 DATA_SOURCE_NAME = os.getenv("DATA_SOURCE_NAME", "sharepoint-datasource-presentations")
 SKILLSET_NAME = os.getenv("SKILLSET_NAME", "sharepoint-skillset")
 INDEXER_NAME = os.getenv("INDEXER_NAME", "sharepoint-indexer")
+
+# 搜索客户端连接池配置
+SEARCH_POOL_CONNECTIONS = int(os.getenv("SEARCH_POOL_CONNECTIONS", "4"))
+SEARCH_POOL_MAXSIZE = int(os.getenv("SEARCH_POOL_MAXSIZE", "32"))
+SEARCH_CONNECTION_TIMEOUT = float(os.getenv("SEARCH_CONNECTION_TIMEOUT", "10"))
+SEARCH_READ_TIMEOUT = float(os.getenv("SEARCH_READ_TIMEOUT", "60"))
+
+# 嵌入向量缓存配置
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "3072"))
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.db")
+EMBEDDING_CACHE_MEMORY_SIZE = int(os.getenv("EMBEDDING_CACHE_MEMORY_SIZE", "1024"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+
+# 向量索引配置（见 vector_profiles）: <float32|int8|binary>[-<维度>]，例如 int8、binary-1024
+# 修改后需要重建索引（create_indexes）并重新生成向量
+VECTOR_INDEX_PROFILE = os.getenv("VECTOR_INDEX_PROFILE", "float32")
+# 压缩索引的默认过采样倍数，取 k * 倍数个候选后用原始向量重新打分
+VECTOR_OVERSAMPLING = float(os.getenv("VECTOR_OVERSAMPLING", "10"))
+
+# 嵌入向量批处理配置
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "32000"))
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", "256"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+EMBEDDING_MICROBATCH_WAIT_MS = float(os.getenv("EMBEDDING_MICROBATCH_WAIT_MS", "5"))
+EMBEDDING_MICROBATCH_MAX_SIZE = int(os.getenv("EMBEDDING_MICROBATCH_MAX_SIZE", "64"))
+
+# 检索结果缓存配置
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "2048"))
+# 跨进程失效标记文件，webhook 服务和检索服务需要指向同一个文件
+RESULT_CACHE_STAMP_PATH = os.getenv(
+    "RESULT_CACHE_STAMP_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "result_cache.stamp")
+)
+
+# 本地向量索引镜像配置
+# off: 不使用；fallback: 检索服务出错/限流时使用；prefer: 优先使用本地镜像
+LOCAL_VECTOR_SEARCH_MODE = os.getenv("LOCAL_VECTOR_SEARCH_MODE", "off")
+LOCAL_VECTOR_INDEX_DIR = os.getenv("LOCAL_VECTOR_INDEX_DIR", "local_vector_index")
+LOCAL_VECTOR_INDEX_DTYPE = os.getenv("LOCAL_VECTOR_INDEX_DTYPE", "float32")
+LOCAL_VECTOR_APPROXIMATE = os.getenv("LOCAL_VECTOR_APPROXIMATE", "false").lower() == "true"
+
+# SharePoint 变更同步配置
+SYNC_WORKERS = int(os.getenv("SYNC_WORKERS", "4"))
+SUBSCRIPTION_CLIENT_STATE = os.getenv("SUBSCRIPTION_CLIENT_STATE", "testCondition")
+NOTIFY_QUEUE_PATH = os.getenv("NOTIFY_QUEUE_PATH", "notify_queue.db")
+NOTIFY_LEASE_SECONDS = float(os.getenv("NOTIFY_LEASE_SECONDS", "600"))
+NOTIFY_RETRY_INTERVAL = float(os.getenv("NOTIFY_RETRY_INTERVAL", "30"))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "10"))
+DELTA_STORE_PATH = os.getenv("DELTA_STORE_PATH", "delta_links.db")
+DOWNLOADS_DIR = os.getenv("DOWNLOADS_DIR", "downloads")
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "4"))
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(1024 * 1024)))
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", "3"))
+
+# 推送模式增量索引配置（delta 同步直接把分块写入索引，不再等待索引器按计划运行）
+# 推送模式与索引器写入的分块键不同（driveItem id + 内容哈希 / 索引器的 base64 item id），不能同时使用:
+# 开启后 create_indexer 创建的索引器不再按计划运行，已有的索引器需要重新创建或在门户中关闭计划
+PUSH_INDEXING_ENABLED = os.getenv("PUSH_INDEXING_ENABLED", "false").lower() == "true"
+PUSH_BATCH_SIZE = int(os.getenv("PUSH_BATCH_SIZE", "500"))
+# 单次请求的上限为 1000 条 / 16MB，3072 维向量序列化后约 60KB，按字节数也要限制
+PUSH_BATCH_MAX_BYTES = int(os.getenv("PUSH_BATCH_MAX_BYTES", str(8 * 1024 * 1024)))
+PUSH_FLUSH_INTERVAL = float(os.getenv("PUSH_FLUSH_INTERVAL", "2"))
+PUSH_MAX_RETRIES = int(os.getenv("PUSH_MAX_RETRIES", "3"))
+# 已写入索引的分块清单（父文档 -> 分块 id 与内容哈希）
+CHUNK_MANIFEST_PATH = os.getenv("CHUNK_MANIFEST_PATH", "chunk_manifest.db")
+
+# 本地提取与分块配置，与 create_skillset 中的 SplitSkill 参数保持一致
+CHUNK_MAX_LENGTH = int(os.getenv("CHUNK_MAX_LENGTH", "1024"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "256"))
+CHUNK_DEFAULT_LANGUAGE = os.getenv("CHUNK_DEFAULT_LANGUAGE", "ja")
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+
+# 指标与追踪配置（webhook 服务在 /metrics 输出 Prometheus 格式）
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "1000"))
@@ -0,0 +1,279 @@
+"""
+本地文本提取与分块
+与 create_skillset 中的 SplitSkill（pages 模式、maximum_page_length=1024、page_overlap_length=256、默认语言 ja）保持一致：
+- 先按句子切分（日文/中文按 。！？ 等全角标点，其他语言按 . ! ? 加空白），换行同样视为边界
+- 句子依次装入页面，放不下时换页，下一页以上一页末尾 overlap 个字符开头
+- 单个句子超过可用长度时，填满当前页后按空白（日文/中文直接按字符）切开
+提取支持索引器配置的 .pdf, .docx, .txt, .doc；PDF 需要安装 pypdf，.doc 需要系统中有 antiword，
+缺少对应的提取工具时与不支持的文件类型一样返回 None
+DocumentProcessor 用进程池并行提取和分块，批量处理时可以用满全部 CPU
+"""
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from xml.etree import ElementTree
+
+from config import CHUNK_MAX_LENGTH, CHUNK_OVERLAP, CHUNK_DEFAULT_LANGUAGE, EXTRACTION_WORKERS
+
+# 不使用空格分词的语言，句子边界为全角标点，分块时可以在任意字符处切开
+_CJK_LANGUAGES = ("ja", "zh")
+_CJK_ENDERS = set("。．！？!?")
+_LATIN_ENDERS = set(".!?")
+# 紧跟在句末标点后的闭合符号归入同一句
+_CLOSERS = set("」』）)]】〕\"'’”")
+
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def _is_cjk(language):
+    return (language or "").lower().split("-")[0] in _CJK_LANGUAGES
+
+
+def detect_language(text, default=CHUNK_DEFAULT_LANGUAGE):
+    """
+    粗略判断语言：含假名为 ja，只有汉字为 zh，以拉丁字母为主为 en，无法判断时返回 default
+    """
+    sample = text[:4096]
+    kana = han = latin = 0
+    for ch in sample:
+        code = ord(ch)
+        if 0x3040 <= code <= 0x30FF:
+            kana += 1
+        elif 0x4E00 <= code <= 0x9FFF:
+            han += 1
+        elif ch.isascii() and ch.isalpha():
+            latin += 1
+    if kana:
+        return "ja"
+    if han and han >= latin:
+        return "zh"
+    if latin:
+        return "en"
+    return default
+
+
+def split_sentences(text, language=CHUNK_DEFAULT_LANGUAGE):
+    """
+    按句子切分，句末标点、紧随的闭合符号和空白都保留在句子末尾，拼接后与原文一致
+    """
+    cjk = _is_cjk(language)
+    enders = _CJK_ENDERS if cjk else _LATIN_ENDERS
+    sentences = []
+    start = i = 0
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if ch != "\n" and ch not in enders:
+            i += 1
+            continue
+        j = i + 1
+        if ch != "\n":
+            while j < n and (text[j] in enders or text[j] in _CLOSERS):
+                j += 1
+            # 拉丁语系中标点后不是空白时不算句末（3.14、e.g.、URL 等）
+            if not cjk and j < n and not text[j].isspace():
+                i = j
+                continue
+        while j < n and text[j].isspace():
+            j += 1
+        sentences.append(text[start:j])
+        start = i = j
+    if start < n:
+        sentences.append(text[start:])
+    return sentences
+
+
+def _cut_point(sentence, room, cjk):
+    if not cjk:
+        space = sentence.rfind(" ", 0, room)
+        if space > 0:
+            return space + 1
+    return room
+
+
+def _overlap_text(page, overlap, cjk):
+    if overlap <= 0:
+        return ""
+    tail = page[-overlap:]
+    if not cjk and len(page) > overlap and not page[-overlap - 1].isspace():
+        # 不从单词中间开始
+        space = tail.find(" ")
+        tail = tail[space + 1:] if space >= 0 else ""
+    return tail
+
+
+def split_pages(text, max_length=CHUNK_MAX_LENGTH, overlap=CHUNK_OVERLAP, language=CHUNK_DEFAULT_LANGUAGE):
+    """
+    与 SplitSkill 的 pages 模式相同的分块，返回去掉首尾空白的分块列表
+    超过一页长度的连续空白会切出只有空白的页，这些页去掉空白后为空，不返回（嵌入接口不接受空文本）
+    """
+    if overlap * 2 >= max_length:
+        raise ValueError("overlap 必须小于 max_length 的一半")
+    cjk = _is_cjk(language)
+    # 一页中重叠部分之外的可用长度
+    limit = max_length - overlap
+
+    pages = []
+    current = ""
+    # current 中是否已有上一页重叠部分之外的内容
+    has_new = False
+    for sentence in split_sentences(text, language):
+        while sentence:
+            room = max_length - len(current)
+            if len(sentence) <= room:
+                current += sentence
+                has_new = has_new or bool(sentence.strip())
+                break
+            if not has_new or len(sentence) > limit:
+                # 超长句子先填满当前页，剩余部分在下一页继续
+                cut = _cut_point(sentence, room, cjk)
+                current += sentence[:cut]
+                sentence = sentence[cut:]
+                has_new = True
+            pages.append(current)
+            current = _overlap_text(current, overlap, cjk)
+            has_new = False
+    if has_new:
+        pages.append(current)
+    return [page for page in (page.strip() for page in pages) if page]
+
+
+def _decode(data):
+    for encoding in ("utf-8-sig", "cp932"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("utf-8", errors="replace")
+
+
+def _extract_docx(path):
+    paragraphs = []
+    with zipfile.ZipFile(path) as archive:
+        with archive.open("word/document.xml") as f:
+            parts = []
+            for event, elem in ElementTree.iterparse(f, events=("end",)):
+                tag = elem.tag
+                if tag == _W_NS + "t":
+                    parts.append(elem.text or "")
+                elif tag == _W_NS + "tab":
+                    parts.append("\t")
+                elif tag in (_W_NS + "br", _W_NS + "cr"):
+                    parts.append("\n")
+                elif tag == _W_NS + "p":
+                    paragraphs.append("".join(parts))
+                    parts = []
+                    elem.clear()
+    return "\n".join(paragraphs)
+
+
+def _extract_pdf(path):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        print(f"提取 PDF 文本需要安装 pypdf，跳过 {path}")
+        return None
+    reader = PdfReader(path)
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def _extract_doc(path):
+    antiword = shutil.which("antiword")
+    if antiword is None:
+        print(f"提取 .doc 文本需要安装 antiword，跳过 {path}")
+        return None
+    result = subprocess.run([antiword, "-m", "UTF-8.txt", path], capture_output=True, check=True)
+    return result.stdout.decode("utf-8", errors="replace")
+
+
+def extract_text(path):
+    """
+    提取文件的文本内容，不支持的扩展名或缺少提取工具时返回 None
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".txt":
+        with open(path, "rb") as f:
+            return _decode(f.read())
+    if ext == ".docx":
+        return _extract_docx(path)
+    if ext == ".pdf":
+        return _extract_pdf(path)
+    if ext == ".doc":
+        return _extract_doc(path)
+    return None
+
+
+def extract_and_split(path, max_length=CHUNK_MAX_LENGTH, overlap=CHUNK_OVERLAP, language=None):
+    """
+    提取并分块，返回 (语言, 分块列表)；不支持的文件返回 (None, None)
+    language 为 None 时自动判断
+    """
+    text = extract_text(path)
+    if text is None:
+        return None, None
+    language = language or detect_language(text)
+    return language, split_pages(text, max_length=max_length, overlap=overlap, language=language)
+
+
+class DocumentProcessor:
+    """
+    在进程池中并行提取和分块（PDF 解析等 CPU 密集的工作不受 GIL 限制）
+    进程池在第一次使用时创建，使用 spawn 启动，避免在多线程进程中 fork
+    """
+
+    def __init__(self, workers=EXTRACTION_WORKERS, max_length=CHUNK_MAX_LENGTH, overlap=CHUNK_OVERLAP):
+        self.workers = workers
+        self.max_length = max_length
+        self.overlap = overlap
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context("spawn"))
+            return self._executor
+
+    def process_many(self, paths, language=None):
+        """
+        返回 [(path, (语言, 分块列表) 或异常)]，顺序与输入一致
+        """
+        if not paths:
+            return []
+        futures = [
+            self._pool().submit(extract_and_split, path, self.max_length, self.overlap, language) for path in paths
+        ]
+        results = []
+        for path, future in zip(paths, futures):
+            try:
+                results.append((path, future.result()))
+            except Exception as e:
+                results.append((path, e))
+        return results
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    # 批量预处理: python document_processing.py 文件1 文件2 ...
+    started = time.perf_counter()
+    processor = DocumentProcessor()
+    for path, result in processor.process_many(sys.argv[1:]):
+        if isinstance(result, Exception):
+            print(f"{path}: 出错 {result}")
+        elif result[1] is None:
+            print(f"{path}: 不支持的文件类型")
+        else:
+            print(f"{path}: {result[0]} {len(result[1])} 个分块")
+    processor.close()
+    print(f"耗时 {time.perf_counter() - started:.2f}s")
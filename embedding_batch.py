@@ -0,0 +1,197 @@
+"""
+嵌入向量批处理
+- pack_batches: 按 token 上限和条数上限把输入切成批次
+- embed_texts: 并发调用 embeddings 接口（有并发上限），结果按输入顺序返回
+- EmbeddingBatcher: 微批处理前端，把几毫秒内并发到达的单条请求合并成一次接口调用
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+
+from config import (
+    EMBEDDING_BATCH_MAX_TOKENS,EMBEDDING_BATCH_MAX_INPUTS,EMBEDDING_MAX_CONCURRENCY,
+    EMBEDDING_MICROBATCH_WAIT_MS,EMBEDDING_MICROBATCH_MAX_SIZE
+    )
+import metrics
+
+
+@lru_cache(maxsize=None)
+def _get_encoding():
+    # tiktoken 第一次加载编码表较慢（可能需要下载），在第一次估算时才加载
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+EMBEDDING_SECONDS = metrics.histogram("embedding_request_seconds", "嵌入接口调用耗时（秒）", ("op",))
+EMBEDDING_ERRORS = metrics.counter("embedding_errors_total", "嵌入接口调用失败次数", ("op", "status"))
+EMBEDDING_INPUTS = metrics.counter("embedding_inputs_total", "发送到嵌入接口的文本条数")
+EMBEDDING_BATCH_SIZE = metrics.histogram(
+    "embedding_microbatch_size", "微批处理每次合并的请求数", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+
+
+def estimate_tokens(text):
+    """
+    估算文本的 token 数
+    安装了 tiktoken 时精确计算，否则按 ASCII 约 4 字符/token、其他字符（中日文等）1 字符/token 保守估算
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars) + 1
+
+
+def pack_batches(texts, max_tokens=EMBEDDING_BATCH_MAX_TOKENS, max_inputs=EMBEDDING_BATCH_MAX_INPUTS):
+    """
+    按顺序把文本装进批次，返回每个批次的下标列表
+    单条超过 max_tokens 的文本独占一个批次，避免拖累同批的其他输入
+    """
+    batches = []
+    current = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_inputs):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _embed_batch(client_openai, model, texts, dimensions):
+    params = {"input": texts, "model": model}
+    if dimensions:
+        params["dimensions"] = dimensions
+    response = client_openai.embeddings.create(**params)
+    # 接口返回的 data 带有 index，按 index 还原输入顺序
+    vectors = [None] * len(texts)
+    for item in response.data:
+        vectors[item.index] = item.embedding
+    return vectors
+
+
+def embed_texts(client_openai, model, texts, dimensions=None, max_workers=EMBEDDING_MAX_CONCURRENCY,
+                max_tokens=EMBEDDING_BATCH_MAX_TOKENS, max_inputs=EMBEDDING_BATCH_MAX_INPUTS):
+    """
+    批量获取嵌入向量，结果与 texts 一一对应
+    失败批次中的文本对应位置为 None
+    """
+    results = [None] * len(texts)
+    batches = pack_batches(texts, max_tokens=max_tokens, max_inputs=max_inputs)
+
+    def run(batch):
+        try:
+            EMBEDDING_INPUTS.inc(len(batch))
+            with metrics.span("embedding_batch", EMBEDDING_SECONDS, op="batch"):
+                vectors = _embed_batch(client_openai, model, [texts[i] for i in batch], dimensions)
+        except Exception as e:
+            EMBEDDING_ERRORS.inc(op="batch", status=metrics.error_status(e))
+            print(f"批量获取嵌入向量错误（{len(batch)} 条）: {e}")
+            return
+        for i, vector in zip(batch, vectors):
+            results[i] = vector
+
+    if len(batches) == 1:
+        run(batches[0])
+    elif batches:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+            list(executor.map(run, batches))
+    return results
+
+
+class EmbeddingBatcher:
+    """
+    微批处理前端
+    后台线程收集 max_wait_ms 内（或达到 max_batch_size 条）的请求，一次性交给 embed_many 处理
+
+    用法:
+        batcher = EmbeddingBatcher(get_embeddings)
+        vector = batcher.embed("経費申請")
+    """
+
+    def __init__(self, embed_many, max_batch_size=EMBEDDING_MICROBATCH_MAX_SIZE,
+                 max_wait_ms=EMBEDDING_MICROBATCH_WAIT_MS, max_workers=EMBEDDING_MAX_CONCURRENCY):
+        self.embed_many = embed_many
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, text):
+        """
+        提交单条文本，返回 Future，结果为嵌入向量（失败时为 None）
+        """
+        if self._closed:
+            raise RuntimeError("EmbeddingBatcher 已关闭")
+        self._ensure_started()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text, timeout=None):
+        return self.submit(text).result(timeout=timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            stop = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._executor.submit(self._dispatch, batch)
+            if stop:
+                return
+
+    def _dispatch(self, batch):
+        EMBEDDING_BATCH_SIZE.observe(len(batch))
+        try:
+            vectors = self.embed_many([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            future.set_result(vector)
+
+    def close(self):
+        """
+        停止后台线程，等待已提交的请求完成
+        """
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+        self._executor.shutdown(wait=True)
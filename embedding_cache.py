@@ -0,0 +1,211 @@
+"""
+嵌入向量两级缓存
+第一级是进程内有大小上限的 LRU，第二级是 SQLite 磁盘存储（WAL 模式，可在多个 worker 进程间共享）
+缓存键为 (model, dimensions, 规范化文本的 sha256)，向量以 float32 存储
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+from config import (
+    EMBEDDING_CACHE_ENABLED,EMBEDDING_CACHE_PATH,EMBEDDING_CACHE_MEMORY_SIZE,EMBEDDING_CACHE_MAX_ENTRIES
+    )
+import metrics
+
+# 每写入这么多条记录检查一次磁盘容量
+_EVICT_CHECK_INTERVAL = 256
+
+CACHE_REQUESTS = metrics.counter("embedding_cache_requests_total", "嵌入向量缓存查询次数，result 为命中的层级或 miss", ("result",))
+
+
+def normalize_text(text):
+    """
+    规范化查询文本：NFKC、去除首尾空白、合并连续空白
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def text_hash(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    线程安全、多进程共享的嵌入向量缓存
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, memory_size=EMBEDDING_CACHE_MEMORY_SIZE,
+                 max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                dimensions INTEGER NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (model, dimensions, text_hash)
+            ) WITHOUT ROWID
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)")
+
+    def _conn(self):
+        # sqlite3 连接不能跨线程使用，每个线程各自打开一个
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _memory_get(self, key):
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+            return vector
+
+    def _memory_put(self, key, vector):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def get(self, model, dimensions, text):
+        """
+        查询缓存（先内存后磁盘），未命中返回 None
+        """
+        embedding = self.get_memory(model, dimensions, text)
+        if embedding is None:
+            embedding = self.get_disk(model, dimensions, text)
+        return embedding
+
+    def get_memory(self, model, dimensions, text):
+        """
+        只查询内存层，不访问磁盘，可以在事件循环中直接调用；未命中返回 None（不计入 miss）
+        """
+        vector = self._memory_get((model, dimensions, text_hash(text)))
+        if vector is None:
+            return None
+        CACHE_REQUESTS.inc(result="memory")
+        self.hits += 1
+        return vector.tolist()
+
+    def get_disk(self, model, dimensions, text):
+        """
+        查询磁盘层，命中时回填内存层，未命中返回 None
+        """
+        key = (model, dimensions, text_hash(text))
+        row = self._conn().execute(
+            "SELECT vector FROM embeddings WHERE model = ? AND dimensions = ? AND text_hash = ?",
+            key
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            CACHE_REQUESTS.inc(result="miss")
+            return None
+        vector = array("f")
+        vector.frombytes(row[0])
+        self._memory_put(key, vector)
+        self._conn().execute(
+            "UPDATE embeddings SET last_access = ? WHERE model = ? AND dimensions = ? AND text_hash = ?",
+            (time.time(), *key)
+        )
+        CACHE_REQUESTS.inc(result="disk")
+        self.hits += 1
+        return vector.tolist()
+
+    def put(self, model, dimensions, text, embedding):
+        """
+        写入缓存（同时写入内存和磁盘）
+        """
+        self.put_memory(model, dimensions, text, embedding)
+        self.put_disk(model, dimensions, text, embedding)
+
+    def put_memory(self, model, dimensions, text, embedding):
+        """
+        只写入内存层
+        """
+        self._memory_put((model, dimensions, text_hash(text)), array("f", embedding))
+
+    def put_disk(self, model, dimensions, text, embedding):
+        """
+        只写入磁盘层，按写入次数定期淘汰
+        """
+        key = (model, dimensions, text_hash(text))
+        self._conn().execute(
+            "INSERT OR REPLACE INTO embeddings (model, dimensions, text_hash, vector, last_access) VALUES (?, ?, ?, ?, ?)",
+            (*key, array("f", embedding).tobytes(), time.time())
+        )
+
+        with self._lock:
+            self._writes += 1
+            check = self._writes % _EVICT_CHECK_INTERVAL == 0
+        if check:
+            self.evict()
+
+    def evict(self, max_entries=None):
+        """
+        按最近访问时间淘汰磁盘上超出上限的记录，返回删除条数
+        """
+        max_entries = self.max_entries if max_entries is None else max_entries
+        conn = self._conn()
+        count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count <= max_entries:
+            return 0
+        cursor = conn.execute(
+            """
+            DELETE FROM embeddings WHERE (model, dimensions, text_hash) IN (
+                SELECT model, dimensions, text_hash FROM embeddings ORDER BY last_access LIMIT ?
+            )
+            """,
+            (count - max_entries,)
+        )
+        return cursor.rowcount
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        self._conn().execute("DELETE FROM embeddings")
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """
+    获取进程内共享的嵌入缓存，未启用时返回 None
+    """
+    global _cache
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
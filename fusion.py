@@ -0,0 +1,89 @@
+"""
+客户端结果融合
+把任意数量的检索结果列表（语义、向量、关键词、多个改写查询……）融合成一个去重、重新打分的列表
+- reciprocal_rank_fusion: RRF，只依赖名次，不受各路分数尺度影响
+- weighted_score_fusion: 各路分数 min-max 归一化后加权求和（语义结果使用 reranker_score）
+两种方法都只遍历一次全部结果，最后用堆取 top_k
+"""
+import heapq
+
+RRF_K = 60
+
+
+def _named_lists(result_lists):
+    if isinstance(result_lists, dict):
+        return list(result_lists.items())
+    return list(enumerate(result_lists))
+
+
+def _merge(merged, name, result, key, score, component_score=None):
+    doc_id = result.get(key)
+    entry = merged.get(doc_id)
+    if entry is None:
+        entry = merged[doc_id] = [0.0, dict(result), {}]
+    else:
+        # 补全其他结果列表中缺失的字段（例如语义结果没有 chunk_text）
+        for field, value in result.items():
+            if entry[1].get(field) is None and value is not None:
+                entry[1][field] = value
+    entry[0] += score
+    entry[2][name] = result.get("score") if component_score is None else component_score
+
+
+def _finish(merged, top_k):
+    entries = merged.values()
+    if top_k is not None:
+        entries = heapq.nlargest(top_k, entries, key=lambda entry: entry[0])
+    else:
+        entries = sorted(entries, key=lambda entry: entry[0], reverse=True)
+
+    fused = []
+    for score, result, component_scores in entries:
+        result["score"] = score
+        result["component_scores"] = component_scores
+        fused.append(result)
+    return fused
+
+
+def reciprocal_rank_fusion(result_lists, k=RRF_K, weights=None, top_k=None, key="id"):
+    """
+    RRF 融合: score(d) = Σ weight_i / (k + rank_i(d))
+    result_lists 可以是列表的列表，也可以是 {名称: 结果列表}，weights 使用相同的下标或名称
+    """
+    merged = {}
+    for name, results in _named_lists(result_lists):
+        weight = weights.get(name, 1.0) if weights else 1.0
+        if not weight:
+            continue
+        for rank, result in enumerate(results, 1):
+            _merge(merged, name, result, key, weight / (k + rank))
+    return _finish(merged, top_k)
+
+
+def weighted_score_fusion(result_lists, weights=None, top_k=None, key="id"):
+    """
+    加权分数融合: 每路结果的分数先 min-max 归一化到 [0, 1]，再按权重求和
+    带 reranker_score 的结果列表（语义检索）使用 reranker_score：语义结果的 score 是重排前的 BM25 分数，
+    与返回顺序不一致；没有重排分数的结果（超出重排范围）按 0 计
+    """
+    merged = {}
+    for name, results in _named_lists(result_lists):
+        weight = weights.get(name, 1.0) if weights else 1.0
+        if not weight or not results:
+            continue
+        field = "reranker_score" if any(result.get("reranker_score") is not None for result in results) else "score"
+        scores = [result.get(field) or 0.0 for result in results]
+        low = min(scores)
+        span = max(scores) - low
+        for result, score in zip(results, scores):
+            normalized = (score - low) / span if span else 1.0
+            _merge(merged, name, result, key, weight * normalized, score)
+    return _finish(merged, top_k)
+
+
+def fuse(result_lists, method="rrf", weights=None, top_k=None, key="id"):
+    if method == "rrf":
+        return reciprocal_rank_fusion(result_lists, weights=weights, top_k=top_k, key=key)
+    if method == "weighted":
+        return weighted_score_fusion(result_lists, weights=weights, top_k=top_k, key=key)
+    raise ValueError(f"未知的融合方法: {method}")
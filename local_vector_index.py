@@ -0,0 +1,407 @@
+"""
+chunk_vector 字段的本地镜像
+向量保存在磁盘上的 .npy 文件中并以内存映射方式打开（float32 或 float16），元数据保存在 SQLite 中
+- search: 精确 top-k 余弦检索
+- build_ivf / search(approximate=True): 基于 k-means 倒排（IVF）的近似检索，适合大语料
+- upsert / delete / delete_parents: 增量更新（推送模式下由 webhook 服务在分块写入索引后调用）
+- sync_from_search: 从 Azure AI Search 全量拉取建立镜像，并删除服务端已不存在的分块
+其他进程（sync_local_vector_index、webhook 服务）写入后，检索前通过 SQLite 的 data_version 发现变化并重新加载；
+同一时间只应有一个进程写入
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from config import EMBEDDING_DIMENSIONS, LOCAL_VECTOR_INDEX_DIR, LOCAL_VECTOR_INDEX_DTYPE
+from search_hit import SearchHit
+
+_INITIAL_CAPACITY = 1024
+# 矩阵乘法按块进行，float16 矩阵逐块转换为 float32 计算
+_BLOCK_ROWS = 65536
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def cosine_to_score(cosine):
+    """
+    与 Azure AI Search 的 cosine 度量保持一致: score = 1 / (1 + (1 - cosine))
+    """
+    return 1.0 / (2.0 - cosine)
+
+
+class LocalVectorIndex:
+    """
+    本地向量索引镜像，检索结果与 vector_search 的返回格式一致
+    """
+
+    def __init__(self, path=LOCAL_VECTOR_INDEX_DIR, dim=EMBEDDING_DIMENSIONS, dtype=LOCAL_VECTOR_INDEX_DTYPE):
+        self.path = path
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+
+        self._vectors_path = os.path.join(path, "vectors.npy")
+        self._ivf_path = os.path.join(path, "ivf.npz")
+        self._db = sqlite3.connect(os.path.join(path, "meta.db"), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rows (
+                row INTEGER PRIMARY KEY,
+                id TEXT UNIQUE,
+                parent_id TEXT,
+                title TEXT,
+                chunk_text TEXT
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_rows_parent_id ON rows (parent_id)")
+        # 不在 rows 表中的变更（重建 IVF）也写一条记录，让其他进程的 data_version 变化
+        self._db.execute("CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value)")
+        self._load()
+
+    def _data_version(self):
+        return self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    def _load(self):
+        """
+        从磁盘加载矩阵、行号映射和 IVF
+        """
+        dim = self.dim
+        self._version = self._data_version()
+        if os.path.exists(self._vectors_path):
+            self._matrix = np.load(self._vectors_path, mmap_mode="r+")
+            if self._matrix.shape[1] != dim or self._matrix.dtype != self.dtype:
+                raise ValueError(
+                    f"本地向量索引格式不匹配: {self._matrix.shape[1]}/{self._matrix.dtype}，期望 {dim}/{self.dtype}"
+                )
+        else:
+            self._matrix = self._create_matrix(self._vectors_path, _INITIAL_CAPACITY)
+
+        # 行号 -> 文档 id；已删除的行为 None，可被复用
+        self._ids = []
+        self._row_of = {}
+        for row, doc_id in self._db.execute("SELECT row, id FROM rows ORDER BY row"):
+            while len(self._ids) < row:
+                self._ids.append(None)
+            self._ids.append(doc_id)
+            if doc_id is not None:
+                self._row_of[doc_id] = row
+        self._free = [row for row, doc_id in enumerate(self._ids) if doc_id is None]
+        self._alive = np.zeros(self._matrix.shape[0], dtype=bool)
+        self._alive[list(self._row_of.values())] = True
+
+        self._centroids = None
+        self._assign = None
+        self._lists = None
+        if os.path.exists(self._ivf_path):
+            ivf = np.load(self._ivf_path)
+            self._centroids = ivf["centroids"]
+            self._assign = np.full(self._matrix.shape[0], -1, dtype=np.int32)
+            self._assign[:len(ivf["assign"])] = ivf["assign"]
+
+    def refresh(self):
+        """
+        其他进程写入过时重新加载，返回是否重新加载
+        本进程自己的写入不会改变 data_version
+        """
+        with self._lock:
+            if self._data_version() == self._version:
+                return False
+            self._load()
+            return True
+
+    def __len__(self):
+        return len(self._row_of)
+
+    def _create_matrix(self, path, capacity):
+        matrix = np.lib.format.open_memmap(path, mode="w+", dtype=self.dtype, shape=(capacity, self.dim))
+        matrix.flush()
+        return matrix
+
+    def _grow(self, capacity):
+        tmp_path = self._vectors_path + ".tmp"
+        matrix = self._create_matrix(tmp_path, capacity)
+        count = len(self._ids)
+        matrix[:count] = self._matrix[:count]
+        matrix.flush()
+        del matrix
+        os.replace(tmp_path, self._vectors_path)
+        self._matrix = np.load(self._vectors_path, mmap_mode="r+")
+
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self._alive)] = self._alive
+        self._alive = alive
+        if self._assign is not None:
+            assign = np.full(capacity, -1, dtype=np.int32)
+            assign[:len(self._assign)] = self._assign
+            self._assign = assign
+
+    def _allocate_row(self):
+        if self._free:
+            return self._free.pop()
+        row = len(self._ids)
+        if row >= self._matrix.shape[0]:
+            self._grow(self._matrix.shape[0] * 2)
+        self._ids.append(None)
+        return row
+
+    def upsert(self, documents):
+        """
+        写入或更新文档，documents 为包含 id、chunk_vector 以及可选 parent_id、title、chunk_text 的字典
+        没有 chunk_vector 的文档只更新已有行的标题（对应索引的 merge 操作）
+        写入 SQLite 失败时回滚，并恢复内存中的行号映射和被覆盖的向量
+        """
+        with self._lock:
+            meta = []
+            titles = []
+            # 失败时恢复用: 新分配的行，已有行被覆盖前的 (向量, 聚类)
+            allocated = set()
+            previous = {}
+            for doc in documents:
+                vector = doc.get("chunk_vector")
+                if vector is None or len(vector) == 0:
+                    if doc["id"] in self._row_of and "title" in doc:
+                        titles.append((doc["title"], doc["id"]))
+                    continue
+                doc_id = doc["id"]
+                row = self._row_of.get(doc_id)
+                if row is None:
+                    row = self._allocate_row()
+                    self._row_of[doc_id] = row
+                    self._ids[row] = doc_id
+                    allocated.add(row)
+                elif row not in previous and row not in allocated:
+                    previous[row] = (
+                        np.array(self._matrix[row]), None if self._assign is None else int(self._assign[row])
+                    )
+                self._matrix[row] = _normalize(vector).astype(self.dtype)
+                self._alive[row] = True
+                if self._centroids is not None:
+                    self._assign[row] = int(np.argmax(self._centroids @ self._matrix[row].astype(np.float32)))
+                    self._lists = None
+                meta.append((row, doc_id, doc.get("parent_id"), doc.get("title"), doc.get("chunk_text")))
+
+            if meta or titles:
+                self._matrix.flush()
+                try:
+                    self._db.execute("BEGIN")
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO rows (row, id, parent_id, title, chunk_text) VALUES (?, ?, ?, ?, ?)",
+                        meta
+                    )
+                    self._db.executemany("UPDATE rows SET title = ? WHERE id = ?", titles)
+                    self._db.execute("COMMIT")
+                except Exception:
+                    if self._db.in_transaction:
+                        self._db.execute("ROLLBACK")
+                    self._undo_upsert(allocated, previous)
+                    raise
+            return len(meta)
+
+    def _undo_upsert(self, allocated, previous):
+        for row in allocated:
+            del self._row_of[self._ids[row]]
+            self._ids[row] = None
+            self._alive[row] = False
+            self._free.append(row)
+        for row, (vector, cluster) in previous.items():
+            self._matrix[row] = vector
+            if cluster is not None:
+                self._assign[row] = cluster
+        self._matrix.flush()
+        self._lists = None
+
+    def delete(self, doc_ids):
+        """
+        删除指定 id 的文档，返回删除条数
+        先写 SQLite，成功后再更新内存，失败时回滚，内存不变
+        """
+        with self._lock:
+            rows = [self._row_of[doc_id] for doc_id in dict.fromkeys(doc_ids) if doc_id in self._row_of]
+            if not rows:
+                return 0
+            try:
+                self._db.execute("BEGIN")
+                self._db.executemany(
+                    "UPDATE rows SET id = NULL, parent_id = NULL, title = NULL, chunk_text = NULL WHERE row = ?",
+                    [(row,) for row in rows]
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                raise
+            for row in rows:
+                del self._row_of[self._ids[row]]
+                self._ids[row] = None
+                self._alive[row] = False
+                self._free.append(row)
+            self._lists = None
+            return len(rows)
+
+    def delete_parents(self, parent_ids):
+        """
+        删除指定父文档的全部分块
+        """
+        parent_ids = list(parent_ids)
+        if not parent_ids:
+            return 0
+        placeholders = ",".join("?" * len(parent_ids))
+        with self._lock:
+            doc_ids = [
+                row[0] for row in self._db.execute(
+                    f"SELECT id FROM rows WHERE parent_id IN ({placeholders}) AND id IS NOT NULL", parent_ids
+                )
+            ]
+            return self.delete(doc_ids)
+
+    def _scores(self, query, rows=None):
+        if rows is None:
+            count = len(self._ids)
+            scores = np.empty(count, dtype=np.float32)
+            for start in range(0, count, _BLOCK_ROWS):
+                block = self._matrix[start:min(start + _BLOCK_ROWS, count)]
+                scores[start:start + len(block)] = block.astype(np.float32, copy=False) @ query
+            scores[~self._alive[:count]] = -np.inf
+            return scores
+        return self._matrix[rows].astype(np.float32, copy=False) @ query
+
+    def _ivf_lists(self):
+        if self._lists is None:
+            count = len(self._ids)
+            assign = np.where(self._alive[:count], self._assign[:count], -1)
+            order = np.argsort(assign, kind="stable")
+            bounds = np.searchsorted(assign[order], np.arange(len(self._centroids) + 1))
+            self._lists = (order, bounds)
+        return self._lists
+
+    def search(self, query_vector, top_k=5, approximate=False, nprobe=8):
+        """
+        余弦相似度 top-k 检索
+        approximate=True 且已建立 IVF 时只扫描最近的 nprobe 个聚类
+        """
+        query = _normalize(query_vector)
+        with self._lock:
+            self.refresh()
+            if not self._row_of:
+                return []
+            if approximate and self._centroids is not None:
+                order, bounds = self._ivf_lists()
+                probes = np.argsort(-(self._centroids @ query))[:nprobe]
+                rows = np.concatenate([order[bounds[c]:bounds[c + 1]] for c in probes])
+                scores = self._scores(query, rows)
+            else:
+                rows = None
+                scores = self._scores(query)
+
+            k = min(top_k, len(scores))
+            if k == 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            hits = [
+                (int(rows[i]) if rows is not None else int(i), float(scores[i]))
+                for i in top if np.isfinite(scores[i])
+            ]
+            if not hits:
+                return []
+
+            placeholders = ",".join("?" * len(hits))
+            meta = {
+                row[0]: row[1:] for row in self._db.execute(
+                    f"SELECT row, id, parent_id, title, chunk_text FROM rows WHERE row IN ({placeholders})",
+                    [row for row, _ in hits]
+                )
+            }
+
+        search_results = []
+        for row, cosine in hits:
+            doc_id, parent_id, title, chunk_text = meta[row]
+            search_results.append(SearchHit(
+                id=doc_id,
+                parent_id=parent_id,
+                title=title,
+                chunk_text=chunk_text,
+                score=cosine_to_score(cosine)
+            ))
+        return search_results
+
+    def build_ivf(self, nlist=None, iterations=10, sample_size=50000, seed=0):
+        """
+        用 k-means 建立倒排聚类，之后的 upsert 会增量分配到最近的聚类
+        """
+        with self._lock:
+            rows = np.nonzero(self._alive[:len(self._ids)])[0]
+            if len(rows) == 0:
+                return
+            nlist = min(nlist or max(1, int(np.sqrt(len(rows)))), len(rows))
+            rng = np.random.default_rng(seed)
+            sample = self._matrix[np.sort(rng.choice(rows, min(sample_size, len(rows)), replace=False))]
+            sample = sample.astype(np.float32)
+
+            centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                for c in range(nlist):
+                    members = sample[labels == c]
+                    centroids[c] = members.mean(axis=0) if len(members) else sample[rng.integers(len(sample))]
+                centroids = _normalize(centroids)
+
+            assign = np.full(self._matrix.shape[0], -1, dtype=np.int32)
+            for start in range(0, len(rows), _BLOCK_ROWS):
+                block_rows = rows[start:start + _BLOCK_ROWS]
+                block = self._matrix[block_rows].astype(np.float32)
+                assign[block_rows] = np.argmax(block @ centroids.T, axis=1)
+
+            self._centroids = centroids
+            self._assign = assign
+            self._lists = None
+            np.savez(self._ivf_path, centroids=centroids, assign=assign[:len(self._ids)])
+            self._db.execute("INSERT OR REPLACE INTO state (name, value) VALUES ('ivf', ?)", (time.time(),))
+
+    def sync_from_search(self, search_client, page_size=1000):
+        """
+        从 Azure AI Search 拉取全部分块建立镜像（按 id 排序做键集分页）
+        拉取完成后删除镜像中检索服务里已不存在的分块
+        """
+        last_id = None
+        total = 0
+        seen = set()
+        while True:
+            results = search_client.search(
+                search_text="*",
+                select=["id", "parent_id", "title", "chunk_text", "chunk_vector"],
+                filter=f"id gt '{last_id}'" if last_id else None,
+                order_by=["id asc"],
+                top=page_size
+            )
+            page = list(results)
+            if not page:
+                break
+            total += self.upsert(page)
+            seen.update(doc["id"] for doc in page)
+            last_id = page[-1]["id"].replace("'", "''")
+            if len(page) < page_size:
+                break
+
+        with self._lock:
+            stale = [doc_id for doc_id in self._row_of if doc_id not in seen]
+            removed = self.delete(stale)
+        if removed:
+            print(f"本地向量索引删除了 {removed} 条检索服务中已不存在的分块")
+        return total
+
+    def close(self):
+        with self._lock:
+            self._matrix.flush()
+            self._db.close()
@@ -0,0 +1,338 @@
+"""
+进程内指标与追踪
+- counter / histogram: 带标签的计数器和固定桶直方图，render() 输出 Prometheus 文本格式
+- register: 抓取时才求值的回调指标，用于队列深度、已有的 stats 字典等
+- span: 计时上下文管理器，结束时写入直方图；启用追踪时同时记录 span（trace_id / parent_id 通过 contextvars 传递），
+  最近的 span 保存在有上限的缓冲区中，recent_spans() 读取
+
+METRICS_ENABLED=false 时 inc / observe 直接返回，span 返回共享的空上下文管理器，每次调用只多一次全局变量判断
+
+用法:
+    SEARCH_SECONDS = metrics.histogram("search_request_seconds", "检索请求耗时（秒）", ("mode",))
+    with metrics.span("search", SEARCH_SECONDS, mode="semantic"):
+        ...
+"""
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+from config import METRICS_ENABLED, TRACING_ENABLED, TRACE_BUFFER_SIZE
+
+# 远程调用耗时的默认桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_enabled = METRICS_ENABLED
+_tracing = METRICS_ENABLED and TRACING_ENABLED
+
+
+def enabled():
+    return _enabled
+
+
+def set_enabled(metrics=True, tracing=None):
+    """
+    运行时开关（例如基准测试对比开销），tracing 为 None 时保持不变
+    """
+    global _enabled, _tracing
+    _enabled = metrics
+    if tracing is not None:
+        _tracing = tracing
+    _tracing = _tracing and _enabled
+
+
+def error_status(e):
+    """
+    把异常归类为标签值: 有 HTTP 状态码时为状态码（azure-core、openai、requests 的异常都带有），否则为异常类名
+    """
+    status = getattr(e, "status_code", None)
+    if status is None:
+        response = getattr(e, "response", None)
+        status = getattr(response, "status_code", None)
+    return str(status) if status is not None else type(e).__name__
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name} 需要标签 {self.label_names}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if not _enabled:
+            return
+        key = self._key(labels) if labels or self.label_names else ()
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels) if labels or self.label_names else (), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, self.label_names, key, None, value) for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        if not _enabled:
+            return
+        key = self._key(labels) if labels or self.label_names else ()
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # 各桶计数（最后一个是 +Inf）、总和、次数
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        return span(None, self, **labels)
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels) if labels or self.label_names else ())
+        return state[2] if state else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        samples = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", self.label_names, key, f'le="{_format_value(bound)}"', cumulative))
+            samples.append((f"{self.name}_sum", self.label_names, key, None, total))
+            samples.append((f"{self.name}_count", self.label_names, key, None, count))
+        return samples
+
+
+class _Callback(_Metric):
+    """
+    抓取时调用 fn 求值；fn 返回数值，或 {标签值元组: 数值}
+    """
+
+    def __init__(self, name, help, fn, kind="gauge", labels=()):
+        super().__init__(name, help, labels)
+        self.fn = fn
+        self.kind = kind
+
+    def samples(self):
+        try:
+            value = self.fn()
+        except Exception as e:
+            print(f"读取指标 {self.name} 时出错: {e}")
+            return []
+        if isinstance(value, dict):
+            items = [(key if isinstance(key, tuple) else (key,), v) for key, v in value.items()]
+        else:
+            items = [((), value)]
+        return [(self.name, self.label_names, key, None, v) for key, v in items if v is not None]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, name, factory, kind):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory()
+            elif metric.kind != kind:
+                raise ValueError(f"指标 {name} 已注册为 {metric.kind}")
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._get_or_create(name, lambda: Counter(name, help, labels), "counter")
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(name, lambda: Histogram(name, help, labels, buckets), "histogram")
+
+    def register(self, name, help, fn, kind="gauge", labels=()):
+        """
+        注册（或替换）回调指标
+        """
+        with self._lock:
+            self._metrics[name] = _Callback(name, help, fn, kind, labels)
+        return self._metrics[name]
+
+    def render(self):
+        """
+        Prometheus 文本格式（0.0.4）
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            samples = metric.samples()
+            if not samples:
+                if metric.label_names or metric.kind != "counter":
+                    continue
+                # 没有标签的计数器在第一次记录之前也输出 0
+                samples = [(metric.name, (), (), None, 0)]
+            lines.extend(metric._header())
+            for name, label_names, key, extra, value in samples:
+                lines.append(f"{name}{_format_labels(label_names, key, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def counter(name, help, labels=()):
+    return REGISTRY.counter(name, help, labels)
+
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.histogram(name, help, labels, buckets)
+
+
+def register(name, help, fn, kind="gauge", labels=()):
+    return REGISTRY.register(name, help, fn, kind, labels)
+
+
+def render():
+    return REGISTRY.render()
+
+
+# 追踪
+_current_span = contextvars.ContextVar("current_span", default=None)
+_finished_spans = deque(maxlen=TRACE_BUFFER_SIZE)
+
+
+def _new_id(size=8):
+    return os.urandom(size).hex()
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("name", "histogram", "labels", "attributes", "started", "start_time", "trace_id", "span_id",
+                 "parent_id", "_token")
+
+    def __init__(self, name, histogram, labels):
+        self.name = name
+        self.histogram = histogram
+        self.labels = labels
+        self.attributes = None
+        self._token = None
+
+    def set(self, **attributes):
+        """
+        给 span 附加属性（只在启用追踪时保存）
+        """
+        if self._token is not None:
+            self.attributes.update(attributes)
+
+    def __enter__(self):
+        if _tracing and self.name:
+            parent = _current_span.get()
+            self.trace_id = parent.trace_id if parent is not None else _new_id(16)
+            self.parent_id = parent.span_id if parent is not None else None
+            self.span_id = _new_id()
+            self.attributes = dict(self.labels)
+            self.start_time = time.time()
+            self._token = _current_span.set(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.started
+        if self.histogram is not None:
+            self.histogram.observe(duration, **self.labels)
+        if self._token is not None:
+            _current_span.reset(self._token)
+            self._token = None
+            _finished_spans.append({
+                "name": self.name,
+                "trace_id": self.trace_id,
+                "span_id": self.span_id,
+                "parent_id": self.parent_id,
+                "start": self.start_time,
+                "duration": duration,
+                "attributes": self.attributes,
+                "error": error_status(exc) if exc is not None else None,
+            })
+        return False
+
+
+def span(name, histogram=None, **labels):
+    """
+    计时一段代码: 结束时把耗时写入 histogram（labels 作为直方图标签），启用追踪时记录名为 name 的 span
+    异常照常抛出，span 中记录异常的状态码或类名
+    """
+    if not _enabled:
+        return _NOOP_SPAN
+    return _Span(name, histogram, labels)
+
+
+def recent_spans(limit=None, trace_id=None):
+    """
+    最近结束的 span（旧的在前）
+    """
+    spans = list(_finished_spans)
+    if trace_id is not None:
+        spans = [s for s in spans if s["trace_id"] == trace_id]
+    return spans[-limit:] if limit else spans
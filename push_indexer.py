@@ -0,0 +1,380 @@
+"""
+推送模式增量索引
+delta 同步拿到变更文件并在本地分块（document_processing）后直接生成分块文档（id、parent_id、title、chunk_text、chunk_vector，与 create_indexes 的字段一致）
+并通过 BufferedIndexSender 批量写入索引，变更到可检索的延迟从索引器的调度周期缩短到秒级
+分块 id 由内容哈希生成，与分块清单（chunk_manifest）比较后只重新嵌入、上传变化的分块，并删除消失的分块
+"""
+import base64
+import hashlib
+import threading
+import time
+from collections import deque
+
+from config import PUSH_BATCH_SIZE, PUSH_BATCH_MAX_BYTES, PUSH_FLUSH_INTERVAL, PUSH_MAX_RETRIES
+
+from search_clients import get_search_client
+import metrics
+
+# 单条文档失败时可以重试的状态码（冲突、限流、服务暂时不可用）
+_RETRYABLE_STATUS = {409, 422, 429, 500, 502, 503, 504}
+_RETRY_BACKOFF = 0.5
+
+INDEX_BATCH_SECONDS = metrics.histogram("index_batch_seconds", "单次 index_documents 请求耗时（秒）")
+INDEX_DOCUMENTS = metrics.counter("index_documents_total", "推送到索引的文档操作数", ("result",))
+INDEX_RETRIES = metrics.counter("index_retries_total", "推送索引时重试的文档数，status 为单条文档或整个请求的状态", ("status",))
+
+
+def estimate_document_bytes(doc):
+    """
+    估算文档序列化后的大小，避免为了计算批次大小而真正做一次 JSON 序列化
+    """
+    size = 64
+    for name, value in doc.items():
+        size += len(name) + 8
+        if isinstance(value, str):
+            # 非 ASCII 字符按 \\uXXXX 转义的最坏情况估算
+            size += len(value) * 6 if not value.isascii() else len(value)
+        elif isinstance(value, (list, tuple)):
+            size += len(value) * 20
+        else:
+            size += 24
+    return size
+
+
+def chunk_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_key(parent_id, content_hash):
+    """
+    索引键只能包含字母、数字、_、- 和 =，driveItem id 先做 URL 安全的 base64 编码
+    分块内容不变时 id 也不变
+    """
+    encoded = base64.urlsafe_b64encode(parent_id.encode("utf-8")).decode("ascii").rstrip("=")
+    return f"{encoded}_{content_hash[:32]}"
+
+
+class ChunkUpdate:
+    """
+    一个父文档的增量更新：需要上传的新分块、只需更新标题的分块、需要删除的分块，以及写入成功后的新清单
+    """
+    __slots__ = ("parent_id", "title", "chunks", "upload", "merge", "delete")
+
+    def __init__(self, parent_id, title, chunks, upload, merge, delete):
+        self.parent_id = parent_id
+        self.title = title
+        self.chunks = chunks
+        self.upload = upload
+        self.merge = merge
+        self.delete = delete
+
+    def __repr__(self):
+        return (f"ChunkUpdate(parent_id={self.parent_id!r}, upload={len(self.upload)}, "
+                f"merge={len(self.merge)}, delete={len(self.delete)})")
+
+
+def build_chunk_update(item, chunks, embed_many, manifest):
+    """
+    与清单中上次写入的分块比较，只为新出现的分块获取嵌入向量
+    chunks 为 document_processing.split_pages 的结果；内容完全相同的分块只保留一个
+    embed_many(texts) 返回与 texts 一一对应的向量（例如 Azure_SDK.get_embeddings），有任何一块失败时抛出异常
+    """
+    parent_id = item["id"]
+    title = item.get("name")
+    previous_title, previous = manifest.get(parent_id)
+
+    current = {}
+    for text in chunks:
+        content_hash = chunk_hash(text)
+        current.setdefault(chunk_key(parent_id, content_hash), (content_hash, text))
+
+    new_ids = [chunk_id for chunk_id in current if chunk_id not in previous]
+    vectors = embed_many([current[chunk_id][1] for chunk_id in new_ids]) if new_ids else []
+    missing = sum(1 for vector in vectors if vector is None)
+    if missing:
+        raise RuntimeError(f"{title} 有 {missing} 个分块获取嵌入向量失败")
+
+    upload = [
+        {
+            "id": chunk_id,
+            "parent_id": parent_id,
+            "title": title,
+            "chunk_text": current[chunk_id][1],
+            "chunk_vector": vector
+        }
+        for chunk_id, vector in zip(new_ids, vectors)
+    ]
+    # 未变化的分块不重新上传，文件改名时只更新标题
+    merge = []
+    if previous_title != title:
+        merge = [{"id": chunk_id, "title": title} for chunk_id in current if chunk_id in previous]
+    delete = [chunk_id for chunk_id in previous if chunk_id not in current]
+    return ChunkUpdate(
+        parent_id, title, {chunk_id: content_hash for chunk_id, (content_hash, _) in current.items()},
+        upload, merge, delete
+    )
+
+
+def iter_parent_chunk_keys(search_client, parent_ids, page_size=1000, parents_per_query=50):
+    """
+    通过可过滤的 parent_id 字段查出父文档的全部分块 id
+    多个父文档用 search.in 合并成一次查询，只取 id 字段；按 id 排序做键集分页，分块很多时也不受 skip 上限影响
+    """
+    parent_ids = list(parent_ids)
+    for start in range(0, len(parent_ids), parents_per_query):
+        group = "|".join(parent_id.replace("'", "''") for parent_id in parent_ids[start:start + parents_per_query])
+        parent_filter = f"search.in(parent_id, '{group}', '|')"
+        last_id = None
+        while True:
+            results = search_client.search(
+                search_text="*",
+                filter=parent_filter if last_id is None else f"{parent_filter} and id gt '{last_id}'",
+                select=["id"],
+                order_by=["id asc"],
+                top=page_size
+            )
+            page = [result["id"] for result in results]
+            yield from page
+            if len(page) < page_size:
+                break
+            last_id = page[-1].replace("'", "''")
+
+
+_BATCH_METHODS = {
+    "upload": "add_upload_actions",
+    "merge": "add_merge_actions",
+    "mergeOrUpload": "add_merge_or_upload_actions",
+    "delete": "add_delete_actions",
+}
+
+
+def _make_batch(actions):
+    from azure.search.documents import IndexDocumentsBatch
+
+    batch = IndexDocumentsBatch()
+    for action, doc, _ in actions:
+        getattr(batch, _BATCH_METHODS[action])([doc])
+    return batch
+
+
+class IndexTicket:
+    """
+    一组文档操作（例如一次同步处理的一页变更），多个同步 worker 共享同一个写入器时互不影响:
+    flush 只等待这一组的文档写入完成，只返回这一组失败的文档 id
+    用法:
+        ticket = sender.ticket()
+        ticket.add(documents)
+        failed = ticket.flush()
+    """
+    __slots__ = ("_sender", "pending", "failed")
+
+    def __init__(self, sender):
+        self._sender = sender
+        # 缓冲区中和正在发送的操作数、最终失败的文档 id，由写入器在持有锁时更新
+        self.pending = 0
+        self.failed = []
+
+    def add(self, documents, action="mergeOrUpload"):
+        self._sender.add(documents, action, ticket=self)
+
+    def delete(self, keys):
+        self._sender.delete(keys, ticket=self)
+
+    def flush(self, timeout=None):
+        return self._sender.flush(timeout, ticket=self)
+
+
+class BufferedIndexSender:
+    """
+    带缓冲的索引写入器
+    - add / delete 只把操作放进缓冲区；累计达到 batch_size 条或 max_batch_bytes 字节时立即发送，
+      否则最早一条操作等待 flush_interval 秒后由后台线程发送
+    - 每批调用一次 index_documents，单条文档返回可重试的状态码时按指数退避重试
+    - 每个调用方通过 ticket() 取得自己的 IndexTicket，ticket.flush 只等待并返回该调用方的文档；
+      不带 ticket 的操作记在写入器自己的 ticket 上，flush() 等待缓冲区全部清空，返回这些操作中失败的文档 id
+    """
+
+    def __init__(self, search_client=None, batch_size=PUSH_BATCH_SIZE, max_batch_bytes=PUSH_BATCH_MAX_BYTES,
+                 flush_interval=PUSH_FLUSH_INTERVAL, max_retries=PUSH_MAX_RETRIES):
+        self._search_client = search_client
+        self.batch_size = batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._buffer = deque()
+        self._buffer_bytes = 0
+        self._first_added = None
+        self._in_flight = 0
+        self._flush_waiters = 0
+        self._default_ticket = IndexTicket(self)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self.stats = {"documents": 0, "batches": 0, "retries": 0, "failed": 0}
+
+    @property
+    def search_client(self):
+        if self._search_client is None:
+            self._search_client = get_search_client()
+        return self._search_client
+
+    @property
+    def pending(self):
+        """
+        缓冲区中和正在发送的文档数
+        """
+        return len(self._buffer) + self._in_flight
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="index-sender", daemon=True)
+            self._thread.start()
+
+    def ticket(self):
+        return IndexTicket(self)
+
+    def add(self, documents, action="mergeOrUpload", ticket=None):
+        """
+        action 为 upload、merge、mergeOrUpload 或 delete
+        """
+        ticket = ticket or self._default_ticket
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("BufferedIndexSender 已关闭")
+            self._ensure_started()
+            for doc in documents:
+                self._buffer.append((action, doc, ticket))
+                self._buffer_bytes += estimate_document_bytes(doc)
+                ticket.pending += 1
+            if self._buffer and self._first_added is None:
+                self._first_added = time.monotonic()
+            self._cond.notify_all()
+
+    def delete(self, keys, ticket=None):
+        self.add([{"id": key} for key in keys], action="delete", ticket=ticket)
+
+    def _take_batch(self):
+        # 调用方持有锁
+        batch = []
+        size = 0
+        while self._buffer and len(batch) < self.batch_size:
+            doc_size = estimate_document_bytes(self._buffer[0][1])
+            if batch and size + doc_size > self.max_batch_bytes:
+                break
+            batch.append(self._buffer.popleft())
+            size += doc_size
+        self._buffer_bytes -= size
+        self._first_added = time.monotonic() if self._buffer else None
+        self._in_flight += len(batch)
+        return batch
+
+    def _ready(self, force):
+        if not self._buffer:
+            return False
+        if force or len(self._buffer) >= self.batch_size or self._buffer_bytes >= self.max_batch_bytes:
+            return True
+        return time.monotonic() - self._first_added >= self.flush_interval
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._ready(self._closed or self._flush_waiters > 0):
+                    if self._closed and not self._buffer:
+                        return
+                    timeout = None
+                    if self._first_added is not None:
+                        timeout = max(0.0, self._first_added + self.flush_interval - time.monotonic())
+                    self._cond.wait(timeout)
+                batch = self._take_batch()
+
+            failed = self._send(batch)
+
+            failed_keys = set(failed)
+            with self._cond:
+                self._in_flight -= len(batch)
+                for _, doc, ticket in batch:
+                    ticket.pending -= 1
+                    if doc["id"] in failed_keys:
+                        ticket.failed.append(doc["id"])
+                self.stats["documents"] += len(batch) - len(failed)
+                self.stats["failed"] += len(failed)
+                self._cond.notify_all()
+            INDEX_DOCUMENTS.inc(len(batch) - len(failed), result="succeeded")
+            if failed:
+                INDEX_DOCUMENTS.inc(len(failed), result="failed")
+
+    def _send(self, batch):
+        """
+        发送一批文档，返回最终失败的文档 id
+        """
+        pending = batch
+        failed = []
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.stats["retries"] += 1
+                time.sleep(_RETRY_BACKOFF * 2 ** (attempt - 1))
+            try:
+                with metrics.span("index_batch", INDEX_BATCH_SECONDS):
+                    results = self.search_client.index_documents(_make_batch(pending))
+            except Exception as e:
+                # azure-core 已经按自己的策略重试过整个请求，这里再按批次重试
+                print(f"写入索引出错（{len(pending)} 条，第 {attempt + 1} 次）: {e}")
+                INDEX_RETRIES.inc(len(pending), status=metrics.error_status(e))
+                continue
+            self.stats["batches"] += 1
+
+            by_key = {}
+            for entry in pending:
+                by_key.setdefault(entry[1]["id"], []).append(entry)
+            retry = []
+            for result in results:
+                if result.succeeded:
+                    continue
+                if result.status_code in _RETRYABLE_STATUS:
+                    retry.extend(by_key[result.key])
+                    INDEX_RETRIES.inc(status=result.status_code)
+                else:
+                    print(f"  文档 {result.key} 写入失败: {result.status_code} {result.error_message}")
+                    failed.append(result.key)
+            pending = retry
+            if not pending:
+                break
+
+        failed.extend(doc["id"] for _, doc, _ in pending)
+        return failed
+
+    def _flush_done(self, ticket):
+        if ticket is None:
+            return not self._buffer and not self._in_flight
+        return ticket.pending == 0
+
+    def flush(self, timeout=None, ticket=None):
+        """
+        立即发送缓冲区中的文档并等待完成，返回失败的文档 id（并清空失败记录）
+        ticket 为 None 时等待缓冲区全部清空，返回不带 ticket 的操作中失败的文档 id；否则只等待该 ticket 的文档
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flush_waiters += 1
+            self._cond.notify_all()
+            try:
+                while not self._flush_done(ticket):
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("等待索引写入超时")
+                    self._cond.wait(remaining)
+            finally:
+                self._flush_waiters -= 1
+            ticket = ticket or self._default_ticket
+            failed, ticket.failed = ticket.failed, []
+        return failed
+
+    def close(self):
+        """
+        发送剩余文档后停止后台线程
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
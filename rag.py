@@ -0,0 +1,106 @@
+"""
+客户端 RAG
+用本项目自己的检索函数（hybrid_search / semantic_search / fusion_search）取回分块，
+按 token 预算拼装上下文（同一父文档只保留得分最高的几个分块），再以普通聊天请求发给模型
+与 azure_search 数据源相比，检索可以走结果缓存、融合多种模式、裁剪上下文，并且能分别统计检索和生成的耗时
+"""
+import time
+
+from embedding_batch import estimate_tokens
+
+RAG_RETRIEVAL_MODES = ("hybrid", "semantic", "fusion")
+RAG_SYSTEM_PROMPT = (
+    "You are an AI assistant. Answer the question using only the sources below. "
+    "Cite sources as [doc1], [doc2] ... If the sources do not contain the answer, say you don't know.\n\n"
+    "Sources:\n{context}"
+)
+
+
+class RagContext:
+    """
+    检索得到的上下文
+    sources 与 context 中的 [docN] 编号一一对应，retrieval 为检索耗时（秒）
+    """
+    __slots__ = ("query", "context", "sources", "tokens", "retrieval")
+
+    def __init__(self, query, context, sources, tokens, retrieval):
+        self.query = query
+        self.context = context
+        self.sources = sources
+        self.tokens = tokens
+        self.retrieval = retrieval
+
+    def __repr__(self):
+        return f"RagContext(sources={len(self.sources)}, tokens={self.tokens}, retrieval={self.retrieval:.3f}s)"
+
+
+def retrieve(query, retrieval="hybrid", top_k=8):
+    from Azure_SDK import fusion_search, get_embedding, hybrid_search, semantic_search
+
+    if retrieval == "hybrid":
+        return hybrid_search(query, get_embedding(query), top_k)
+    if retrieval == "semantic":
+        return semantic_search(query, top_k)
+    if retrieval == "fusion":
+        return fusion_search(query, top_k)
+    raise ValueError(f"未知的检索模式: {retrieval}")
+
+
+def build_context(hits, max_tokens=3000, max_chunks_per_parent=1):
+    """
+    按检索排名依次放入分块，直到用完 max_tokens
+    同一父文档最多放 max_chunks_per_parent 个分块（重叠的相邻分块内容大量重复），放不下的分块跳过
+    返回 (上下文文本, 来源列表, token 数)
+    """
+    per_parent = {}
+    parts = []
+    sources = []
+    used = 0
+    for hit in hits:
+        text = (hit.get("chunk_text") or hit.get("content") or "").strip()
+        if not text:
+            continue
+        parent_id = hit.get("parent_id") or hit.get("id")
+        if per_parent.get(parent_id, 0) >= max_chunks_per_parent:
+            continue
+        title = hit.get("title") or ""
+        part = f"[doc{len(sources) + 1}] {title}\n{text}"
+        tokens = estimate_tokens(part)
+        if used + tokens > max_tokens:
+            continue
+        per_parent[parent_id] = per_parent.get(parent_id, 0) + 1
+        parts.append(part)
+        sources.append({
+            "id": hit.get("id"),
+            "parent_id": hit.get("parent_id"),
+            "title": title,
+            "score": hit.get("score"),
+            "content": text,
+        })
+        used += tokens
+    return "\n\n".join(parts), sources, used
+
+
+def prepare_context(query, retrieval="hybrid", top_k=8, max_tokens=3000, max_chunks_per_parent=1):
+    """
+    检索并拼装上下文；可以在生成请求之前提前调用（例如在后台线程中），与其他工作重叠
+    """
+    started = time.perf_counter()
+    hits = retrieve(query, retrieval=retrieval, top_k=top_k)
+    context, sources, tokens = build_context(hits, max_tokens=max_tokens, max_chunks_per_parent=max_chunks_per_parent)
+    return RagContext(query, context, sources, tokens, time.perf_counter() - started)
+
+
+def rag_messages(messages, rag_context, system_prompt=RAG_SYSTEM_PROMPT):
+    """
+    用包含检索上下文的系统提示替换（或插入）messages 中的系统消息
+    """
+    system = {"role": "system", "content": system_prompt.format(context=rag_context.context or "(none)")}
+    return [system] + [message for message in messages if message.get("role") != "system"]
+
+
+def last_user_message(messages):
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            return message.get("content") or ""
+    return ""
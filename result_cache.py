@@ -0,0 +1,173 @@
+"""
+检索结果缓存
+键为 (mode, 查询文本或向量哈希, top_k, filter, select)，带 TTL 和条数上限（LRU 淘汰）
+文档变更时可调用 invalidate_result_cache 主动失效：
+- 同进程内按文档 id / parent_id 精确淘汰，或全部清空
+- 跨进程通过标记文件通知，检索进程发现标记更新后清空本地缓存
+"""
+import hashlib
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from config import RESULT_CACHE_ENABLED, RESULT_CACHE_TTL, RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_STAMP_PATH
+import metrics
+
+# 两次检查标记文件之间的最小间隔（秒）
+_STAMP_CHECK_INTERVAL = 0.5
+
+CACHE_REQUESTS = metrics.counter("result_cache_requests_total", "检索结果缓存查询次数", ("mode", "result"))
+CACHE_INVALIDATIONS = metrics.counter("result_cache_invalidated_total", "因文档变更淘汰的缓存条数")
+
+
+def vector_hash(vector):
+    return hashlib.sha1(array("f", vector).tobytes()).hexdigest()
+
+
+def make_cache_key(mode, query=None, vector=None, top_k=5, filter=None, select=None):
+    return (mode, query, vector_hash(vector) if vector else None, top_k, filter, tuple(select) if select else None)
+
+
+class ResultCache:
+    """
+    线程安全的检索结果缓存
+    """
+
+    def __init__(self, ttl=RESULT_CACHE_TTL, max_entries=RESULT_CACHE_MAX_ENTRIES, stamp_path=RESULT_CACHE_STAMP_PATH):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stamp_path = stamp_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stamp = self._read_stamp()
+        self._stamp_checked = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+
+    def _read_stamp(self):
+        if not self.stamp_path:
+            return None
+        try:
+            return os.stat(self.stamp_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def stamp_due(self):
+        """
+        是否到了检查标记文件的时间（不访问文件系统）
+        """
+        return time.monotonic() - self._stamp_checked >= _STAMP_CHECK_INTERVAL
+
+    def check_stamp(self):
+        """
+        检查标记文件，其他进程更新过标记时清空本地缓存
+        异步调用方在 stamp_due() 为真时放到线程中执行，再以 check_stamp=False 调用 get
+        """
+        with self._lock:
+            self._check_stamp()
+
+    def _check_stamp(self):
+        now = time.monotonic()
+        if now - self._stamp_checked < _STAMP_CHECK_INTERVAL:
+            return
+        self._stamp_checked = now
+        stamp = self._read_stamp()
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self._entries.clear()
+
+    def get(self, key, check_stamp=True):
+        """
+        查询缓存，未命中或已过期返回 None
+        check_stamp=False 时不检查标记文件，只访问内存
+        """
+        with self._lock:
+            if check_stamp:
+                self._check_stamp()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                CACHE_REQUESTS.inc(mode=key[0], result="miss")
+                return None
+            expires_at, results, _ = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                CACHE_REQUESTS.inc(mode=key[0], result="expired")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            CACHE_REQUESTS.inc(mode=key[0], result="hit")
+        return [result.copy() for result in results]
+
+    def put(self, key, results):
+        doc_ids = set()
+        for result in results:
+            doc_ids.add(result.get("id"))
+            doc_ids.add(result.get("parent_id"))
+        doc_ids.discard(None)
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, [result.copy() for result in results], doc_ids)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, doc_ids=None):
+        """
+        淘汰包含指定文档（id 或 parent_id）的缓存结果，不传 doc_ids 时清空全部
+        返回淘汰条数
+        """
+        with self._lock:
+            if doc_ids is None:
+                count = len(self._entries)
+                self._entries.clear()
+                CACHE_INVALIDATIONS.inc(count)
+                return count
+            doc_ids = set(doc_ids)
+            keys = [key for key, (_, _, ids) in self._entries.items() if ids & doc_ids]
+            for key in keys:
+                del self._entries[key]
+            CACHE_INVALIDATIONS.inc(len(keys))
+            return len(keys)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """
+    获取进程内共享的结果缓存，未启用时返回 None
+    """
+    global _cache
+    if not RESULT_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache()
+    return _cache
+
+
+def invalidate_result_cache(doc_ids=None):
+    """
+    文档变更时调用：失效本进程缓存，并更新标记文件通知其他进程
+    其他进程无法按文档精确淘汰，收到通知后会清空全部缓存
+    """
+    if _cache is not None:
+        _cache.invalidate(doc_ids)
+    if RESULT_CACHE_STAMP_PATH:
+        try:
+            with open(RESULT_CACHE_STAMP_PATH, "a"):
+                pass
+            os.utime(RESULT_CACHE_STAMP_PATH)
+        except OSError as e:
+            print(f"更新结果缓存失效标记时出错: {e}")
+            return
+    if _cache is not None:
+        # 本进程已经处理过，避免再因标记变化清空全部缓存
+        with _cache._lock:
+            _cache._stamp = _cache._read_stamp()
@@ -0,0 +1,116 @@
+import atexit
+import threading
+
+from config import (
+    SEARCH_API_KEY,SEARCH_ENDPOINT,INDEX_NAME,SEARCH_POOL_CONNECTIONS,SEARCH_POOL_MAXSIZE,
+    SEARCH_CONNECTION_TIMEOUT,SEARCH_READ_TIMEOUT
+    )
+
+
+class SearchClientRegistry:
+    """
+    线程安全的 SearchClient 注册表
+    按 (endpoint, index_name) 缓存客户端，同一个 endpoint 共享一个带连接池的 requests.Session，
+    避免每次查询都重新建立 HTTP 管道、TCP 连接和 TLS 握手
+    """
+
+    def __init__(self, pool_connections=SEARCH_POOL_CONNECTIONS, pool_maxsize=SEARCH_POOL_MAXSIZE,
+                 connection_timeout=SEARCH_CONNECTION_TIMEOUT, read_timeout=SEARCH_READ_TIMEOUT):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.connection_timeout = connection_timeout
+        self.read_timeout = read_timeout
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._sessions = {}
+
+    def _new_session(self):
+        # requests / azure SDK 在第一次创建客户端时才导入，导入本模块很快
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        session = requests.Session()
+        # 重试交给 azure-core 的 RetryPolicy 处理，这里与 RequestsTransport 默认行为保持一致
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=Retry(total=False, redirect=False, raise_on_status=False)
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def get(self, endpoint=SEARCH_ENDPOINT, index_name=INDEX_NAME, credential=None):
+        """
+        获取 (endpoint, index_name) 对应的共享客户端，不存在时创建
+        """
+        key = (endpoint, index_name)
+        search_client = self._clients.get(key)
+        if search_client is not None:
+            return search_client
+
+        from azure.core.credentials import AzureKeyCredential
+        from azure.core.pipeline.transport import RequestsTransport
+        from azure.search.documents import SearchClient
+
+        with self._lock:
+            search_client = self._clients.get(key)
+            if search_client is None:
+                session = self._sessions.get(endpoint)
+                if session is None:
+                    session = self._new_session()
+                    self._sessions[endpoint] = session
+                transport = RequestsTransport(
+                    session=session,
+                    session_owner=False,
+                    connection_timeout=self.connection_timeout,
+                    read_timeout=self.read_timeout
+                )
+                search_client = SearchClient(
+                    endpoint=endpoint,
+                    index_name=index_name,
+                    credential=credential or AzureKeyCredential(SEARCH_API_KEY),
+                    transport=transport
+                )
+                self._clients[key] = search_client
+            return search_client
+
+    def close(self, endpoint=None, index_name=None):
+        """
+        关闭客户端并释放连接池
+        不传参数时关闭全部；只传 endpoint 时关闭该 endpoint 下的全部索引
+        """
+        with self._lock:
+            keys = [
+                key for key in self._clients
+                if (endpoint is None or key[0] == endpoint) and (index_name is None or key[1] == index_name)
+            ]
+            for key in keys:
+                self._clients.pop(key).close()
+
+            # 该 endpoint 下已没有客户端时才关闭 Session
+            endpoints = {endpoint} if endpoint is not None else set(self._sessions)
+            for ep in endpoints:
+                if ep in self._sessions and not any(key[0] == ep for key in self._clients):
+                    self._sessions.pop(ep).close()
+
+
+_registry = SearchClientRegistry()
+
+
+def get_search_client(index_name=INDEX_NAME, endpoint=SEARCH_ENDPOINT, credential=None):
+    """
+    获取进程内共享的 SearchClient
+    """
+    return _registry.get(endpoint=endpoint, index_name=index_name, credential=credential)
+
+
+def close_search_clients(endpoint=None, index_name=None):
+    """
+    关闭共享的 SearchClient（进程退出时会自动调用）
+    """
+    _registry.close(endpoint=endpoint, index_name=index_name)
+
+
+atexit.register(close_search_clients)
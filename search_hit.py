@@ -0,0 +1,61 @@
+"""
+紧凑的检索结果记录
+使用 __slots__ 代替 dict 保存每条命中结果；同时实现只读 Mapping 接口，
+原来按 result["title"] / result.get("score") 访问的代码无需修改
+"""
+from collections.abc import Mapping
+
+# 各检索模式默认只取回需要的字段，content 保存整篇文档，体积很大，默认不取
+DEFAULT_SELECT = {
+    "semantic": ["id", "parent_id", "title", "chunk_text"],
+    "hybrid": ["id", "parent_id", "title", "chunk_text"],
+    "vector": ["id", "parent_id", "title", "chunk_text"],
+}
+
+
+class SearchHit(Mapping):
+    __slots__ = ("id", "parent_id", "title", "chunk_text", "content", "score", "reranker_score", "captions")
+
+    def __init__(self, id=None, parent_id=None, title=None, chunk_text=None, content=None, score=None,
+                 reranker_score=None, captions=None):
+        self.id = id
+        self.parent_id = parent_id
+        self.title = title
+        self.chunk_text = chunk_text
+        self.content = content
+        self.score = score
+        self.reranker_score = reranker_score
+        self.captions = captions or []
+
+    @classmethod
+    def from_result(cls, result):
+        """
+        由 SearchClient.search 返回的单条结果构造
+        """
+        return cls(
+            id=result.get("id"),
+            parent_id=result.get("parent_id"),
+            title=result.get("title"),
+            chunk_text=result.get("chunk_text"),
+            content=result.get("content"),
+            score=result.get("@search.score"),
+            reranker_score=result.get("@search.reranker_score"),
+            captions=result.get("@search.captions")
+        )
+
+    def __getitem__(self, name):
+        if name not in self.__slots__:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def copy(self):
+        return SearchHit(*(getattr(self, name) for name in self.__slots__))
+
+    def __repr__(self):
+        return f"SearchHit(id={self.id!r}, title={self.title!r}, score={self.score!r})"
@@ -0,0 +1,124 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class DeltaLinkStore:
+    """
+    按订阅保存 delta 链接的检查点存储（SQLite，WAL 模式）
+    - 每个订阅单行原子 upsert，不再整文件重写
+    - WAL 模式下读写互不阻塞，多个 worker 线程/进程可以并发读取
+    - 事务提交保证崩溃一致性
+    - 遍历多页 delta 结果时按页保存 nextLink 检查点，保存最终 deltaLink 时一并清除
+    首次打开时会把旧的 delta_links.json 导入，并重命名为 .migrated
+    """
+
+    def __init__(self, path, legacy_json=None):
+        self.path = path
+        self._local = threading.local()
+        self._conn().execute(
+            """
+            CREATE TABLE IF NOT EXISTS delta_links (
+                sub_id TEXT PRIMARY KEY,
+                delta_link TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn().execute(
+            """
+            CREATE TABLE IF NOT EXISTS next_links (
+                sub_id TEXT PRIMARY KEY,
+                next_link TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        if legacy_json:
+            self.migrate_json(legacy_json)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, sub_id):
+        row = self._conn().execute("SELECT delta_link FROM delta_links WHERE sub_id = ?", (sub_id,)).fetchone()
+        return row[0] if row else None
+
+    def save(self, sub_id, delta_link):
+        """
+        保存最终的 deltaLink，并在同一事务中清除该订阅的 nextLink 检查点
+        """
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            conn.execute(
+                """
+                INSERT INTO delta_links (sub_id, delta_link, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT (sub_id) DO UPDATE SET delta_link = excluded.delta_link, updated_at = excluded.updated_at
+                """,
+                (sub_id, delta_link, time.time())
+            )
+            conn.execute("DELETE FROM next_links WHERE sub_id = ?", (sub_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_next_link(self, sub_id):
+        row = self._conn().execute("SELECT next_link FROM next_links WHERE sub_id = ?", (sub_id,)).fetchone()
+        return row[0] if row else None
+
+    def save_next_link(self, sub_id, next_link):
+        self._conn().execute(
+            """
+            INSERT INTO next_links (sub_id, next_link, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT (sub_id) DO UPDATE SET next_link = excluded.next_link, updated_at = excluded.updated_at
+            """,
+            (sub_id, next_link, time.time())
+        )
+
+    def reset(self, sub_id):
+        """
+        清除订阅的 deltaLink 和 nextLink，下次同步从头开始
+        """
+        conn = self._conn()
+        conn.execute("BEGIN")
+        conn.execute("DELETE FROM delta_links WHERE sub_id = ?", (sub_id,))
+        conn.execute("DELETE FROM next_links WHERE sub_id = ?", (sub_id,))
+        conn.execute("COMMIT")
+
+    def all(self):
+        return dict(self._conn().execute("SELECT sub_id, delta_link FROM delta_links"))
+
+    def migrate_json(self, json_path):
+        """
+        导入旧的 JSON 文件（已存在的订阅不会被覆盖），返回导入条数
+        """
+        if not os.path.exists(json_path):
+            return 0
+        try:
+            with open(json_path, "r") as f:
+                content = f.read().strip()
+            data = json.loads(content) if content else {}
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"读取旧的delta链接文件时出错，跳过迁移: {e}")
+            return 0
+
+        conn = self._conn()
+        conn.execute("BEGIN")
+        cursor = conn.executemany(
+            "INSERT OR IGNORE INTO delta_links (sub_id, delta_link, updated_at) VALUES (?, ?, ?)",
+            [(sub_id, link, time.time()) for sub_id, link in data.items() if link]
+        )
+        conn.execute("COMMIT")
+        os.replace(json_path, json_path + ".migrated")
+        print(f"已从 {json_path} 迁移 {cursor.rowcount} 条delta链接")
+        return cursor.rowcount
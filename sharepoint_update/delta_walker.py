@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metrics
+
+DELTA_PAGE_SECONDS = metrics.histogram("graph_delta_page_seconds", "获取一页 delta 结果的耗时（秒）")
+DELTA_RESPONSES = metrics.counter("graph_delta_responses_total", "delta 请求的非 200 响应（限流、token 失效、需要重新同步）", ("status",))
+DELTA_ITEMS = metrics.counter("graph_delta_items_total", "delta 返回的变更条目数")
+
+
+class DeltaResyncRequired(Exception):
+    """
+    delta/next 链接已失效（Graph 返回 410 Gone），需要从头重新做一次完整同步
+    """
+
+
+class DeltaPage:
+    __slots__ = ("items", "next_link", "delta_link")
+
+    def __init__(self, items, next_link=None, delta_link=None):
+        self.items = items
+        self.next_link = next_link
+        self.delta_link = delta_link
+
+
+class DeltaWalker:
+    """
+    逐页遍历 Graph delta 查询结果
+    - 跟随 @odata.nextLink 直到出现 @odata.deltaLink，任何时刻只在内存中保留一页
+    - 每页都重新取 token（已缓存，长时间遍历中 token 过期也能继续）
+    - 429/503 按 Retry-After 等待后重试，401 时让 token 缓存失效后重试一次
+    """
+
+    def __init__(self, get_token, invalidate_token=None, retries=5, timeout=60):
+        self.get_token = get_token
+        self.invalidate_token = invalidate_token
+        self.retries = retries
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _get_page(self, link):
+        for attempt in range(self.retries + 1):
+            with metrics.span("graph_delta_page", DELTA_PAGE_SECONDS):
+                resp = self.session.get(link, headers={"Authorization": f"Bearer {self.get_token()}"}, timeout=self.timeout)
+            if resp.status_code != 200:
+                DELTA_RESPONSES.inc(status=resp.status_code)
+            if resp.status_code == 410:
+                raise DeltaResyncRequired(resp.headers.get("Location") or link)
+            if resp.status_code == 401 and self.invalidate_token and attempt == 0:
+                self.invalidate_token()
+                continue
+            if resp.status_code in (429, 503) and attempt < self.retries:
+                delay = resp.headers.get("Retry-After")
+                time.sleep(float(delay) if delay and delay.isdigit() else 2 ** attempt)
+                continue
+            resp.raise_for_status()
+            return resp.json()
+        resp.raise_for_status()
+        return resp.json()
+
+    def pages(self, link):
+        """
+        从 link（初始 delta 查询、保存的 deltaLink 或检查点 nextLink）开始逐页产出 DeltaPage
+        最后一页带 delta_link，其余页带 next_link
+        """
+        while link:
+            js = self._get_page(link)
+            page = DeltaPage(js.get("value", []), js.get("@odata.nextLink"), js.get("@odata.deltaLink"))
+            DELTA_ITEMS.inc(len(page.items))
+            yield page
+            link = page.next_link
@@ -0,0 +1,115 @@
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metrics
+
+DOWNLOAD_SECONDS = metrics.histogram("download_seconds", "单个文件的下载耗时（秒），包括断点续传")
+DOWNLOAD_BYTES = metrics.counter("download_bytes_total", "下载的字节数")
+DOWNLOAD_RESUMES = metrics.counter("download_resumes_total", "连接中断后从断点继续下载的次数")
+DOWNLOAD_ERRORS = metrics.counter("download_errors_total", "下载失败的文件数", ("status",))
+
+
+class FileDownloader:
+    """
+    并行、流式的文件下载器
+    - 所有下载共享一个带连接池的 requests.Session
+    - 按块流式写入临时 .part 文件，完成后原子重命名，内存占用与文件大小无关
+    - 每次下载使用独立的 .part 文件，同一条目的并发下载（多个订阅、合并后重跑）不会写到同一个临时文件
+    - 连接中断时用 Range 请求从本次下载的 .part 已有的长度继续下载
+    - 保存为 <downloads_dir>/<条目 id>/<文件名>，不同文件夹中的同名文件不会互相覆盖
+    """
+
+    def __init__(self, downloads_dir="downloads", workers=4, chunk_size=1024 * 1024, retries=3, timeout=60):
+        self.downloads_dir = downloads_dir
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=workers,
+            pool_maxsize=workers,
+            max_retries=Retry(total=retries, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="download")
+
+    def file_path(self, item):
+        # 按条目 id 分目录，保留原文件名（提取文本时按扩展名判断类型）
+        # 同一条目总是保存到同一路径；并发下载各自写独立的 .part，完成后原子替换，最后完成的一次生效
+        item_dir = item["id"].replace("/", "_").replace("\\", "_")
+        return os.path.join(self.downloads_dir, item_dir, os.path.basename(item["name"]))
+
+    def download(self, item):
+        """
+        下载单个 driveItem，返回保存路径
+        """
+        url = item["@microsoft.graph.downloadUrl"]
+        file_path = self.file_path(item)
+        expected_size = item.get("size")
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        # 以 . 开头，扫描下载目录时与已完成的文件区分
+        fd, part_path = tempfile.mkstemp(prefix=".", suffix=".part", dir=os.path.dirname(file_path))
+        os.close(fd)
+
+        try:
+            for attempt in range(self.retries + 1):
+                offset = os.path.getsize(part_path)
+                headers = {"Range": f"bytes={offset}-"} if offset else {}
+                try:
+                    with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as r:
+                        if r.status_code == 416:
+                            # .part 已经完整（或与服务端不一致），校验大小后决定是否重新下载
+                            if expected_size is not None and offset == expected_size:
+                                break
+                            open(part_path, "wb").close()
+                            continue
+                        r.raise_for_status()
+                        # 服务端不支持 Range 时返回 200，只能从头开始
+                        mode = "ab" if offset and r.status_code == 206 else "wb"
+                        with open(part_path, mode) as f:
+                            for chunk in r.iter_content(chunk_size=self.chunk_size):
+                                f.write(chunk)
+                                DOWNLOAD_BYTES.inc(len(chunk))
+                    break
+                except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                        requests.exceptions.Timeout) as e:
+                    if attempt >= self.retries:
+                        raise
+                    DOWNLOAD_RESUMES.inc()
+                    print(f"  下载 {item['name']} 中断，将从断点继续: {e}")
+
+            size = os.path.getsize(part_path)
+            if expected_size is not None and size != expected_size:
+                raise IOError(f"文件大小不一致: {size} != {expected_size}")
+            os.replace(part_path, file_path)
+        except BaseException:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        return file_path
+
+    def download_all(self, items):
+        """
+        并行下载多个 driveItem，返回 [(item, 保存路径或异常)]，顺序与输入一致
+        """
+        def run(item):
+            try:
+                with metrics.span("download", DOWNLOAD_SECONDS):
+                    return item, self.download(item)
+            except Exception as e:
+                DOWNLOAD_ERRORS.inc(status=metrics.error_status(e))
+                return item, e
+
+        return list(self._executor.map(run, items))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
@@ -1,119 +1,325 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from pyngrok import ngrok
 import uvicorn
-import json
-import threading
 import os
+import threading
 import sys
-import requests
 from typing import Optional
-from test_sp import get_access_token
-app = FastAPI()
+from test_sp import get_access_token, TOKEN_PROVIDER, GRAPH_SCOPE
+from sync_workers import CoalescingWorkerPool
+from notify_store import NotificationStore
+from delta_store import DeltaLinkStore
+from downloader import FileDownloader
+from delta_walker import DeltaWalker, DeltaResyncRequired
+
+@asynccontextmanager
+async def lifespan(app):
+    start_consumers()
+    yield
+    stop_consumers()
+
+app = FastAPI(lifespan=lifespan)
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import SHAREPOINT_TENANT_ID, SHAREPOINT_APP_ID, SHAREPOINT_CLIENT_SECRET
+from config import (
+    SHAREPOINT_TENANT_ID, SHAREPOINT_APP_ID, SHAREPOINT_CLIENT_SECRET, SYNC_WORKERS, SUBSCRIPTION_CLIENT_STATE,
+    NOTIFY_QUEUE_PATH, NOTIFY_LEASE_SECONDS, NOTIFY_RETRY_INTERVAL, NOTIFY_MAX_ATTEMPTS, DELTA_STORE_PATH,
+    DOWNLOADS_DIR, DOWNLOAD_WORKERS, DOWNLOAD_CHUNK_SIZE, DOWNLOAD_RETRIES, PUSH_INDEXING_ENABLED, SHAREPOINT_DRIVE_ID,
+    GRAPH_ENDPOINT
+)
+from result_cache import invalidate_result_cache
+from push_indexer import BufferedIndexSender, build_chunk_update, iter_parent_chunk_keys
+from chunk_manifest import ChunkManifest
+from document_processing import DocumentProcessor
+from Azure_SDK import get_embeddings, get_local_vector_index, warm_up
+import metrics
+
+NOTIFICATIONS = metrics.counter("webhook_notifications_total", "收到的变更通知条数", ("result",))
+NOTIFY_ACK_SECONDS = metrics.histogram("webhook_ack_seconds", "处理通知 POST 到应答的耗时（秒）")
+SYNC_SECONDS = metrics.histogram("sync_seconds", "一次订阅同步的耗时（秒）")
+SYNC_RUNS = metrics.counter("sync_runs_total", "订阅同步次数，empty 为没有待处理通知的同步", ("outcome",))
+SYNC_STAGE_SECONDS = metrics.histogram("sync_stage_seconds", "每页变更各阶段的耗时（秒）", ("stage",))
+DELTA_CHANGES = metrics.counter("sync_changes_total", "delta 同步处理的变更条目数", ("type",))
+EXTRACTION_SKIPPED = metrics.counter(
+    "extraction_skipped_total", "跳过推送索引的文件数，reason 为 unsupported（不支持或缺少提取工具）、error、empty（没有文本）或 index_error（获取嵌入向量或读取分块清单失败）", ("reason",)
+)
 
 DELTA_FILE = "delta_links.json"
-NOTIFY_QUEUE = []
+# delta 链接检查点，首次启动时自动迁移旧的 DELTA_FILE
+DELTA_STORE = DeltaLinkStore(DELTA_STORE_PATH, legacy_json=DELTA_FILE)
 
 def get_saved_delta_link(sub_id):
-    if not os.path.exists(DELTA_FILE):
-        return None
-    try:
-        with open(DELTA_FILE, 'r') as f:
-            content = f.read().strip()
-            if not content:  # 文件为空
-                return None
-            data = json.loads(content)
-            return data.get(sub_id)
-    except (json.JSONDecodeError, FileNotFoundError) as e:
-        print(f"读取delta链接文件时出错: {e}")
-        return None
+    return DELTA_STORE.get(sub_id)
 
 def save_delta_link(sub_id, delta_link):
-    data = {}
-    if os.path.exists(DELTA_FILE):
-        try:
-            with open(DELTA_FILE, 'r') as f:
-                content = f.read().strip()
-                if content:  # 文件不为空
-                    data = json.loads(content)
-        except (json.JSONDecodeError, FileNotFoundError) as e:
-            print(f"读取现有delta链接文件时出错，将创建新文件: {e}")
-            data = {}
-    
-    data[sub_id] = delta_link
-    with open(DELTA_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+    DELTA_STORE.save(sub_id, delta_link)
+
+# 持久化通知队列，POST 处理只负责写入，由后台 worker 消费
+NOTIFY_STORE = NotificationStore(NOTIFY_QUEUE_PATH, lease_seconds=NOTIFY_LEASE_SECONDS, max_attempts=NOTIFY_MAX_ATTEMPTS)
+_retry_stop = threading.Event()
 
 def process_notification(data):
-    for n in data.get("value", []):
-        print("Received notification:", n)
-        sub_id = n.get("subscriptionId")
-        changed_id = n.get("resourceData", {}).get("id")
-        NOTIFY_QUEUE.append((sub_id, changed_id))
-                
-    # 启动异步线程处理队列，避免 blocking
-    threading.Thread(target=handle_queue).start()
-
-def handle_queue():
-    print("开始处理通知队列")
-    while NOTIFY_QUEUE:
-        sub_id, changed_id = NOTIFY_QUEUE.pop(0)
-        print(f"处理订阅 {sub_id} 的变更通知")
-        
-        delta_link = get_saved_delta_link(sub_id)
-        if not delta_link:
-            # 如果没有保存的delta链接，创建初始的delta查询
-            print("没有找到保存的delta链接，创建初始delta查询")
-            drive_id = "b!15loqcZkLUGK6C0oCOL3vvvNNWQegURNvY-5ZGBF091rDBpKdJ6IS6RbBIfXEnsk"
-            delta_link = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/root/delta?$select=id,name,content,content.downloadUrl"
-        
+    """
+    校验 clientState 后写入持久化队列，并通知 worker 池，返回接受的通知条数
+    """
+    notifications = [n for n in data.get("value", []) if n.get("clientState") == SUBSCRIPTION_CLIENT_STATE]
+    rejected = len(data.get("value", [])) - len(notifications)
+    NOTIFICATIONS.inc(len(notifications), result="accepted")
+    if rejected:
+        NOTIFICATIONS.inc(rejected, result="rejected")
+        print(f"忽略 {rejected} 条 clientState 不匹配的通知")
+    if not notifications:
+        return 0
+
+    NOTIFY_STORE.enqueue(notifications)
+    # 同一订阅的多条通知会被合并，只触发一次 delta 同步
+    for sub_id in {n.get("subscriptionId") for n in notifications}:
+        SYNC_POOL.submit(sub_id)
+    return len(notifications)
+
+def sync_subscription(sub_id):
+    # 领取该订阅全部待处理的通知，已被之前的同步处理过则直接返回
+    notification_ids = NOTIFY_STORE.claim(sub_id)
+    if not notification_ids:
+        SYNC_RUNS.inc(outcome="empty")
+        return
+    print(f"处理订阅 {sub_id} 的 {len(notification_ids)} 条变更通知")
+    with metrics.span("sync", SYNC_SECONDS) as sync_span:
+        sync_span.set(subscription=sub_id, notifications=len(notification_ids))
+        _sync_subscription(sub_id, notification_ids)
+
+def _sync_subscription(sub_id, notification_ids):
+    
+    delta_link = get_saved_delta_link(sub_id)
+    if not delta_link:
+        # 如果没有保存的delta链接，创建初始的delta查询
+        print("没有找到保存的delta链接，创建初始delta查询")
+        delta_link = f"{GRAPH_ENDPOINT}/v1.0/drives/{SHAREPOINT_DRIVE_ID}/root/delta?$select=id,name,size,eTag,content,content.downloadUrl"
+    
+    try:
+        new_delta_link = sync_delta(sub_id, delta_link)
+        if new_delta_link:
+            save_delta_link(sub_id, new_delta_link)
+            print(f"已保存新的delta链接: {new_delta_link}")
+            NOTIFY_STORE.ack(notification_ids)
+            SYNC_RUNS.inc(outcome="completed")
+        else:
+            # 同步失败，通知放回队列稍后重试（从已保存的 nextLink 检查点继续）
+            NOTIFY_STORE.release(notification_ids)
+            SYNC_RUNS.inc(outcome="failed")
+    except Exception as e:
+        print(f"处理delta同步时出错: {e}")
+        NOTIFY_STORE.release(notification_ids)
+        SYNC_RUNS.inc(outcome="failed")
+
+def retry_pending_notifications():
+    """
+    定期把队列中待处理（包括进程重启前遗留、租约过期、失败待重试）的通知重新交给 worker 池
+    """
+    while True:
         try:
-            new_delta_link = sync_delta(delta_link)
-            if new_delta_link:
-                save_delta_link(sub_id, new_delta_link)
-                print(f"已保存新的delta链接: {new_delta_link}")
+            for sub_id in NOTIFY_STORE.pending_subscriptions():
+                SYNC_POOL.submit(sub_id)
         except Exception as e:
-            print(f"处理delta同步时出错: {e}")
+            print(f"检查待处理通知时出错: {e}")
+        if _retry_stop.wait(NOTIFY_RETRY_INTERVAL):
+            return
+
+def start_consumers():
+    _retry_stop.clear()
+    SYNC_POOL.start()
+    if PUSH_INDEXING_ENABLED:
+        # 在后台导入 SDK、创建客户端，第一次同步不再承担这部分开销
+        warm_up()
+    threading.Thread(target=retry_pending_notifications, name="notify-retry", daemon=True).start()
+
+def stop_consumers():
+    _retry_stop.set()
+    SYNC_POOL.stop()
+    INDEX_SENDER.flush()
+    DOCUMENT_PROCESSOR.close()
+
+# 固定大小的同步 worker 池，替代每个通知启动一个线程
+SYNC_POOL = CoalescingWorkerPool(sync_subscription, workers=SYNC_WORKERS)
+
+# 所有同步 worker 共享的下载器
+DOWNLOADER = FileDownloader(DOWNLOADS_DIR, workers=DOWNLOAD_WORKERS, chunk_size=DOWNLOAD_CHUNK_SIZE, retries=DOWNLOAD_RETRIES)
+
+# 逐页遍历 delta 结果，遇到 401 时让缓存的 token 失效
+DELTA_WALKER = DeltaWalker(
+    lambda: get_access_token(SHAREPOINT_TENANT_ID, SHAREPOINT_APP_ID, SHAREPOINT_CLIENT_SECRET),
+    invalidate_token=lambda: TOKEN_PROVIDER.invalidate(SHAREPOINT_TENANT_ID, SHAREPOINT_APP_ID, GRAPH_SCOPE)
+)
+
+# 变更文件的分块直接推送到索引，所有同步 worker 共享一个缓冲写入器，每页变更用各自的 ticket 等待写入结果
+INDEX_SENDER = BufferedIndexSender()
+
+# 文本提取和分块在进程池中并行执行
+DOCUMENT_PROCESSOR = DocumentProcessor()
+# 每个文件上次写入索引的分块，只有内容变化的分块才重新嵌入和上传
+CHUNK_MANIFEST = ChunkManifest()
+
+# 队列深度和各组件已有的统计在抓取 /metrics 时读取
+metrics.register("sync_queue_depth", "等待执行的订阅同步数", SYNC_POOL.queue_depth)
+metrics.register("notify_queue_depth", "持久化队列中待处理和处理中的通知数", NOTIFY_STORE.depth)
+metrics.register("index_sender_pending", "等待写入索引的文档数", lambda: INDEX_SENDER.pending)
+metrics.register(
+    "sync_pool_events_total", "worker 池收到的通知、合并的通知和执行次数",
+    lambda: {(name,): value for name, value in SYNC_POOL.stats.items()}, kind="counter", labels=("event",)
+)
+metrics.register(
+    "graph_token_cache_total", "Graph access token 缓存命中、获取和后台刷新次数",
+    lambda: {(name,): value for name, value in TOKEN_PROVIDER.stats.items()}, kind="counter", labels=("event",)
+)
 
-def sync_delta(delta_link):
-    print(f"同步delta变更，使用链接: {delta_link}")
-    token = get_access_token(SHAREPOINT_TENANT_ID, SHAREPOINT_APP_ID, SHAREPOINT_CLIENT_SECRET)
+def index_downloaded_items(downloaded, ticket):
+    """
+    downloaded 为 [(item, 文件路径)]，提取、分块后把变化的分块提交到索引写入器（记在 ticket 上）
+    返回各文件的 ChunkUpdate，写入成功后再更新分块清单
+    单个文件提取失败（文件损坏等）或生成分块更新失败（嵌入接口出错等）只跳过该文件，不让整页同步失败，
+    否则检查点永远停在这一页；跳过的文件在下次变更时重新处理
+    """
+    updates = []
+    results = DOCUMENT_PROCESSOR.process_many([file_path for _, file_path in downloaded])
+    for (item, _), (_, result) in zip(downloaded, results):
+        if isinstance(result, Exception):
+            print(f"  提取 {item.get('name')} 的文本时出错，跳过推送索引: {result}")
+            EXTRACTION_SKIPPED.inc(reason="error")
+            continue
+        language, chunks = result
+        if chunks is None:
+            print(f"  不支持提取 {item.get('name')} 的文本，跳过推送索引")
+            EXTRACTION_SKIPPED.inc(reason="unsupported")
+            continue
+        if not chunks:
+            print(f"  {item.get('name')} 没有可索引的文本，跳过推送索引")
+            EXTRACTION_SKIPPED.inc(reason="empty")
+            continue
+        try:
+            update = build_chunk_update(item, chunks, get_embeddings, CHUNK_MANIFEST)
+        except Exception as e:
+            print(f"  生成 {item.get('name')} 的分块更新时出错，跳过推送索引: {e}")
+            EXTRACTION_SKIPPED.inc(reason="index_error")
+            continue
+        ticket.add(update.upload)
+        ticket.add(update.merge, action="merge")
+        ticket.delete(update.delete)
+        updates.append(update)
+        print(f"  {item.get('name')}（{language}）共 {len(update.chunks)} 个分块，"
+              f"上传 {len(update.upload)}，更新标题 {len(update.merge)}，删除 {len(update.delete)}")
+    return updates
+
+def delete_parent_chunks(parent_ids, ticket):
+    """
+    把已删除文件的全部分块提交为删除操作，返回分块 id
+    分块 id 来自分块清单和按 parent_id 过滤的检索结果，后者补上清单中缺失的推送分块（清单丢失或重建等）
+    索引器写入的分块 parent_id 是 base64(metadata_spo_site_library_item_id)，不是 driveItem id，这里查不到；
+    推送模式下不应同时运行索引器（见 PUSH_INDEXING_ENABLED）
+    """
+    chunk_ids = set()
+    for parent_id in parent_ids:
+        chunk_ids.update(CHUNK_MANIFEST.get(parent_id)[1])
+    chunk_ids.update(iter_parent_chunk_keys(INDEX_SENDER.search_client, parent_ids))
+    ticket.delete(sorted(chunk_ids))
+    print(f"  {len(parent_ids)} 个已删除文件共 {len(chunk_ids)} 个分块待删除")
+    return chunk_ids
+
+def update_local_vector_index(updates, deleted):
+    """
+    分块写入索引成功后同步更新本地向量索引镜像（LOCAL_VECTOR_SEARCH_MODE 不为 off 时）
+    镜像只是检索服务的副本，更新失败不影响同步，下次 sync_local_vector_index 时补齐
+    """
+    local_index = get_local_vector_index()
+    if local_index is None:
+        return
+    try:
+        for update in updates:
+            local_index.upsert(update.upload + update.merge)
+            local_index.delete(update.delete)
+        if deleted:
+            local_index.delete_parents(deleted)
+    except Exception as e:
+        print(f"更新本地向量索引镜像时出错: {e}")
+
+def process_delta_items(items):
+    downloads = []
+    deleted = []
+    for item in items:
+        if "deleted" in item:
+            print(f"删除的文件: {item['id']} - {item.get('name', 'Unknown')}")
+            deleted.append(item["id"])
+        else:
+            print(f"更新的文件: {item['id']} - {item.get('name', 'Unknown')}")
+            if item.get("@microsoft.graph.downloadUrl"):
+                downloads.append(item)
+    DELTA_CHANGES.inc(len(items) - len(deleted), type="updated")
+    DELTA_CHANGES.inc(len(deleted), type="deleted")
+    
+    # 通过共享连接池并行、流式下载
+    downloaded = []
+    with metrics.span("sync_download", SYNC_STAGE_SECONDS, stage="download"):
+        results = DOWNLOADER.download_all(downloads)
+    for item, result in results:
+        if isinstance(result, Exception):
+            print(f"  下载文件 {item.get('name')} 时出错: {result}")
+        else:
+            print(f"  文件已保存到: {result}")
+            downloaded.append((item, result))
+    
+    changed_ids = {item["id"] for item in items}
+    if PUSH_INDEXING_ENABLED:
+        ticket = INDEX_SENDER.ticket()
+        with metrics.span("sync_index", SYNC_STAGE_SECONDS, stage="index"):
+            updates = index_downloaded_items(downloaded, ticket)
+            if deleted:
+                changed_ids.update(delete_parent_chunks(deleted, ticket))
+        # 本页的分块全部写入索引后才能更新分块清单、保存 nextLink 检查点；只看本页自己的失败，不受其他 worker 影响
+        with metrics.span("sync_flush", SYNC_STAGE_SECONDS, stage="flush"):
+            failed = ticket.flush()
+        if failed:
+            raise RuntimeError(f"{len(failed)} 个分块写入索引失败")
+        for update in updates:
+            CHUNK_MANIFEST.replace(update.parent_id, update.title, update.chunks)
+            changed_ids.update(update.delete)
+        for parent_id in deleted:
+            CHUNK_MANIFEST.remove(parent_id)
+        update_local_vector_index(updates, deleted)
+    
+    if items:
+        # 文档有变更，让检索结果缓存立即失效，而不是等到 TTL 过期
+        # 推送模式下分块的 parent_id 就是 driveItem id，本进程可以按 id 精确淘汰；其他进程通过标记文件清空
+        invalidate_result_cache(changed_ids if PUSH_INDEXING_ENABLED else None)
+
+def sync_delta(sub_id, delta_link):
+    """
+    从 delta_link 开始逐页处理变更，每处理完一页保存 nextLink 检查点
+    上次同步中途失败时从检查点继续；全部处理完后返回最终的 deltaLink，失败返回 None
+    """
+    next_link = DELTA_STORE.get_next_link(sub_id)
+    if next_link:
+        print(f"从检查点继续同步: {next_link}")
+    link = next_link or delta_link
+    print(f"同步delta变更，使用链接: {link}")
     
     try:
-        resp = requests.get(delta_link, headers={"Authorization": f"Bearer {token}"})
-        resp.raise_for_status()
-        js = resp.json()
-        
-        print(f"获取到 {len(js.get('value', []))} 个变更项目")
-        
-        for item in js.get("value", []):
-            if "deleted" in item:
-                print(f"删除的文件: {item['id']} - {item.get('name', 'Unknown')}")
+        pages = 0
+        for page in DELTA_WALKER.pages(link):
+            pages += 1
+            print(f"第 {pages} 页获取到 {len(page.items)} 个变更项目")
+            process_delta_items(page.items)
+            if page.next_link:
+                DELTA_STORE.save_next_link(sub_id, page.next_link)
             else:
-                dl = item.get("@microsoft.graph.downloadUrl")
-                print(f"更新的文件: {item['id']} - {item.get('name', 'Unknown')}")
-                if dl:
-                    print(f"  下载链接: {dl}")
-                    try:
-                        r = requests.get(dl)
-                        r.raise_for_status()
-                        
-                        # 确保downloads目录存在
-                        downloads_dir = "downloads"
-                        if not os.path.exists(downloads_dir):
-                            os.makedirs(downloads_dir)
-                        
-                        file_path = os.path.join(downloads_dir, item["name"])
-                        with open(file_path, "wb") as f:
-                            f.write(r.content)
-                        print(f"  文件已保存到: {file_path}")
-                    except Exception as e:
-                        print(f"  下载文件时出错: {e}")
-        
-        return js.get("@odata.deltaLink")
+                return page.delta_link
+        return None
     
+    except DeltaResyncRequired as e:
+        # 链接已失效，清除检查点，下次重试时从初始 delta 查询完整同步
+        print(f"delta链接已失效，需要完整重新同步: {e}")
+        DELTA_STORE.reset(sub_id)
+        return None
     except Exception as e:
         print(f"同步delta时出错: {e}")
         return None
@@ -144,28 +350,39 @@ async def notify_get(request: Request, validationToken: Optional[str] = None):
 @app.post('/api/notify')
 async def notify_post(request: Request):
     """处理Microsoft Graph的验证和通知请求"""
-    print(f"=== POST Request to /api/notify ===")
-    print(f"Headers: {dict(request.headers)}")
-    print(f"Query params: {dict(request.query_params)}")
-    
     # 检查是否是验证请求
     validation_token = request.query_params.get('validationToken')
     if validation_token:
         print(f"Received validation token in POST request: {validation_token}")
         return Response(content=validation_token, media_type="text/plain", status_code=200)
     
-    # 处理通知请求
-    try:
-        data = await request.json()
-        print(f"Received notification: {data}")
-        # 推送至处理队列
-        process_notification(data)
-        # Microsoft Graph要求返回200状态码
-        return Response(status_code=200)
-    except Exception as e:
-        print(f"Error processing notification: {e}")
-        # 如果JSON解析失败但没有validation token，可能是其他类型的请求
-        return Response(status_code=400)
+    # 处理通知请求：只做校验和持久化，尽快应答，实际同步由后台 worker 完成
+    with metrics.span("webhook_ack", NOTIFY_ACK_SECONDS):
+        try:
+            data = await request.json()
+        except Exception as e:
+            print(f"Error processing notification: {e}")
+            # 如果JSON解析失败但没有validation token，可能是其他类型的请求
+            return Response(status_code=400)
+        
+        try:
+            # 入队是 SQLite 写入，放到线程池执行，避免阻塞事件循环
+            await run_in_threadpool(process_notification, data)
+        except Exception as e:
+            print(f"写入通知队列时出错: {e}")
+            # 返回错误让 Microsoft Graph 稍后重发
+            return Response(status_code=503)
+        return Response(status_code=202)
+
+@app.get('/metrics')
+async def metrics_get():
+    """Prometheus 格式的指标"""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get('/debug/traces')
+async def traces_get(limit: int = 200, trace_id: Optional[str] = None):
+    """最近结束的 span（需要 TRACING_ENABLED=true）"""
+    return metrics.recent_spans(limit, trace_id)
 
 if __name__ == "__main__":
     # 启动 ngrok 隧道
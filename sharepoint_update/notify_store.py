@@ -0,0 +1,135 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class NotificationStore:
+    """
+    基于 SQLite（WAL 模式）的持久化通知队列，进程重启后未处理的通知不会丢失
+    消费方式为至少一次（at-least-once）：
+    - claim 以租约方式领取某个订阅的全部待处理通知
+    - 处理成功后 ack 删除；失败时 release 放回队列；进程崩溃时租约到期后会被重新领取
+    - 失败次数超过 max_attempts 的通知标记为 dead，不再自动重试
+    """
+
+    def __init__(self, path, lease_seconds=600, max_attempts=10):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        self._conn().execute(
+            """
+            CREATE TABLE IF NOT EXISTS notifications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sub_id TEXT NOT NULL,
+                resource_id TEXT,
+                payload TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                lease_until REAL NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn().execute("CREATE INDEX IF NOT EXISTS idx_notifications_sub ON notifications (sub_id, status)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # WAL + NORMAL: 提交不等待 fsync 检查点，单次写入在毫秒以内；进程崩溃不会丢失已提交的数据
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, notifications):
+        """
+        写入一批通知，notifications 为 Graph 通知字典列表
+        """
+        now = time.time()
+        rows = [
+            (n.get("subscriptionId"), (n.get("resourceData") or {}).get("id"), json.dumps(n, ensure_ascii=False), now)
+            for n in notifications
+        ]
+        conn = self._conn()
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT INTO notifications (sub_id, resource_id, payload, created_at) VALUES (?, ?, ?, ?)", rows
+        )
+        conn.execute("COMMIT")
+        return len(rows)
+
+    def claim(self, sub_id):
+        """
+        领取某个订阅全部待处理（或租约已过期）的通知，返回通知 id 列表
+        """
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ids = [
+                row[0] for row in conn.execute(
+                    """
+                    SELECT id FROM notifications
+                    WHERE sub_id = ? AND (status = 'pending' OR (status = 'leased' AND lease_until < ?))
+                    """,
+                    (sub_id, now)
+                )
+            ]
+            if ids:
+                conn.executemany(
+                    "UPDATE notifications SET status = 'leased', lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                    [(now + self.lease_seconds, i) for i in ids]
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return ids
+
+    def ack(self, ids):
+        """
+        处理成功，删除通知
+        """
+        if ids:
+            conn = self._conn()
+            conn.execute("BEGIN")
+            conn.executemany("DELETE FROM notifications WHERE id = ?", [(i,) for i in ids])
+            conn.execute("COMMIT")
+
+    def release(self, ids):
+        """
+        处理失败，放回队列等待重试；超过最大尝试次数的标记为 dead
+        """
+        if ids:
+            conn = self._conn()
+            conn.execute("BEGIN")
+            conn.executemany(
+                """
+                UPDATE notifications
+                SET status = CASE WHEN attempts >= ? THEN 'dead' ELSE 'pending' END, lease_until = 0
+                WHERE id = ?
+                """,
+                [(self.max_attempts, i) for i in ids]
+            )
+            conn.execute("COMMIT")
+
+    def pending_subscriptions(self):
+        """
+        有待处理（或租约已过期）通知的订阅
+        """
+        rows = self._conn().execute(
+            """
+            SELECT DISTINCT sub_id FROM notifications
+            WHERE status = 'pending' OR (status = 'leased' AND lease_until < ?)
+            """,
+            (time.time(),)
+        )
+        return [row[0] for row in rows]
+
+    def depth(self):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM notifications WHERE status IN ('pending', 'leased')"
+        ).fetchone()[0]
@@ -0,0 +1,92 @@
+import queue
+import threading
+
+# 订阅在池中的状态
+_QUEUED = "queued"
+_RUNNING = "running"
+_RUNNING_PENDING = "running_pending"
+
+
+class CoalescingWorkerPool:
+    """
+    固定大小的 worker 池，按订阅合并变更通知
+    - 同一订阅同一时刻最多只有一个同步在执行
+    - 排队期间到达的通知直接合并，不会重复排队
+    - 同步执行期间到达的通知只会让该订阅在结束后再执行一次
+    这样 N 条连续通知只触发一次 delta 同步，同步中途再有通知也最多补一次
+    """
+
+    def __init__(self, handler, workers=4):
+        self.handler = handler
+        self.workers = workers
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._state = {}
+        self._threads = []
+        self.stats = {"notifications": 0, "coalesced": 0, "runs": 0}
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"sync-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, sub_id):
+        """
+        提交一条订阅变更通知，返回 False 表示已与排队中的同步合并
+        """
+        self.start()
+        with self._lock:
+            self.stats["notifications"] += 1
+            state = self._state.get(sub_id)
+            if state is None:
+                self._state[sub_id] = _QUEUED
+                self._queue.put(sub_id)
+                return True
+            if state == _RUNNING:
+                self._state[sub_id] = _RUNNING_PENDING
+                return True
+            self.stats["coalesced"] += 1
+            return False
+
+    def _worker(self):
+        while True:
+            sub_id = self._queue.get()
+            if sub_id is None:
+                self._queue.task_done()
+                return
+            with self._lock:
+                self._state[sub_id] = _RUNNING
+                self.stats["runs"] += 1
+            try:
+                self.handler(sub_id)
+            except Exception as e:
+                print(f"处理订阅 {sub_id} 时出错: {e}")
+            finally:
+                with self._lock:
+                    if self._state.get(sub_id) == _RUNNING_PENDING:
+                        self._state[sub_id] = _QUEUED
+                        self._queue.put(sub_id)
+                    else:
+                        self._state.pop(sub_id, None)
+                self._queue.task_done()
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def join(self):
+        """
+        等待当前所有排队和执行中的同步完成
+        """
+        self._queue.join()
+
+    def stop(self):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join()
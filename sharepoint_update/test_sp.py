@@ -8,32 +8,42 @@ from urllib.parse import urlparse
 
 # Add parent directory to path to import config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import SHAREPOINT_TENANT_ID, SHAREPOINT_APP_ID, SHAREPOINT_CLIENT_SECRET,SHAREPOINT_SITE_URL
+from config import SHAREPOINT_TENANT_ID, SHAREPOINT_APP_ID, SHAREPOINT_CLIENT_SECRET,SHAREPOINT_SITE_URL,LOGIN_ENDPOINT,GRAPH_ENDPOINT,SHAREPOINT_DRIVE_ID
+from token_cache import TokenProvider
+import metrics
 
-def get_access_token(tenant_id, client_id, client_secret):
+GRAPH_SCOPE = "https://graph.microsoft.com/.default"
+
+TOKEN_FETCH_SECONDS = metrics.histogram("token_fetch_seconds", "请求新访问令牌的耗时（秒）")
+TOKEN_FETCH_ERRORS = metrics.counter("token_fetch_errors_total", "访问令牌请求失败次数", ("status",))
+
+def request_access_token(tenant_id, client_id, client_secret, scope=GRAPH_SCOPE):
     """
-    Get access token using client credentials flow
+    使用客户端凭据流请求新的访问令牌，返回 (access_token, expires_in)
     """
-    url = f"https://login.microsoftonline.com/{tenant_id}/oauth2/v2.0/token"
+    url = f"{LOGIN_ENDPOINT}/{tenant_id}/oauth2/v2.0/token"
     data = {
         "grant_type": "client_credentials",
         "client_id": client_id,
         "client_secret": client_secret,
-        "scope": "https://graph.microsoft.com/.default"
+        "scope": scope
     }
     
     try:
-        resp = requests.post(url, data=data, headers={"Content-Type": "application/x-www-form-urlencoded"})
+        with metrics.span("token_fetch", TOKEN_FETCH_SECONDS):
+            resp = requests.post(url, data=data, headers={"Content-Type": "application/x-www-form-urlencoded"})
         
         # Print detailed error information
         if resp.status_code != 200:
+            TOKEN_FETCH_ERRORS.inc(status=resp.status_code)
             print(f"Error Status Code: {resp.status_code}")
             print(f"Error Response: {resp.text}")
             print(f"Request URL: {url}")
             print(f"Request Data: {data}")
         
         resp.raise_for_status()
-        return resp.json()["access_token"]
+        js = resp.json()
+        return js["access_token"], js.get("expires_in", 3599)
     
     except requests.exceptions.HTTPError as e:
         print(f"HTTP Error: {e}")
@@ -43,6 +53,15 @@ def get_access_token(tenant_id, client_id, client_secret):
         print(f"Unexpected error: {e}")
         raise
 
+# webhook worker 和下面的辅助函数共用
+TOKEN_PROVIDER = TokenProvider(request_access_token)
+
+def get_access_token(tenant_id, client_id, client_secret, scope=GRAPH_SCOPE):
+    """
+    使用客户端凭据流获取访问令牌，缓存到快过期时才重新请求
+    """
+    return TOKEN_PROVIDER.get(tenant_id, client_id, client_secret, scope)
+
 def test_sharepoint_access():
     """
     Test SharePoint access using Microsoft Graph API
@@ -64,7 +83,7 @@ def test_sharepoint_access():
         
         print(f"Testing access to SharePoint site: {hostname}{site_path}")
         resp = requests.get(
-            f"https://graph.microsoft.com/v1.0/sites/{hostname}:{site_path}",
+            f"{GRAPH_ENDPOINT}/v1.0/sites/{hostname}:{site_path}",
             headers={"Authorization": f"Bearer {token}"}
         )
         
@@ -75,7 +94,7 @@ def test_sharepoint_access():
             print(f"Site Name: {site_data.get('displayName')}")
             print(f"Site URL: {site_data.get('webUrl')}")
             resp1 = requests.get(
-                f"https://graph.microsoft.com/v1.0/sites/{site_data.get('id')}/drives",
+                f"{GRAPH_ENDPOINT}/v1.0/sites/{site_data.get('id')}/drives",
                 headers={"Authorization": f"Bearer {token}"}
                 )
             print(resp1)
@@ -93,10 +112,10 @@ def test_document_files():
     print("Getting access token...")
     token = get_access_token(SHAREPOINT_TENANT_ID, SHAREPOINT_APP_ID, SHAREPOINT_CLIENT_SECRET)
     print("✓ Access token obtained successfully")
-    drive_id = "b!15loqcZkLUGK6C0oCOL3vvvNNWQegURNvY-5ZGBF091rDBpKdJ6IS6RbBIfXEnsk"#替换此处drive_id
+    drive_id = SHAREPOINT_DRIVE_ID
 
     resp = requests.get(
-        f"https://graph.microsoft.com/v1.0/drives/{drive_id}/root/children",
+        f"{GRAPH_ENDPOINT}/v1.0/drives/{drive_id}/root/children",
         headers={"Authorization": f"Bearer {token}"}
     )
     for item in resp.json().get("value", []):
@@ -106,12 +125,12 @@ def webhookset():
     print("Getting access token...")
     token = get_access_token(SHAREPOINT_TENANT_ID, SHAREPOINT_APP_ID, SHAREPOINT_CLIENT_SECRET)
     print("✓ Access token obtained successfully")
-    drive_id = "b!15loqcZkLUGK6C0oCOL3vvvNNWQegURNvY-5ZGBF091rDBpKdJ6IS6RbBIfXEnsk" #替换此处drive_id
+    drive_id = SHAREPOINT_DRIVE_ID
     
     # 首先查询现有订阅
     print("Checking existing subscriptions...")
     resp = requests.get(
-        "https://graph.microsoft.com/v1.0/subscriptions",
+        f"{GRAPH_ENDPOINT}/v1.0/subscriptions",
         headers={"Authorization": f"Bearer {token}"}
     )
     print("Current subscriptions:")
@@ -131,7 +150,7 @@ def webhookset():
     }
     
     create_resp = requests.post(
-        "https://graph.microsoft.com/v1.0/subscriptions",
+        f"{GRAPH_ENDPOINT}/v1.0/subscriptions",
         headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
         json=payload
     )
@@ -146,7 +165,7 @@ def webhookset():
 def delete_current_link(value,token):
     subscription_id = [item["id"] for item in value]  # 替换成你要删除的订阅 ID
     for id in subscription_id:
-        url = f"https://graph.microsoft.com/v1.0/subscriptions/{id}"
+        url = f"{GRAPH_ENDPOINT}/v1.0/subscriptions/{id}"
 
         headers = {
             "Authorization": f"Bearer {token}"
@@ -53,6 +53,7 @@ def test_webhook_notification():
             {
                 "subscriptionId": "test-subscription-id",
                 "changeType": "updated",
+                "clientState": "testCondition",
                 "resource": "/drives/test-drive-id/root",
                 "resourceData": {
                     "id": "test-item-id",
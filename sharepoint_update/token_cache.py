@@ -0,0 +1,89 @@
+"""
+OAuth 访问令牌缓存
+按 (tenant, client, scope) 缓存令牌直到快过期，到期前在后台刷新，并发请求只会向令牌端点发一次请求
+"""
+import threading
+import time
+
+
+class _Entry:
+    __slots__ = ("token", "expires_at", "lock", "refreshing")
+
+    def __init__(self):
+        self.token = None
+        self.expires_at = 0.0
+        self.lock = threading.Lock()
+        self.refreshing = False
+
+
+class TokenProvider:
+    """
+    线程安全的访问令牌缓存
+    - 距离过期不到 refresh_margin 秒时仍返回缓存的令牌，同时启动一次后台刷新
+    - 距离过期不到 expiry_skew 秒（或还没有令牌）时，调用方在每个键的锁上等待，并发调用只发一次请求
+    fetch(tenant_id, client_id, client_secret, scope) 需要返回 (access_token, expires_in)
+    """
+
+    def __init__(self, fetch, refresh_margin=300, expiry_skew=60):
+        self.fetch = fetch
+        self.refresh_margin = refresh_margin
+        self.expiry_skew = expiry_skew
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "fetches": 0, "background_refreshes": 0}
+
+    def _entry(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            with self._lock:
+                entry = self._entries.setdefault(key, _Entry())
+        return entry
+
+    def _refresh(self, entry, tenant_id, client_id, client_secret, scope):
+        token, expires_in = self.fetch(tenant_id, client_id, client_secret, scope)
+        entry.token = token
+        entry.expires_at = time.time() + float(expires_in)
+        self.stats["fetches"] += 1
+
+    def _background_refresh(self, entry, *args):
+        try:
+            with entry.lock:
+                self._refresh(entry, *args)
+        except Exception as e:
+            print(f"后台刷新访问令牌失败: {e}")
+        finally:
+            entry.refreshing = False
+
+    def get(self, tenant_id, client_id, client_secret, scope):
+        """
+        获取访问令牌，缓存的令牌快过期时才请求新的
+        """
+        entry = self._entry((tenant_id, client_id, scope))
+        args = (tenant_id, client_id, client_secret, scope)
+
+        now = time.time()
+        if entry.token and now < entry.expires_at - self.expiry_skew:
+            self.stats["hits"] += 1
+            if now >= entry.expires_at - self.refresh_margin and not entry.refreshing:
+                with self._lock:
+                    start = not entry.refreshing
+                    entry.refreshing = True
+                if start:
+                    self.stats["background_refreshes"] += 1
+                    threading.Thread(target=self._background_refresh, args=(entry, *args), daemon=True).start()
+            return entry.token
+
+        with entry.lock:
+            # 等待锁期间其他调用方可能已经刷新过
+            if not (entry.token and time.time() < entry.expires_at - self.expiry_skew):
+                self._refresh(entry, *args)
+            return entry.token
+
+    def invalidate(self, tenant_id, client_id, scope):
+        """
+        丢弃缓存的令牌（例如请求返回 401 时），下次 get 重新请求
+        """
+        entry = self._entries.get((tenant_id, client_id, scope))
+        if entry is not None:
+            entry.token = None
+            entry.expires_at = 0.0
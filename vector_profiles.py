@@ -0,0 +1,79 @@
+"""
+chunk_vector 字段的索引配置（向量维度 + 压缩方式）
+配置名格式为 <压缩方式>[-<维度>]:
+- 压缩方式: float32（不压缩）、int8（标量量化）、binary（二值量化）
+- 维度: text-embedding-3-large 为 Matryoshka 训练，截取前 N 维并重新归一化仍然可用；省略时为模型原始维度
+
+例如 float32（原来的索引）、int8、binary-1024、float32-256
+压缩后的索引保留原始向量，检索时按 oversampling 倍数取候选再用原始向量重新打分
+索引维度变化时需要重建索引并重新生成向量，查询向量通过 get_embedding 的 dimensions 参数截取到相同维度
+"""
+from functools import lru_cache
+
+from config import EMBEDDING_DIMENSIONS, VECTOR_INDEX_PROFILE, VECTOR_OVERSAMPLING
+
+COMPRESSIONS = ("float32", "int8", "binary")
+# 离线评估默认对比的配置
+DEFAULT_PROFILES = ("float32", "int8", "binary", "float32-1024", "int8-1024", "binary-1024", "float32-256", "int8-256")
+
+# 每个分量占用的位数
+_BITS = {"float32": 32, "int8": 8, "binary": 1}
+
+
+class VectorProfile:
+    __slots__ = ("name", "compression", "dimensions", "oversampling")
+
+    def __init__(self, compression="float32", dimensions=EMBEDDING_DIMENSIONS, oversampling=VECTOR_OVERSAMPLING):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"不支持的压缩方式: {compression}，可选 {COMPRESSIONS}")
+        if not 0 < dimensions <= EMBEDDING_DIMENSIONS:
+            raise ValueError(f"向量维度需要在 1 到 {EMBEDDING_DIMENSIONS} 之间: {dimensions}")
+        self.compression = compression
+        self.dimensions = dimensions
+        self.oversampling = oversampling
+        self.name = compression if dimensions == EMBEDDING_DIMENSIONS else f"{compression}-{dimensions}"
+
+    @classmethod
+    def parse(cls, name, oversampling=VECTOR_OVERSAMPLING):
+        compression, _, dimensions = name.strip().partition("-")
+        if dimensions and not dimensions.isdigit():
+            raise ValueError(f"无法解析向量索引配置: {name}")
+        return cls(compression, int(dimensions) if dimensions else EMBEDDING_DIMENSIONS, oversampling)
+
+    @property
+    def request_dimensions(self):
+        """
+        嵌入接口的 dimensions 参数，模型原始维度时为 None（不传，与原来的请求一致）
+        """
+        return self.dimensions if self.dimensions != EMBEDDING_DIMENSIONS else None
+
+    @property
+    def compression_name(self):
+        return {"int8": "scalar-quantization", "binary": "binary-quantization"}.get(self.compression)
+
+    @property
+    def bytes_per_vector(self):
+        """
+        向量索引中每个向量占用的字节数（不含 HNSW 图和为重新打分保留的原始向量）
+        """
+        return (self.dimensions * _BITS[self.compression] + 7) // 8
+
+    def __repr__(self):
+        return f"VectorProfile({self.name!r}, oversampling={self.oversampling})"
+
+
+@lru_cache(maxsize=None)
+def get_vector_profile():
+    """
+    当前使用的索引配置（VECTOR_INDEX_PROFILE）
+    """
+    return VectorProfile.parse(VECTOR_INDEX_PROFILE)
+
+
+def truncate_vector(vector, dimensions):
+    """
+    截取前 dimensions 维并重新归一化，与嵌入接口的 dimensions 参数结果一致（用于已有的全维向量）
+    """
+    head = list(vector[:dimensions])
+    norm = sum(v * v for v in head) ** 0.5 or 1.0
+    return [v / norm for v in head]